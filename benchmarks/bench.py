@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import io
+import time
+import json
+import fnmatch
+import platform
+import argparse
+import tempfile
+import contextlib
+import subprocess
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0,ROOT)
+sys.path.insert(1,os.path.join(ROOT,'checkout'))
+os.environ.setdefault('QT_QPA_PLATFORM','offscreen')
+
+# Each benchmark is a setup function taking the shared Inputs and returning the
+# callable to time (and optionally a cleanup callable). Setup raises Skip when a
+# dependency of the code under test is not installed.
+BENCHMARKS = []
+
+class Skip(Exception):
+    pass
+
+def benchmark(name,threshold=1.25,number=1):
+    '''Registers a setup function; threshold is the allowed ratio of median to the baseline median'''
+    def register(setup):
+        BENCHMARKS.append((name,setup,threshold,number))
+        return setup
+    return register
+
+def need(module):
+    try:
+        return __import__(module,fromlist=['_'])
+    except ImportError as e:
+        raise Skip(str(e))
+
+class Inputs:
+    '''Reproducible synthetic data shared by the benchmarks, built on first use'''
+
+    def __init__(self,seed=1234,num_samples=2184,num_packets=1000):
+        self.seed = seed
+        self.num_samples = num_samples
+        self.num_packets = num_packets
+        self.tmpdir = tempfile.TemporaryDirectory(prefix='wib_bench_')
+        self.cache = {}
+
+    def get(self,name,build):
+        if name not in self.cache:
+            self.cache[name] = build()
+        return self.cache[name]
+
+    def spy(self):
+        '''(timestamps (2,n), samples (4,128,n)) like WIB.acquire_data with the pulser on'''
+        def build():
+            rng = np.random.default_rng(self.seed)
+            n = self.num_samples
+            t = np.arange(n) % 500
+            shape = (t/4.0)**4*np.exp(4*(1-t/4.0))
+            ped = rng.normal(900,150,(4,128,1))
+            samples = ped + rng.normal(0,5,(4,128,n)) + 2000*shape
+            timestamps = (np.arange(n,dtype=np.uint64)*np.uint64(32))[np.newaxis,:].repeat(2,axis=0)
+            return timestamps,np.clip(samples,0,16383).astype(np.uint16)
+        return self.get('spy',build)
+
+    def hs_packets(self):
+        '''Bytes of num_packets consecutive high speed UDP packets of one ASIC, as cls_udp returns them'''
+        def build():
+            from wib_emu import pack_frames, PKG_WORDS, PKG_FRAMES, PULSE_PERIOD
+            rng = np.random.default_rng(self.seed)
+            nsmp = self.num_packets*PKG_FRAMES
+            t = np.arange(nsmp) % PULSE_PERIOD
+            shape = (t/4.0)**4*np.exp(4*(1-t/4.0))
+            smps = 800 + rng.normal(0,4,(nsmp,16)) + 1500*shape[:,np.newaxis]
+            frames = pack_frames(np.clip(smps,0,4095),np.full(nsmp,0xface,dtype=np.uint16))
+            pkts = np.zeros((self.num_packets,PKG_WORDS),dtype=np.uint16)
+            cnt = np.arange(self.num_packets,dtype=np.uint32)
+            pkts[:,0] = cnt >> 16
+            pkts[:,1] = cnt & 0xffff
+            pkts[:,8:] = frames.reshape(self.num_packets,PKG_FRAMES*13)
+            return pkts.astype('>u2').tobytes()
+        return self.get('hs_packets',build)
+
+    def femb_data(self):
+        '''Output of RAW_CONV.raw_conv_feedloc for all 8 ASICs of one FEMB'''
+        def build():
+            from raw_convertor import RAW_CONV
+            chip_data = RAW_CONV().raw_conv_feedloc(self.hs_packets())
+            return [[list(ch) for ch in chip_data] for chip in range(8)]
+        return self.get('femb_data',build)
+
+    def linearity_file(self,pulser_dacs=(0,5,10,15,20),num_acquisitions=4):
+        '''HDF5 file laid out like femb_linearity.take_data writes it'''
+        def build():
+            h5py = need('h5py')
+            rng = np.random.default_rng(self.seed)
+            fname = os.path.join(self.tmpdir.name,'linearity.h5')
+            t = np.arange(self.num_samples) % 500
+            shape = (t/4.0)**4*np.exp(4*(1-t/4.0))
+            with h5py.File(fname,'w') as hf:
+                for dac in pulser_dacs:
+                    gr = hf.create_group('dac%i'%dac)
+                    for ev in range(num_acquisitions):
+                        samples = 900 + rng.normal(0,5,(128,self.num_samples)) + 150*dac*shape
+                        gr.create_dataset('ev%i'%ev,data=np.clip(samples,0,16383).astype(np.uint16))
+            return fname
+        return self.get('linearity_file',build)
+
+    def close(self):
+        self.tmpdir.cleanup()
+
+def qt_app():
+    QtWidgets = need('matplotlib.backends.qt_compat').QtWidgets
+    return QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+
+@benchmark('wib.acquire_data',threshold=1.5)
+def bench_acquire_data(inputs):
+    from wib import WIB
+    from wib_sim import WIBSim
+    sim = WIBSim(bind='tcp://127.0.0.1:1234',num_samples=inputs.num_samples,seed=inputs.seed).start()
+    wib = WIB('127.0.0.1')
+    def run():
+        with contextlib.redirect_stdout(io.StringIO()):
+            wib.acquire_data(buf0=True,buf1=True)
+    def cleanup():
+        wib.socket.close(0)
+        wib.context.term()
+        sim.stop()
+    return run,cleanup
+
+@benchmark('raw_conv.raw_conv_feedloc')
+def bench_raw_conv(inputs):
+    from raw_convertor import RAW_CONV
+    conv = RAW_CONV()
+    data = inputs.hs_packets()
+    return lambda: conv.raw_conv_feedloc(data)
+
+@benchmark('wib_rawfile.hs_decode')
+def bench_hs_decode(inputs):
+    from wib_rawfile import HSPacketFile
+    hs = HSPacketFile(inputs.hs_packets())
+    return lambda: hs.decode(flags=True)
+
+@benchmark('qc_runs.data_ana')
+def bench_data_ana(inputs):
+    need('h5py')
+    need('matplotlib')
+    from QC_runs import QC_runs
+    femb_data = inputs.femb_data()
+    # data_ana does not touch the instance, so the instruments never need to be opened
+    return lambda: QC_runs.data_ana(None,femb_data)
+
+def diag_view(name,cls_name):
+    @benchmark(name)
+    def bench_view(inputs):
+        qt_app()
+        femb_diagnostic = need('femb_diagnostic')
+        view = getattr(femb_diagnostic,cls_name)(femb=0)
+        timestamps,samples = inputs.spy()
+        def run():
+            view.load_data(timestamps,samples)
+            view.plot_data()
+        return run,view.deleteLater
+    return bench_view
+
+diag_view('femb_diagnostic.hist2d','Hist2DView')
+diag_view('femb_diagnostic.fft','FFTView')
+diag_view('femb_diagnostic.mean_rms','MeanRMSView')
+
+@benchmark('wib_scope.plot_signals')
+def bench_plot_signals(inputs):
+    qt_app()
+    wib_scope = need('wib_scope')
+    class Source:
+        pass
+    source = Source()
+    source.timestamps,source.samples = inputs.spy()
+    view = wib_scope.SignalView(data_source=source)
+    view.selected = [(femb,adc,ch) for femb in range(2) for adc in range(8) for ch in range(0,16,4)]
+    def run():
+        view.load_data()
+        view.plot_signals(rescale=True)
+    return run,view.deleteLater
+
+@benchmark('femb_linearity.analyze_data')
+def bench_linearity(inputs):
+    need('h5py')
+    need('scipy')
+    femb_linearity = need('femb_linearity')
+    fname = inputs.linearity_file()
+    def run():
+        with contextlib.redirect_stdout(io.StringIO()):
+            femb_linearity.analyze_data(fname)
+    return run
+
+@benchmark('fe_asic_reg_mapping.set_fe_board',number=20)
+def bench_set_fe_board(inputs):
+    from fe_asic_reg_mapping import FE_ASIC_REG_MAPPING
+    fe = FE_ASIC_REG_MAPPING()
+    return lambda: fe.set_fe_board(sts=1,snc=1,sg0=0,sg1=1,st0=1,st1=1,sdd=1,sdf=1,swdac=1,dac=0x10)
+
+def time_one(run,number,repeat,warmup):
+    for i in range(warmup):
+        run()
+    times = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        for j in range(number):
+            run()
+        times.append((time.perf_counter()-start)/number)
+    return times
+
+def git_revision():
+    try:
+        out = subprocess.run(['git','describe','--always','--dirty'],cwd=ROOT,capture_output=True,text=True,timeout=10)
+        return out.stdout.strip() or None
+    except Exception:
+        return None
+
+def load_history(path):
+    if not os.path.exists(path):
+        return []
+    with open(path,'r') as fin:
+        return json.load(fin)
+
+def save_history(path,history):
+    tmp = path+'.tmp'
+    with open(tmp,'w') as fout:
+        json.dump(history,fout,indent=1)
+    os.replace(tmp,path)
+
+def baseline(history,host,name,window):
+    '''Median of the medians of the last window runs of this benchmark on this host'''
+    medians = [run['results'][name]['median'] for run in history if run['host'] == host and name in run['results']]
+    if len(medians) == 0:
+        return None
+    return float(np.median(medians[-window:]))
+
+def run_benchmarks(patterns,repeat,warmup,history,window,log=print):
+    host = platform.node()
+    inputs = Inputs()
+    results = {}
+    regressions = []
+    try:
+        for name,setup,threshold,number in BENCHMARKS:
+            if patterns and not any(fnmatch.fnmatch(name,p) for p in patterns):
+                continue
+            try:
+                ret = setup(inputs)
+            except Skip as e:
+                log('%-36s skipped (%s)'%(name,e))
+                continue
+            run,cleanup = ret if isinstance(ret,tuple) else (ret,None)
+            try:
+                times = time_one(run,number,repeat,warmup)
+            finally:
+                if cleanup is not None:
+                    cleanup()
+            res = {'median':float(np.median(times)),'min':float(np.min(times)),'max':float(np.max(times)),'repeat':repeat,'number':number,'threshold':threshold}
+            results[name] = res
+            ref = baseline(history,host,name,window)
+            line = '%-36s median %9.3f ms  min %9.3f ms'%(name,res['median']*1e3,res['min']*1e3)
+            if ref is not None:
+                ratio = res['median']/ref
+                line += '  %5.2fx baseline'%ratio
+                if ratio > threshold:
+                    line += '  REGRESSION (limit %.2fx)'%threshold
+                    regressions.append(name)
+            log(line)
+    finally:
+        inputs.close()
+    record = {'time':time.time(),'host':host,'python':platform.python_version(),'numpy':np.__version__,'git':git_revision(),'results':results}
+    return record,regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Time the acquisition, decode and analysis hot paths on synthetic data')
+    parser.add_argument('--history',default=os.path.join(os.path.dirname(os.path.abspath(__file__)),'history.json'),help='JSON file results are appended to [benchmarks/history.json]')
+    parser.add_argument('--repeat','-r',default=5,type=int,help='Timed repetitions of each benchmark [5]')
+    parser.add_argument('--warmup',default=1,type=int,help='Untimed repetitions before timing [1]')
+    parser.add_argument('--window',default=5,type=int,help='Previous runs on this host the baseline is taken from [5]')
+    parser.add_argument('--no-save',dest='save',action='store_false',help='Do not append this run to the history')
+    parser.add_argument('--no-fail',dest='fail',action='store_false',help='Exit with 0 even if a benchmark regressed')
+    parser.add_argument('--list','-l',action='store_true',help='List the benchmarks and exit')
+    parser.add_argument('patterns',nargs='*',help='Only run benchmarks matching these glob patterns')
+    args = parser.parse_args()
+
+    if args.list:
+        for name,setup,threshold,number in BENCHMARKS:
+            print('%-36s threshold %.2fx'%(name,threshold))
+        sys.exit(0)
+
+    history = load_history(args.history)
+    record,regressions = run_benchmarks(args.patterns,args.repeat,args.warmup,history,args.window)
+    if args.save and record['results']:
+        history.append(record)
+        save_history(args.history,history)
+    if regressions:
+        print('%i regression(s): %s'%(len(regressions),', '.join(regressions)))
+        if args.fail:
+            sys.exit(1)
@@ -1,29 +1,8 @@
 ECHO "LAr and ADC test begin"
-::#user input
-python .\QC_top.py 1 
-
-:::#init pwr chk
-python .\QC_top.py 2 
-
-::#init pwr meas
-python .\QC_top.py 3
-
-::#init pwr cycles 
-python .\QC_top.py 4
-
-::#init femb chk
-python .\QC_top.py 5
-
-::#init femb rms
-python .\QC_top.py 6
-
-::#init femb asicdac cali
-python .\QC_top.py 7
-
-::#init femb mon
-python .\QC_top.py 8
-
-::#init pwr off
-python .\QC_top.py 9
+::#QC_runs shares wib_alarms and settings_alarms.ini with the GUI in the folder above
+set PYTHONPATH=%~dp0..;%PYTHONPATH%
+::#all stages (user input, power checks, femb chk/rms/asicdac cali/mon, pwr off) in one process
+::#after an interruption: python .\QC_pipeline.py --resume
+python .\QC_pipeline.py
 python .\rigol_dp832_ps.py
 PAUSE
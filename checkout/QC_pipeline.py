@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""
+File Name: QC_pipeline.py
+Description: Runs the FEMB QC stages of QC_batches.bat in one process. The
+             instruments, WIB sockets and imports are set up once, log entries
+             are checkpointed to the QC result store as they are produced, and
+             a run can resume from any stage. Per stage wall times are printed
+             at the end.
+Created Time: 10/19/2026
+"""
+
+import os
+import sys
+import time
+import argparse
+from QC_runs import QC_runs
+from qc_store import QC_store, DB_NAME
+import visa_backend
+from settle import Settle
+
+# (tm, name, QC_runs method) in the order QC_batches.bat ran them. tm is the
+# QC_top.py argument.
+STAGES = [
+    (1, "input",     "FEMB_CHKOUT_Input"),
+    (2, "initpwr",   "femb_initpwr_chk"),
+    (3, "pwr_meas",  "femb_pwr_meas"),
+    (4, "pwr_cycle", "femb_pwr_cycles"),
+    (5, "chk",       "femb_chks"),
+    (6, "rms",       "femb_rmss"),
+    (7, "asicdac",   "femb_asicdac_calis"),
+    (8, "mon",       "femb_mons"),
+    (9, "close",     "close"),
+]
+def stage_index(key):
+    '''Index in STAGES of a stage given by tm number or name'''
+    for i, (tm, name, method) in enumerate(STAGES):
+        if str(key) in (str(tm), name):
+            return i
+    raise ValueError("Unknown QC stage {}".format(key))
+
+class QC_pipeline():
+    '''
+    Runs STAGES[first:last+1] on one QC_runs instance. qc.logs writes every entry
+    to the QC result store of the run (qc_results.db) tagged with the stage that
+    produced it, and the stages table records which stages finished, so a later
+    run can rebuild qc.logs from the finished stages and carry on.
+    '''
+    def __init__(self, qc=None, pr=print):
+        self.qc = QC_runs() if qc is None else qc
+        self.pr = pr
+        self.timings = []
+        self.settles = []
+        self.wall = None
+
+    def restore(self, save_dir=None):
+        '''Rebuilds qc.logs from the finished stages in save_dir (default: the run in logs_dir.txt)'''
+        if save_dir is None:
+            with open(self.qc.logs_file, 'r') as fp:
+                save_dir = os.path.dirname(fp.read().strip())
+        if not save_dir.endswith("/"):
+            save_dir = save_dir + "/"
+        self.qc.save_dir = save_dir
+        self.qc.store = QC_store(save_dir + DB_NAME)
+        # entries without a stage were written by QC_top.py
+        self.qc.open_store(stages=self.done() + [None])
+        self.pr ("Restored {} log entries from {}".format(len(self.qc.logs), save_dir))
+
+    def done(self):
+        return [name for name, st in self.qc.store.stages().items() if st["status"] == "done"]
+
+    def first_pending(self):
+        done = self.done()
+        for i, (tm, name, method) in enumerate(STAGES):
+            if name not in done:
+                return i
+        return len(STAGES)
+
+    def run_stage(self, i):
+        tm, name, method = STAGES[i]
+        self.pr ("QC stage {} ({}) begins".format(tm, name))
+        self.qc.stage = name
+        if self.qc.store is not None:
+            self.qc.store.stage = name
+        io0 = visa_backend.io_total()
+        self.qc.tcp.settle.reset()
+        t0 = time.time()
+        try:
+            if tm == 1:
+                getattr(self.qc, method)()
+            else:
+                getattr(self.qc, method)(femb_no=self.qc.femb_no)
+        except BaseException as e:
+            # QC_runs calls exit() when a check fails, record that before leaving
+            if self.qc.store is not None:
+                self.qc.store.set_stage(name, tm=tm, status="failed", start=t0, wall=time.time() - t0, io=visa_backend.io_total() - io0,
+                                        entries=self.qc.store.stage_count(name), error=repr(e))
+            raise
+        wall = time.time() - t0
+        io = visa_backend.io_total() - io0
+        settle = self.qc.tcp.settle.summary()
+        if settle:
+            self.qc.logs["settle_" + name] = settle
+            self.settles.extend(self.qc.tcp.settle.records)
+        entries = self.qc.store.stage_count(name)
+        self.qc.store.set_stage(name, tm=tm, status="done", start=t0, wall=wall, io=io, entries=entries, error=None)
+        if tm == 1:
+            # lets QC_top.py and --resume find this run
+            with open(self.qc.logs_file, 'w') as fp:
+                fp.write(self.qc.save_dir + DB_NAME)
+        self.timings.append((tm, name, wall, io, entries))
+
+    def run(self, first=0, last=len(STAGES)-1):
+        t0 = time.time()
+        try:
+            for i in range(first, last + 1):
+                self.run_stage(i)
+        finally:
+            self.wall = time.time() - t0
+            self.report(self.wall)
+
+    def report(self, wall):
+        self.pr ("{:>3} {:<10} {:>10} {:>10} {:>8}".format("tm", "stage", "wall (s)", "I/O (s)", "entries"))
+        staged = 0
+        for tm, name, t, io, n in self.timings:
+            staged += t
+            self.pr ("{:>3} {:<10} {:>10.1f} {:>10.1f} {:>8}".format(tm, name, t, io, n))
+        self.pr ("Total {:.1f} s, {:.1f} s outside the stages".format(wall, wall - staged))
+        all_settles = Settle()
+        all_settles.records = self.settles
+        all_settles.report(self.pr)
+        visa_backend.io_report(wall=wall, pr=self.pr)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the FEMB QC stages in one process")
+    parser.add_argument("--from", dest="first", default=None, help="First stage to run, by number or name [1, or the first unfinished one with --resume]")
+    parser.add_argument("--to", dest="last", default=str(STAGES[-1][0]), help="Last stage to run [{}]".format(STAGES[-1][0]))
+    parser.add_argument("--resume", "-r", action="store_true", help="Restore the logs of an earlier run and continue it")
+    parser.add_argument("--save_dir", "-d", default=None, help="Folder of the run to resume [the one in logs_dir.txt]")
+    parser.add_argument("--list", "-l", action="store_true", help="List the stages and exit")
+    args = parser.parse_args()
+
+    if args.list:
+        for tm, name, method in STAGES:
+            print ("{} {:<10} QC_runs.{}".format(tm, name, method))
+        sys.exit(0)
+
+    pipe = QC_pipeline()
+    first = 0
+    if args.resume:
+        pipe.restore(args.save_dir)
+        first = pipe.first_pending()
+    if args.first is not None:
+        first = stage_index(args.first)
+    if first > 0 and not args.resume:
+        print ("Stages after the first need the logs of an earlier run, use --resume")
+        sys.exit(1)
+    pipe.run(first, stage_index(args.last))
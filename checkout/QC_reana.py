@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+"""
+File Name: QC_reana.py
+Description: Re-analyzes a whole QC archive offline. Every FEMB run folder under
+             the QC root is searched for the .h5 captures of the CHK, RMS, PWR
+             and ASICDAC_CALI stages; their pedestal, RMS and peaks are
+             recomputed with qc_ana.data_ana in a process pool and the ASIC-DAC
+             gains are fitted. Results are cached per file next to the run, so
+             only new or changed files, or all of them after qc_ana.ANA_VERSION
+             is bumped, are analyzed again. Summary tables are written per run
+             and for the whole archive.
+Created Time: 10/19/2026
+"""
+
+import os
+import re
+import csv
+import json
+import time
+import argparse
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import qc_ana
+
+ROOT = "D:/IO_1826_1B/QC/" #QC_runs.root
+RUN_RE = re.compile(r"^FEMB(\d{3})_(RT|LN)_([^_]+)(?:_R(\d{3}))?$")
+SUB_FOLDERS = ("CHK", "RMS", "PWR", "ASICDAC_CALI")
+CALI_RE = re.compile(r"^(CALI_.+)_ASICDAC0x([0-9a-fA-F]{2})$")
+REANA_DIR = "reana"
+MANIFEST = "manifest.json"
+FIELDS = ("ped", "rms", "pkp", "pkn")
+
+def find_runs(root):
+    '''{run folder name: (femb_sn, env, cd, rerun)} of the FEMB run folders in root'''
+    runs = {}
+    for name in sorted(os.listdir(root)):
+        m = RUN_RE.match(name)
+        if m and os.path.isdir(os.path.join(root, name)):
+            runs[name] = (int(m.group(1)), m.group(2), m.group(3), int(m.group(4) or 0))
+    return runs
+
+def run_files(run_dir):
+    '''Paths relative to run_dir of the .h5 captures of a run'''
+    files = []
+    for sub in SUB_FOLDERS:
+        sub_dir = os.path.join(run_dir, sub)
+        if os.path.isdir(sub_dir):
+            files += [sub + "/" + fn for fn in sorted(os.listdir(sub_dir)) if fn.endswith(".h5")]
+    return files
+
+def analyze(fp, rms_en=False):
+    '''Per channel ped, rms, pkp, pkn of one capture, and whether the ASICs agree like QC_runs checks'''
+    femb_data = qc_ana.read_h5(fp)
+    chn_rmss, chn_peds, chn_pkps, chn_pkns = qc_ana.data_ana(femb_data, ana_chk=False, rms_en=rms_en)[0:4]
+    return {"ped" : np.array(chn_peds, dtype=float), "rms" : np.array(chn_rmss, dtype=float),
+            "pkp" : np.array(chn_pkps, dtype=float), "pkn" : np.array(chn_pkns, dtype=float),
+            "ok" : qc_ana.config_chk(chn_peds, chn_pkps) == None}
+
+def file_key(fp):
+    st = os.stat(fp)
+    return [st.st_size, int(st.st_mtime), qc_ana.ANA_VERSION]
+
+def cali_gains(results):
+    '''{calibration setting: (gain, offset)} per channel fits of amplitude vs ASIC-DAC code, gain in ADC counts per DAC step'''
+    groups = {}
+    for rel, res in results.items():
+        m = CALI_RE.match(os.path.basename(rel)[:-3])
+        if m and res["ok"]:
+            groups.setdefault(m.group(1), []).append((int(m.group(2), 16), res["pkp"] - res["ped"]))
+    gains = {}
+    for setting, points in groups.items():
+        if len(points) < 2:
+            continue
+        points.sort(key=lambda p: p[0])
+        dacs = np.array([p[0] for p in points], dtype=float)
+        amps = np.array([p[1] for p in points])
+        gain, offset = np.polyfit(dacs, amps, 1)
+        gains[setting] = (gain, offset)
+    return gains
+
+class QC_reana():
+    def __init__(self, root=ROOT, workers=None, force=False, pr=print):
+        self.root = root
+        self.workers = workers
+        self.force = force
+        self.pr = pr
+        self.runs = find_runs(root)
+
+    def cache_path(self, run, rel):
+        return os.path.join(self.root, run, REANA_DIR, rel[:-3] + ".npz")
+
+    def load_manifest(self, run):
+        fp = os.path.join(self.root, run, REANA_DIR, MANIFEST)
+        if os.path.isfile(fp):
+            with open(fp, 'r') as f:
+                return json.load(f)
+        return {}
+
+    def save_manifest(self, run, manifest):
+        with open(os.path.join(self.root, run, REANA_DIR, MANIFEST), 'w') as f:
+            json.dump(manifest, f, indent=1)
+
+    def save_result(self, run, rel, res):
+        fp = self.cache_path(run, rel)
+        if not os.path.isdir(os.path.dirname(fp)):
+            os.makedirs(os.path.dirname(fp))
+        np.savez(fp, ok=res["ok"], **dict((k, res[k]) for k in FIELDS))
+
+    def load_result(self, run, rel):
+        with np.load(self.cache_path(run, rel)) as npz:
+            res = dict((k, npz[k]) for k in FIELDS)
+            res["ok"] = bool(npz["ok"])
+        return res
+
+    def pending(self):
+        '''[(run, rel)] of the captures without an up to date cached result'''
+        todo = []
+        self.manifests = {}
+        for run in self.runs:
+            manifest = {} if self.force else self.load_manifest(run)
+            self.manifests[run] = manifest
+            for rel in run_files(os.path.join(self.root, run)):
+                fp = os.path.join(self.root, run, rel)
+                if manifest.get(rel) != file_key(fp) or not os.path.isfile(self.cache_path(run, rel)):
+                    todo.append((run, rel))
+        return todo
+
+    def analyze_all(self):
+        todo = self.pending()
+        self.pr ("{} run folders, {} captures to analyze".format(len(self.runs), len(todo)))
+        t0 = time.time()
+        failed = 0
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            futs = {}
+            for run, rel in todo:
+                fp = os.path.join(self.root, run, rel)
+                futs[pool.submit(analyze, fp, rel.startswith("RMS/"))] = (run, rel, file_key(fp))
+            for n, fut in enumerate(as_completed(futs)):
+                run, rel, key = futs[fut]
+                try:
+                    res = fut.result()
+                except Exception as e:
+                    self.pr ("{}/{}: {!r}".format(run, rel, e))
+                    failed += 1
+                    continue
+                self.save_result(run, rel, res)
+                self.manifests[run][rel] = key
+                self.save_manifest(run, self.manifests[run])
+                if (n + 1) % 100 == 0:
+                    self.pr ("{} of {} captures analyzed".format(n + 1, len(todo)))
+        self.pr ("Analyzed {} captures in {:.1f} s, {} failed".format(len(todo) - failed, time.time() - t0, failed))
+
+    def summarize(self):
+        '''Writes reana/summary.csv and reana/gain.csv per run, reana_summary.csv and reana_gain.csv in root'''
+        all_rows = []
+        all_gains = []
+        for run, (femb_sn, env, cd, rerun) in self.runs.items():
+            results = {}
+            for rel in run_files(os.path.join(self.root, run)):
+                if os.path.isfile(self.cache_path(run, rel)):
+                    results[rel] = self.load_result(run, rel)
+            if not results:
+                continue
+            out_dir = os.path.join(self.root, run, REANA_DIR)
+            with open(os.path.join(out_dir, "summary.csv"), 'w', newline='') as f:
+                w = csv.writer(f)
+                w.writerow(["file", "chn", "ped", "rms", "pkp", "pkn", "ok"])
+                for rel, res in sorted(results.items()):
+                    for chn in range(len(res["ped"])):
+                        w.writerow([rel, chn] + ["{:.3f}".format(res[k][chn]) for k in FIELDS] + [int(res["ok"])])
+            for rel, res in sorted(results.items()):
+                amp = res["pkp"] - res["ped"]
+                all_rows.append([run, femb_sn, env, cd, rerun, rel, int(res["ok"]),
+                                 np.mean(res["ped"]), np.std(res["ped"]), np.mean(res["rms"]), np.max(res["rms"]), np.mean(amp), np.std(amp)])
+            gains = cali_gains(results)
+            with open(os.path.join(out_dir, "gain.csv"), 'w', newline='') as f:
+                w = csv.writer(f)
+                w.writerow(["setting", "chn", "gain", "offset"])
+                for setting, (gain, offset) in sorted(gains.items()):
+                    for chn in range(len(gain)):
+                        w.writerow([setting, chn, "{:.4f}".format(gain[chn]), "{:.2f}".format(offset[chn])])
+            for setting, (gain, offset) in sorted(gains.items()):
+                all_gains.append([run, femb_sn, env, cd, rerun, setting, np.mean(gain), np.std(gain), np.min(gain), np.max(gain)])
+
+        with open(os.path.join(self.root, "reana_summary.csv"), 'w', newline='') as f:
+            w = csv.writer(f)
+            w.writerow(["run", "femb_sn", "env", "cd", "rerun", "file", "ok", "ped_mean", "ped_std", "rms_mean", "rms_max", "amp_mean", "amp_std"])
+            for row in all_rows:
+                w.writerow(row[:7] + ["{:.3f}".format(x) for x in row[7:]])
+        with open(os.path.join(self.root, "reana_gain.csv"), 'w', newline='') as f:
+            w = csv.writer(f)
+            w.writerow(["run", "femb_sn", "env", "cd", "rerun", "setting", "gain_mean", "gain_std", "gain_min", "gain_max"])
+            for row in all_gains:
+                w.writerow(row[:6] + ["{:.4f}".format(x) for x in row[6:]])
+        self.pr ("Summaries of {} captures in {} runs written to {}".format(len(all_rows), len(self.runs), self.root))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-analyze the .h5 captures of every FEMB QC run in a QC archive")
+    parser.add_argument("root", nargs="?", default=ROOT, help="QC root folder [{}]".format(ROOT))
+    parser.add_argument("--workers", "-j", type=int, default=None, help="Analysis processes [one per CPU]")
+    parser.add_argument("--force", "-f", action="store_true", help="Analyze every capture again, even unchanged ones")
+    parser.add_argument("--summary", "-s", action="store_true", help="Only rewrite the summary tables from the cached results")
+    args = parser.parse_args()
+
+    if not args.root.endswith("/"):
+        args.root = args.root + "/"
+    reana = QC_reana(args.root, workers=args.workers, force=args.force)
+    if not args.summary:
+        reana.analyze_all()
+    reana.summarize()
@@ -18,45 +18,88 @@ from cls_udp import CLS_UDP
 from tcp_cfg import TCP_CFG
 import struct
 from raw_convertor import RAW_CONV
-import matplotlib.pyplot as plt
-import h5py
 import pickle
+import json
 from gen_33622a import GEN_CTL
 import datetime
 import copy
 import shutil
+import contextlib
+import sqlite3
+try:
+    #shared with the GUI, checkout needs the parent folder on PYTHONPATH (QC_batches.bat sets it)
+    import wib_alarms
+except ImportError:
+    print ("wib_alarms not found, add the folder above checkout to PYTHONPATH")
+    raise
+from qc_store import QC_store, QC_logs, DB_NAME
+import qc_ana
+import qc_db
+from settle import PWR_SETTLE
+
+def input_run_info(femb_sn=True):
+    '''Asks the tester about the run; femb_sn=False leaves the FEMB SN out'''
+    info = {}
+    info["tester"] = input ("please input your name: ")
+    if femb_sn:
+        info["femb_sn"] = int(input ("please input FEMB SN (000-999): "))
+    env_cs = input("Test is performed at cold(LN2) (Y/N)? :")
+    if ("Y" in env_cs) or ("y" in env_cs):
+        info["env"] = "LN"
+    else:
+        info["env"] = "RT"
+    ToyTPC_en = input("ToyTPC at FE inputs (Y/N) : ")
+    info["note"] = input("A short note (<200 letters):")
+    if ("Y" in ToyTPC_en) or ("y" in ToyTPC_en):
+        info["toytpc"] = "150pF"
+    else:
+        info["toytpc"] = "0pF"
+    return info
 
 class QC_runs( ):
-    def __init__(self):
+    def __init__(self, slot=0, arbiter=None, gen=None):
         super().__init__()
+        self.femb_no = slot
         self.tcp = TCP_CFG()
+        self.tcp.link_cs = 0 if slot == 0 else 1 << slot
+        self.tcp.arbiter = arbiter
         self.udp = CLS_UDP()
         self.conv = RAW_CONV()
-        self.gen = GEN_CTL()
-        self.gen.gen_init()
+        if gen is None:
+            gen = GEN_CTL()
+            gen.gen_init()
+        self.gen = gen
         self.logs = {}
         self.root = "D:/IO_1826_1B/QC/"
         self.save_dir = None
+        self.store = None
+        self.stage = None
+        self.ana_workers = 2
+        self.run_info = None #answers to the FEMB_CHKOUT_Input prompts, if they are known beforehand
+        self.logs_file = "./logs_dir.txt"
+        self.pwr_trace = 2.0 #s of power readings recorded through each power cycle switch, 0 for none
+        # "search": coarse-to-fine peak phase search on short in memory captures,
+        # cached per FEMB in phase_cache; "sweep": all 16 phases saved to HDF5
+        self.phase_mode = "search"
+        self.phase_cache = self.root + "phase_cache.json"
+        self.phase_pkts = 80
+        self.phase_tol = 0.05
+        self.alarm_limits = os.path.join(os.path.dirname(os.path.abspath(wib_alarms.__file__)), "settings_alarms.ini") #qc.* rail windows
+        self.results_db = self.root + qc_db.DB_NAME #results of all runs, for queries across FEMBs
 
     def FEMB_CHKOUT_Input(self):
         print ("Check WIB status")
         hw_ver, fw_ver = self.tcp.wib_ver()
         print ("WIB HW Versiont = 0x{:04x}, SW Versiont = 0x{:04x}".format(hw_ver, fw_ver))
         
-        print ("Connect FEMB to WIB Slot0")
-        tester = input ("please input your name: ")
-        femb_sn = int(input ("please input FEMB SN (000-999): "))
-        env_cs = input("Test is performed at cold(LN2) (Y/N)? :")
-        if ("Y" in env_cs) or ("y" in env_cs):
-            env = "LN"
-        else:
-            env = "RT"
-        ToyTPC_en = input("ToyTPC at FE inputs (Y/N) : ")
-        note = input("A short note (<200 letters):")
-        if ("Y" in ToyTPC_en) or ("y" in ToyTPC_en):
-            toytpc = "150pF"
-        else:
-            toytpc = "0pF"
+        if self.run_info is None:
+            print ("Connect FEMB to WIB Slot{}".format(self.femb_no))
+            self.run_info = input_run_info()
+        tester = self.run_info["tester"]
+        femb_sn = self.run_info["femb_sn"]
+        env = self.run_info["env"]
+        toytpc = self.run_info["toytpc"]
+        note = self.run_info["note"]
         save_dir = self.root + "FEMB{:03d}_{}_{}/".format(femb_sn, env, toytpc)
         if (os.path.exists(save_dir)):
             print ("Folder exist, please check the entering infomation...")
@@ -92,7 +135,21 @@ class QC_runs( ):
         self.logs["Note"] = note 
         self.save_dir = save_dir
         self.logs["save_dir"]  = self.save_dir
+        self.open_store(initial=self.logs)
+
+    def hold(self, *names):
+        return self.tcp.hold(*names)
+
+    def pwr_settle(self, name, femb_no, timeout):
+        '''Waits for the power readings of femb_no to settle, at most timeout s (the fixed wait this replaces)'''
+        return self.tcp.settle.wait(name, lambda: self.tcp.femb_pwr_rd(femb=femb_no, avg_n=1), timeout, **PWR_SETTLE)
 
+    def open_store(self, initial=None, stages=None):
+        '''Makes self.logs write through to qc_results.db in the save folder'''
+        if self.store is None:
+            self.store = QC_store(self.save_dir + DB_NAME)
+        self.store.stage = self.stage
+        self.logs = QC_logs(self.store, initial=initial, stages=stages)
 
     def pwr_info_print(self, pwr_info):
         print ("V(FE)={:.3f}V, I(FE)={:.3f}A".format(pwr_info[0][0], pwr_info[0][1]))
@@ -101,31 +158,18 @@ class QC_runs( ):
         print ("V(BIAS)={:.3f}V, I(BIAS)={:.3f}A".format(pwr_info[3][0], pwr_info[3][1]))
 
     def pwr_chk(self, pwr_info, v_fe, v_adc, v_cd, v_bias, iref_fe, iref_adc, iref_cd, iref_bias):
+        rails = ["FE", "ADC", "CD", "BIAS"]
+        refs = [v_fe, v_adc, v_cd, v_bias, iref_fe, iref_adc, iref_cd, iref_bias]
+        cols = ["qc.{}.V".format(r) for r in rails] + ["qc.{}.A".format(r) for r in rails]
+        alarms = wib_alarms.AlarmEngine(cols, wib_alarms.load_windows(self.alarm_limits, dict(zip(cols, refs))))
+        vals = [pwr_info[i][0] for i in range(4)] + [pwr_info[i][1] for i in range(4)]
+        alarms.evaluate(vals)
         pwr_en = 1
-        if abs(v_fe - pwr_info[0][0] ) > 0.2 :
-            print ("Power rail for FE, set={}V, read={}V, please check connection".format(v_fe, pwr_info[0][0]))
-            pwr_en = 0
-        if abs(v_adc - pwr_info[1][0] ) > 0.2 :
-            print ("Power rail for ADC, set={}V, read={}V, please check connection".format(v_fe, pwr_info[1][0]))
-            pwr_en = 0
-        if abs(v_cd - pwr_info[2][0] ) > 0.2 :
-            print ("Power rail for CD, set={}V, read={}V, please check connection".format(v_fe, pwr_info[2][0]))
-            pwr_en = 0
-        if abs(v_bias - pwr_info[3][0] ) > 0.2 :
-            print ("Power rail for BIAS, set={}V, read={}V, please check connection".format(v_fe, pwr_info[3][0]))
-            pwr_en = 0
-        
-        if abs(iref_fe - pwr_info[0][1] ) > 0.3 :
-            print ("Power rail for FE, current of range, ref={}A, read={}A, please check connection".format(iref_fe, pwr_info[0][1]))
-            pwr_en = 0
-        if abs(iref_adc - pwr_info[1][1] ) > 0.3 :
-            print ("Power rail for ADC, current of range, ref={}A, read={}A, please check connection".format(iref_adc, pwr_info[1][1]))
-            pwr_en = 0
-        if abs(iref_cd - pwr_info[2][1] ) > 0.1 :
-            print ("Power rail for CD, current of range, ref={}A, read={}A, please check connection".format(iref_cd, pwr_info[2][1]))
-            pwr_en = 0
-        if abs(iref_bias - pwr_info[3][1] ) > 0.1 :
-            print ("Power rail for BIAS, current of range, ref={}A, read={}A, please check connection".format(iref_bias, pwr_info[3][1]))
+        for i in np.nonzero(alarms.state)[0]:
+            if i < 4:
+                print ("Power rail for {}, set={}V, read={}V, please check connection".format(rails[i], refs[i], vals[i]))
+            else:
+                print ("Power rail for {}, current of range, ref={}A, read={}A, please check connection".format(rails[i-4], refs[i], vals[i]))
             pwr_en = 0
         return pwr_en
 
@@ -135,13 +179,12 @@ class QC_runs( ):
 
         print ("power check...")
         self.tcp.femb_pwr_set(femb=femb_no, pwr_on=0)
-        time.sleep(2)
+        self.pwr_settle("pwr_off", femb_no, 2)
         self.tcp.femb_pwr_set(femb=femb_no, pwr_on=1, v_fe=v_fe, v_adc=v_adc, v_cd=v_cd)
-        time.sleep(5)
+        time.sleep(5) #FEMB boot, not a settle
         self.tcp.set_fe_board(sts=0,snc=0,sg0=0,sg1=0,st0=1,st1=1,swdac=0,dac=0x0)
         self.tcp.femb_cfg()
-        pwr_info = self.tcp.femb_pwr_rd(femb=femb_no)
-        time.sleep(2)
+        self.pwr_settle("pwr_init", femb_no, 2)
         pwr_info = self.tcp.femb_pwr_rd(femb=femb_no)
         pwr_en = self.pwr_chk(pwr_info, v_fe, v_adc, v_cd, v_bias, iref_fe, iref_adc, iref_cd, iref_bias)
         if pwr_en ==0 :
@@ -165,15 +208,14 @@ class QC_runs( ):
 
         print ("power measurment starts...")
         self.tcp.femb_pwr_set(femb=femb_no, pwr_on=1, v_fe=v_fe, v_adc=v_adc, v_cd=v_cd)
-        time.sleep(2)
+        self.pwr_settle("pwr_on", femb_no, 2)
 
         print ("Measure 1: Single-ended interface between ADC and FE")
         print ("Start FEMB configuration: 14mV/fC, 900mV BL, 2.0us, single-ended, 500pA, ASICDAC=0x00, Cali_disable, SDC off")
         self.logs["power_meas1_note"] = "Start FEMB configuration: 14mV/fC, 900mV BL, 2.0us, single-ended, 500pA, ASICDAC=0x00, Cali_disable, SDC off"
         self.tcp.set_fe_board(sts=0,snc=0,sg0=0,sg1=0,st0=1,st1=1,swdac=0,dac=0x0)
         self.tcp.femb_cfg()
-        time.sleep(1)
-        pwr_info = self.tcp.femb_pwr_rd(femb=femb_no)
+        self.pwr_settle("pwr_meas", femb_no, 1)
         pwr_info = self.tcp.femb_pwr_rd(femb=femb_no)
         self.pwr_info_print(pwr_info)
         self.logs["power_meas1_vfe_meas"] =  pwr_info[0]
@@ -186,8 +228,7 @@ class QC_runs( ):
         self.logs["power_meas2_note"] = "Start FEMB configuration: 14mV/fC, 900mV BL, 2.0us, single-ended, 500pA, ASICDAC=0x00, Cali_disable, SDC on"
         self.tcp.set_fe_board(sts=0,snc=0,sg0=0,sg1=0,st0=1,st1=1,swdac=0,dac=0x0, sdf=1)
         self.tcp.femb_cfg()
-        time.sleep(1)
-        pwr_info = self.tcp.femb_pwr_rd(femb=femb_no)
+        self.pwr_settle("pwr_meas", femb_no, 1)
         pwr_info = self.tcp.femb_pwr_rd(femb=femb_no)
         self.pwr_info_print(pwr_info)
         self.logs["power_meas2_vfe_meas"] =  pwr_info[0]
@@ -202,8 +243,7 @@ class QC_runs( ):
         for i in range(8):
             self.tcp.adcs_paras[i][1] = 1
         self.tcp.femb_cfg()
-        time.sleep(1)
-        pwr_info = self.tcp.femb_pwr_rd(femb=femb_no)
+        self.pwr_settle("pwr_meas", femb_no, 1)
         pwr_info = self.tcp.femb_pwr_rd(femb=femb_no)
         self.pwr_info_print(pwr_info)
         self.logs["power_meas3_vfe_meas"] =  pwr_info[0]
@@ -223,19 +263,19 @@ class QC_runs( ):
         else:
             print ("power cycles...")
             self.tcp.femb_pwr_set(femb=femb_no, pwr_on=0, v_fe=v_fe, v_adc=v_adc, v_cd=v_cd)
-            time.sleep(1)
+            self.pwr_settle("pwr_off", femb_no, 1)
 
             hdf_dir = self.create_folder(sub_folder = "PWR")
 
             for i in range(cycles):
                 print ("Cycle {} of {}".format(i, cycles))
                 pwr_info = self.tcp.femb_pwr_rd(femb=femb_no)
-                pwr_info = self.tcp.femb_pwr_rd(femb=femb_no)
                 self.pwr_info_print(pwr_info)
                 while (True):
-                    self.tcp.femb_pwr_set(femb=femb_no, pwr_on=0, v_fe=v_fe, v_adc=v_adc, v_cd=v_cd)
-                    time.sleep(1)
-                    pwr_info = self.tcp.femb_pwr_rd(femb=femb_no)
+                    pwr_trace = self.tcp.femb_pwr_set(femb=femb_no, pwr_on=0, v_fe=v_fe, v_adc=v_adc, v_cd=v_cd, trace=self.pwr_trace)
+                    if pwr_trace != None:
+                        self.logs["power_cycle{}_off_trace".format(i)] = pwr_trace
+                    self.pwr_settle("pwr_off", femb_no, 1)
                     pwr_info = self.tcp.femb_pwr_rd(femb=femb_no)
                     if (pwr_info[0][0] < 0.5) and (pwr_info[1][0] < 0.5) and (pwr_info[2][0] < 0.5) and (pwr_info[3][0] < 3) :
                         print ("FEMB is turned off")
@@ -249,7 +289,9 @@ class QC_runs( ):
                         print ("Wait until completely shut down")
                         time.sleep(1)
                 print ("Turn FEMB on")
-                self.tcp.femb_pwr_set(femb=femb_no, pwr_on=1, v_fe=v_fe, v_adc=v_adc, v_cd=v_cd)
+                pwr_trace = self.tcp.femb_pwr_set(femb=femb_no, pwr_on=1, v_fe=v_fe, v_adc=v_adc, v_cd=v_cd, trace=self.pwr_trace)
+                if pwr_trace != None:
+                    self.logs["power_cycle{}_on_trace".format(i)] = pwr_trace
                 time.sleep(2)
                 note = "Start FEMB configuration: 14mV/fC, 2.0us, 900mV BL, single-ended, 500pA, ASICDAC=0x10, Cali_enable, SDC off"
                 self.logs["power_cycle{}_note".format(i)] = note
@@ -261,8 +303,7 @@ class QC_runs( ):
                 time.sleep(0.1)
                 fp = hdf_dir + "power_cycle{}_".format(i) +"CHK_response_SE.h5"
                 femb_data = self.femb_save_h5 (femb_no=femb_no, fp=fp, val=200, plot_en=True ) 
-                time.sleep(0.5)
-                pwr_info = self.tcp.femb_pwr_rd(femb=femb_no)
+                self.pwr_settle("pwr_cycle", femb_no, 0.5)
                 pwr_info = self.tcp.femb_pwr_rd(femb=femb_no)
                 self.logs["power_cycle{}_on_vfe_meas".format(i)] =  pwr_info[0]
                 self.logs["power_cycle{}_on_vadc_meas".format(i)] = pwr_info[1]
@@ -363,21 +404,26 @@ class QC_runs( ):
             sys.exit()    
         return subdir
 
-    def femb_save_h5 (self, femb_no=0, fp=None, val=1000, plot_en=False, ana_chk = True, rms_en = False ): 
+    def femb_capture (self, femb_no=0, fp=None, val=1000):
+        '''Hardware part of femb_save_h5: the raw packets of the 8 ASICs, retaken until RAW_CONV accepts them'''
         time.sleep(0.2)
         if fp == None:
             print ("Wrong file path...")
             exit()
         elif os.path.isfile(fp):
             os.remove(fp)
-        self.udp.get_rawdata_packets(val=1000)
-        femb_data = []
+        with self.hold("wib"):
+            self.udp.get_rawdata_packets(val=1000)
+            return self.femb_packets(femb_no=femb_no, val=val)
+
+    def femb_packets (self, femb_no=0, val=1000):
+        '''Raw packets of the 8 ASICs of femb_no, each retaken until RAW_CONV accepts it'''
+        raws = []
         ASICs=8
-        dset = [ [] for i in range(ASICs*16)]
-        with h5py.File(fp, "a") as f:
+        #the HS data link carries one ASIC of one slot at a time
+        with self.hold("wib"):
             for asic in range(ASICs):
-                chip_data = None
-                while ( chip_data == None):
+                while (True):
                     asic = asic & 0x0F
                     wib_asic = (((femb_no << 16) & 0x000F0000) + ((asic << 8) & 0xFF00))
                     self.udp.write_reg_wib_checked(7, 0x80000000)
@@ -385,142 +431,61 @@ class QC_runs( ):
                     self.udp.write_reg_wib_checked(7, wib_asic)
                     time.sleep(0.01)
                     data = self.udp.get_rawdata_packets(val=val)
-                    chip_data = self.conv.raw_conv_feedloc(data)
-                    if chip_data == None:
+                    if not qc_ana.check_packets(data, self.conv.jumbo_flag):
                         print ("no data received, rataking...")
                         time.sleep(0.1)
                     else:
                         break
-                
-                femb_data.append(chip_data)
-                for i in range(16):
-                    dset[i] = f.create_dataset('CH{}'.format(asic*16 + i), (len(chip_data[i]),), maxshape=(None,), dtype='u2', chunks=True) 
-                    dset[i][:] = chip_data[i]
-        ana =self.data_ana(femb_data, ana_chk, rms_en)
+                raws.append(data)
+        return raws
+
+    def femb_save_h5 (self, femb_no=0, fp=None, val=1000, plot_en=False, ana_chk = True, rms_en = False ): 
+        raws = self.femb_capture(femb_no=femb_no, fp=fp, val=val)
+        #pyplot is not thread safe, slots plot one at a time
+        with self.hold("plot") if plot_en else contextlib.nullcontext():
+            ana, femb_data = qc_ana.process(fp, raws, plot_en=plot_en, ana_chk=ana_chk, rms_en=rms_en, return_data=True)
         if ana == False:
             return False
         self.logs[fp] = ana
-        with open(fp[0:-3] + "ana.bin", 'wb') as fpana:
-            pickle.dump(ana, fpana)
-        if plot_en:
-            self.FEMB_CHK_PLOT(ana[0],ana[1],ana[2],ana[3],ana[4],ana[5],fp)
         return femb_data
 
+    def scan_submit (self, scan, key, femb_no=0, fp=None, val=1000, plot_en=False, ana_chk = True, rms_en = False ): 
+        '''Like femb_save_h5, but only the capture happens now; the rest runs in scan's workers'''
+        with scan.hardware():
+            raws = self.femb_capture(femb_no=femb_no, fp=fp, val=val)
+        scan.submit(key, fp, raws, plot_en=plot_en, ana_chk=ana_chk, rms_en=rms_en)
+        return self.scan_collect(scan)
+
+    def scan_collect (self, scan, wait=False):
+        '''Logs the finished settings of scan, returns [(key, fp, ana)] with ana False for failed ones'''
+        out = scan.done(wait=wait)
+        for key, fp, ana in out:
+            if ana != False:
+                self.logs[fp] = ana
+        return out
+
     def data_ana(self, femb_data, ana_chk = True, rms_en = False):
-        chn_rmss = []
-        chn_peds = []
-        chn_pkps = []
-        chn_pkns = []
-        chn_onewfs = []
-        chn_avgwfs = []
-    
-        for chipi in range(8):
-            plsn = (len(femb_data[chipi][0])//500)-10
-            if plsn > 100:
-                plsn = 100
-    
-            for i in range(plsn):
-                if i == 0:
-                    avg_wf = np.array(femb_data[chipi][0][0:500])&0xffff
-                else:
-                    avg_wf = avg_wf + (np.array(femb_data[chipi][0][500*i:500*i+500])&0xffff)
-            avg_wf = avg_wf//plsn
-            posp = np.where(avg_wf == np.max(avg_wf))[0][0] + 500-50
-    
-            for chn in range(16):
-                peddata = []
-                chndata = femb_data[chipi][chn][posp:]
-                one_wf = chndata[0:500]
-                for i in range(plsn):
-                    peddata += chndata[150 + 500*i: 500 + 500*i] 
-                    if i == 0:
-                        avg_wf = np.array(chndata[0:500])&0xffff
-                    else:
-                        avg_wf = avg_wf + (np.array(chndata[500*i:500*i+500])&0xffff)
-                avg_wf = avg_wf//plsn
-    
-                if rms_en == True:
-                    peddata = chndata 
-                rms    = np.std(peddata)
-                ped    = int(np.mean(peddata))
-                peakp = np.max(avg_wf)
-                peakn = np.min(avg_wf)            
-    
-                chn_rmss.append( rms   )  
-                chn_peds.append( ped   )  
-                chn_pkps.append( peakp )  
-                chn_pkns.append( peakn )  
-                chn_onewfs.append(one_wf )  
-                chn_avgwfs.append(avg_wf )  
-        chn_ampps = np.array(chn_pkps) - np.array(chn_peds)
-        chip0_ped_mean = np.mean(chn_peds[0:16])
-        chip0_amp_mean = np.mean(chn_ampps[0:16])
-        if ana_chk:
-            for tmpi in range(7):
-                if abs(np.mean(chn_ampps[16+16*tmpi:32+16*tmpi]) -  chip0_amp_mean) > 500:
-                    print ("FEMB configuration error (AMP diff), plase reconfigurate FEMB and retake data...")
-                    return False
-                elif abs(np.mean(chn_peds[16+16*tmpi:32+16*tmpi]) -  chip0_ped_mean) > 500:
-                    print ("FEMB configuration error (Ped diff), plase reconfigurate FEMB and retake data...")
-                    return False
-
-        return chn_rmss,chn_peds, chn_pkps, chn_pkns, chn_onewfs, chn_avgwfs
+        return qc_ana.data_ana(femb_data, ana_chk, rms_en)
 
     def FEMB_SUB_PLOT(self, ax, x, y, title, xlabel, ylabel, color='b', marker='.', atwinx=False, ylabel_twx = "", e=None):
-        ax.set_title(title)
-        ax.set_xlabel(xlabel)
-        ax.set_ylabel(ylabel)
-        ax.grid(True)
-        if (atwinx):
-            ax.errorbar(x,y,e, marker=marker, color=color)
-            y_min = int(np.min(y))-1000
-            y_max = int(np.max(y))+1000
-            ax.set_ylim([y_min, y_max])
-            ax2 = ax.twinx()
-            ax2.set_ylabel(ylabel_twx)
-            ax2.set_ylim([int((y_min/16384.0)*2048), int((y_max/16384.0)*2048)])
-        else:
-            ax.plot(x,y, marker=marker, color=color)
-    
+        qc_ana.FEMB_SUB_PLOT(ax, x, y, title, xlabel, ylabel, color, marker, atwinx, ylabel_twx, e)
+
     def FEMB_CHK_PLOT(self, chn_rmss,chn_peds, chn_pkps, chn_pkns, chn_onewfs, chn_avgwfs, fp):
-    #    import matplotlib.pyplot as plt
-        fig = plt.figure(figsize=(10,6))
-        fn = fp.split("/")[-1][0:-3]
-        print (fn)
-        ax1 = plt.subplot2grid((4, 4), (0, 0), colspan=2, rowspan=2)
-        ax2 = plt.subplot2grid((4, 4), (0, 2), colspan=2, rowspan=2)
-        ax3 = plt.subplot2grid((4, 4), (2, 0), colspan=2, rowspan=2)
-        ax4 = plt.subplot2grid((4, 4), (2, 2), colspan=2, rowspan=2)
-        chns = range(128)
-        self.FEMB_SUB_PLOT(ax1, chns, chn_rmss, title="RMS Noise", xlabel="CH number", ylabel ="ADC / bin", color='r', marker='.')
-        self.FEMB_SUB_PLOT(ax2, chns, chn_peds, title="Red: Pos Peak. Blue: Pedestal. Green: Neg Peak", xlabel="CH number", ylabel ="ADC / bin", color='r', marker='.')
-        self.FEMB_SUB_PLOT(ax2, chns, chn_pkps, title="Red: Pos Peak. Blue: Pedestal. Green: Neg Peak", xlabel="CH number", ylabel ="ADC / bin", color='b', marker='.')
-        self.FEMB_SUB_PLOT(ax2, chns, chn_pkns, title="Red: Pos Peak. Blue: Pedestal. Green: Neg Peak", xlabel="CH number", ylabel ="ADC / bin", color='g', marker='.')
-        for chni in chns:
-            ts = 100 
-            x = (np.arange(ts)) * 0.5
-            y3 = chn_onewfs[chni][25:ts+25]
-            y4 = chn_avgwfs[chni][25:ts+25]
-            self.FEMB_SUB_PLOT(ax3, x, y3, title="Waveform Overlap", xlabel="Time / $\mu$s", ylabel="ADC /bin", color='C%d'%(chni%9))
-            self.FEMB_SUB_PLOT(ax4, x, y4, title="Averaging(100 Cycles) Waveform Overlap", xlabel="Time / $\mu$s", ylabel="ADC /bin", color='C%d'%(chni%9))
-                    
-        fig.suptitle(fn)
-        plt.tight_layout( rect=[0.05, 0.05, 0.95, 0.95])
-        fn = fp[0:-3] + ".png"
-        plt.savefig(fn)
-        plt.close()
+        qc_ana.FEMB_CHK_PLOT(chn_rmss,chn_peds, chn_pkps, chn_pkns, chn_onewfs, chn_avgwfs, fp)
 
     def femb_chks (self, femb_no=0 ): 
         hw_ver, fw_ver = self.tcp.wib_ver()
         print ("WIB HW Versiont = 0x{:04x}, SW Versiont = 0x{:04x}".format(hw_ver, fw_ver))
 
-        self.udp.write_reg_wib_checked(2, 0)
-        time.sleep(0.05)
-        self.udp.write_reg_wib_checked(2, 0)
-        self.udp.write_reg_wib_checked(2, 1)
-        time.sleep(0.05)
-        self.udp.write_reg_wib_checked(2, 1)
-        time.sleep(0.05)
+        #WIB wide register, the other slots must not capture or read registers meanwhile
+        with self.hold("wib"):
+            self.udp.write_reg_wib_checked(2, 0)
+            time.sleep(0.05)
+            self.udp.write_reg_wib_checked(2, 0)
+            self.udp.write_reg_wib_checked(2, 1)
+            time.sleep(0.05)
+            self.udp.write_reg_wib_checked(2, 1)
+            time.sleep(0.05)
 
         hdf_dir = self.create_folder(sub_folder = "CHK")
 
@@ -611,20 +576,22 @@ class QC_runs( ):
             self.tcp.set_fe_reset()
             self.tcp.set_fe_board(sts=1,snc=1,sg0=1,sg1=1,st0=1,st1=1,swdac=2,dac=0x00)
             self.logs["CHK_2bitDAC_WIBPLS"] = "sts=1,snc=0,sg0=1,sg1=1,st0=1,st1=1,swdac=2,dac=0x00"
-            self.gen.gen_chn_sw(chn=1, SW="ON")
-            self.tcp.femb_cfg()
-            self.tcp.wib_cntl_cs(lemo_en = True)
-            self.tcp.femb_cd_wr(c_id=3, c_page=0, c_addr=0x27, c_data=0x1f)
-            self.tcp.femb_cd_wr(c_id=2, c_page=0, c_addr=0x27, c_data=0x1f)
-            self.tcp.femb_cd_wr(c_id=3, c_page=0, c_addr=0x26, c_data=0x3) 
-            self.tcp.femb_cd_wr(c_id=2, c_page=0, c_addr=0x26, c_data=0)
-            time.sleep(2)
-            fp = hdf_dir + "CHK_2bitDAC_WIBPLS.h5"
-            femb_data = self.femb_save_h5 (femb_no=femb_no, fp=fp, val=200, plot_en=True ) 
-            self.tcp.wib_cntl_cs(lemo_en = False)
-            self.gen.gen_chn_sw(chn=1, SW="OFF")
-            self.tcp.femb_cd_wr(c_id=3, c_page=0, c_addr=0x26, c_data=0x2)
-            self.tcp.femb_cd_wr(c_id=2, c_page=0, c_addr=0x26, c_data=0x0)
+            #the generator and the WIB LEMO pulse reach every slot
+            with self.hold("gen", "wib"):
+                self.gen.gen_chn_sw(chn=1, SW="ON")
+                self.tcp.femb_cfg()
+                self.tcp.wib_cntl_cs(lemo_en = True)
+                self.tcp.femb_cd_wr(c_id=3, c_page=0, c_addr=0x27, c_data=0x1f)
+                self.tcp.femb_cd_wr(c_id=2, c_page=0, c_addr=0x27, c_data=0x1f)
+                self.tcp.femb_cd_wr(c_id=3, c_page=0, c_addr=0x26, c_data=0x3) 
+                self.tcp.femb_cd_wr(c_id=2, c_page=0, c_addr=0x26, c_data=0)
+                time.sleep(2)
+                fp = hdf_dir + "CHK_2bitDAC_WIBPLS.h5"
+                femb_data = self.femb_save_h5 (femb_no=femb_no, fp=fp, val=200, plot_en=True ) 
+                self.tcp.wib_cntl_cs(lemo_en = False)
+                self.gen.gen_chn_sw(chn=1, SW="OFF")
+                self.tcp.femb_cd_wr(c_id=3, c_page=0, c_addr=0x26, c_data=0x2)
+                self.tcp.femb_cd_wr(c_id=2, c_page=0, c_addr=0x26, c_data=0x0)
             time.sleep(1)
 
     def femb_asicdac_calis(self, femb_no=0 ): 
@@ -642,15 +609,17 @@ class QC_runs( ):
             sgs = ["14_0mVfC", "25_0mVfC", "7_8mVfC", "4_7mVfC" ]
             sts = ["1_0us", "0_5us",  "3_0us", "2_0us"]
 
-        self.udp.write_reg_wib_checked(2, 0)
-        time.sleep(0.05)
-        self.udp.write_reg_wib_checked(2, 0)
-        self.udp.write_reg_wib_checked(2, 1)
-        time.sleep(0.05)
-        self.udp.write_reg_wib_checked(2, 1)
-        time.sleep(0.05)
+        with self.hold("wib"):
+            self.udp.write_reg_wib_checked(2, 0)
+            time.sleep(0.05)
+            self.udp.write_reg_wib_checked(2, 0)
+            self.udp.write_reg_wib_checked(2, 1)
+            time.sleep(0.05)
+            self.udp.write_reg_wib_checked(2, 1)
+            time.sleep(0.05)
 
         hdf_dir = self.create_folder(sub_folder = "ASICDAC_CALI")
+        scan = qc_ana.Scan_pipeline(self.ana_workers)
 
         for i in range(len(sncs)):
             snc = i
@@ -670,57 +639,172 @@ class QC_runs( ):
                     st1 = k//2
 
                     print ("Peak finding, please wait...")
-                    femb_data = False
-                    while femb_data == False:
+                    cfg = "{}_{}_{}".format(sncs[i], sgs[j], sts[k])
+                    while True:
                         asicdac = 0x10
-                        self.tcp.set_fe_reset()
-                        self.tcp.set_fe_board(sts=1,snc=snc,sg0=sg0,sg1=sg1,st0=st0,st1=st1,swdac=1,dac=asicdac)
-                        self.tcp.femb_cfg()
-                        aps =[]
-                        for pi in range(16):
-                            self.tcp.cd_fe_cali(phase0x07=[pi, pi, pi, pi, pi, pi, pi, pi])
+                        with scan.hardware():
+                            self.tcp.set_fe_reset()
+                            self.tcp.set_fe_board(sts=1,snc=snc,sg0=sg0,sg1=sg1,st0=st0,st1=st1,swdac=1,dac=asicdac)
+                            self.tcp.femb_cfg()
+                        if self.phase_mode == "sweep":
+                            pis = self.phase_sweep(scan, femb_no, hdf_dir + "CALI_{}_ASICDAC0x{:02x}".format(cfg, asicdac))
+                            if pis is None:
+                                continue
+                        else:
+                            with scan.hardware():
+                                pis, amps, caps = self.phase_search(femb_no, cfg)
+                            print ("Peak phases {} found with {} captures".format(pis, caps))
+                        self.logs["CALI_{}_phases".format(cfg)] = pis
+
+                        with scan.hardware():
+                            self.tcp.cd_fe_cali(phase0x07=pis)
                             self.tcp.fc_act_cal() #enalbe LArASIC calibration
-                            fp = hdf_dir + "CALI_{}_{}_{}_ASICDAC0x{:02x}_CD0x07v0x{:02x}.h5".format(sncs[i], sgs[j], sts[k], asicdac, pi)
-                            femb_data = self.femb_save_h5 (femb_no=femb_no, fp=fp, val=200, plot_en = False ) 
-                            if femb_data == False:
-                                break
-                            self.tcp.fc_act_cal() #disable LArASIC calibration
-                            ana =self.data_ana(femb_data)
-                            ampps = np.array(ana[2]) - np.array(ana[1])
-                            aps.append(list(ampps))
-                        tmp = []
-                        for tmpi in range(128):
-                            tmp2=[]
-                            for tmp2i in range(16):
-                                tmp2.append(aps[tmp2i][tmpi])
-                            tmp.append(tmp2)
-
-                        locs =[]
-                        for chi in range(128):
-                            loc = np.where(tmp[chi] == np.max(tmp[chi]))[0][0]
-                            locs.append(loc)
-
-                        pis = []
-                        for ptmpi in range(8):
-                            pis.append(int(np.mean(locs[16*ptmpi : 16*ptmpi+16])))
-
-                        self.tcp.cd_fe_cali(phase0x07=pis)
-                        self.tcp.fc_act_cal() #enalbe LArASIC calibration
                         print ("Phase for peak is programmed") 
 
                         print ("Calibration ...")
+                        results = []
                         for asicdac in range(0, vmaxdac, 4):
                             log = "ASICDAC_Calibration, FE with {}_{}_{}_ASICDAC0x{:02x}".format(sncs[i], sgs[j], sts[k], asicdac)
                             print (log)
                             self.logs["CALI_{}_{}_{}_ASICDAC0x{:02x}".format(sncs[i], sgs[j], sts[k], asicdac)] = log
-                            self.tcp.set_fe_reset()
-                            self.tcp.set_fe_board(sts=1,snc=snc,sg0=sg0,sg1=sg1,st0=st0,st1=st1,swdac=1,dac=asicdac)
-                            self.tcp.fe_spi_prog()
-                            time.sleep(0.05)
+                            with scan.hardware():
+                                self.tcp.set_fe_reset()
+                                self.tcp.set_fe_board(sts=1,snc=snc,sg0=sg0,sg1=sg1,st0=st0,st1=st1,swdac=1,dac=asicdac)
+                                self.tcp.fe_spi_prog()
+                                time.sleep(0.05)
                             fp = hdf_dir + "CALI_{}_{}_{}_ASICDAC0x{:02x}.h5".format(sncs[i], sgs[j], sts[k], asicdac)
-                            femb_data = self.femb_save_h5 (femb_no=femb_no, fp=fp, val=200, plot_en = False ) 
-                            if femb_data == False:
-                                break
+                            results += self.scan_submit(scan, asicdac, femb_no=femb_no, fp=fp, val=200, plot_en = False ) 
+                        results += self.scan_collect(scan, wait=True)
+                        if not any(ana == False for key, fp, ana in results):
+                            if self.phase_mode != "sweep":
+                                self.phase_cache_put(cfg, pis, amps)
+                            break
+                        print ("FEMB configuration error, retake the {}_{}_{} calibration".format(sncs[i], sgs[j], sts[k]))
+        scan.close()
+        scan.report()
+
+    def phase_sweep(self, scan, femb_no, fp_prefix):
+        '''Peak phases from all 16 cd_fe_cali phases, each capture saved as fp_prefix_CD0x07v0x??.h5; None if one failed'''
+        results = []
+        for pi in range(16):
+            with scan.hardware():
+                self.tcp.cd_fe_cali(phase0x07=[pi, pi, pi, pi, pi, pi, pi, pi])
+                self.tcp.fc_act_cal() #enalbe LArASIC calibration
+            fp = fp_prefix + "_CD0x07v0x{:02x}.h5".format(pi)
+            results += self.scan_submit(scan, pi, femb_no=femb_no, fp=fp, val=200, plot_en = False ) 
+            with scan.hardware():
+                self.tcp.fc_act_cal() #disable LArASIC calibration
+        #the phase scan is analyzed while the later phases are captured
+        results += self.scan_collect(scan, wait=True)
+        if any(ana == False for key, fp, ana in results):
+            return None
+        aps =[]
+        for pi, fp, ana in sorted(results, key=lambda r: r[0]):
+            ampps = np.array(ana[2]) - np.array(ana[1])
+            aps.append(list(ampps))
+        tmp = []
+        for tmpi in range(128):
+            tmp2=[]
+            for tmp2i in range(16):
+                tmp2.append(aps[tmp2i][tmpi])
+            tmp.append(tmp2)
+
+        locs =[]
+        for chi in range(128):
+            loc = np.where(tmp[chi] == np.max(tmp[chi]))[0][0]
+            locs.append(loc)
+
+        pis = []
+        for ptmpi in range(8):
+            pis.append(int(np.mean(locs[16*ptmpi : 16*ptmpi+16])))
+        return pis
+
+    def phase_amps(self, femb_no, pis):
+        '''(8,16) pulse amplitudes with the 8 chips at phases pis, from a short capture that is never written to disk'''
+        while True:
+            self.tcp.cd_fe_cali(phase0x07=pis)
+            self.tcp.fc_act_cal() #enalbe LArASIC calibration
+            time.sleep(0.2)
+            raws = self.femb_packets(femb_no=femb_no, val=self.phase_pkts)
+            self.tcp.fc_act_cal() #disable LArASIC calibration
+            femb_data = qc_ana.decode(raws)
+            amps = None if femb_data is None else qc_ana.pulse_amps(femb_data)
+            if amps is not None:
+                return amps
+            print ("Phase search capture is too short, rataking...")
+
+    def phase_search(self, femb_no, cfg):
+        '''
+        Peak phase of each chip for configuration cfg, as (pis, chip mean amplitudes,
+        captures taken). A cached result of this FEMB is used when one capture at
+        the cached phases reproduces its amplitudes within phase_tol. Otherwise
+        phases 0, 4, 8, 12 are measured and each chip is refined by +-2 then +-1
+        around its best phase; the chips are refined in the same captures. The
+        pick per chip is the mean of the per channel best phases, as in phase_sweep.
+        '''
+        caps = 0
+        cached = self.phase_cache_get(cfg)
+        if cached is not None:
+            amps = self.phase_amps(femb_no, cached["pis"]).mean(axis=1)
+            caps += 1
+            ref = np.array(cached["amps"])
+            if np.all(np.abs(amps - ref) <= self.phase_tol*np.abs(ref)):
+                return cached["pis"], list(amps), caps
+            print ("Cached phases of {} do not reproduce, searching again".format(cfg))
+
+        meas = [{} for chip in range(8)]
+        def measure(pis):
+            amps = self.phase_amps(femb_no, pis)
+            for chip in range(8):
+                meas[chip][pis[chip]] = amps[chip]
+        def best(chip):
+            return max(meas[chip], key=lambda p: meas[chip][p].mean())
+
+        for pi in range(0, 16, 4):
+            measure([pi]*8)
+            caps += 1
+        for step in (2, 1):
+            centers = [best(chip) for chip in range(8)]
+            for d in (-step, step):
+                pis = [min(max(c + d, 0), 15) for c in centers]
+                if all(pis[chip] in meas[chip] for chip in range(8)):
+                    continue
+                measure(pis)
+                caps += 1
+
+        pis = []
+        for chip in range(8):
+            phases = sorted(meas[chip])
+            amps = np.array([meas[chip][p] for p in phases])
+            pis.append(int(np.mean([phases[loc] for loc in np.argmax(amps, axis=0)])))
+        if not all(pis[chip] in meas[chip] for chip in range(8)):
+            measure(pis)
+            caps += 1
+        return pis, [float(meas[chip][pis[chip]].mean()) for chip in range(8)], caps
+
+    def phase_cache_id(self):
+        return "FEMB{:03d}_{}_{}".format(self.logs["FEMB_SN"], self.logs["Env"], self.logs["Cd"])
+
+    def phase_cache_load(self):
+        if os.path.isfile(self.phase_cache):
+            with open(self.phase_cache, 'r') as fp:
+                return json.load(fp)
+        return {}
+
+    def phase_cache_get(self, cfg):
+        with self.hold("cache"):
+            return self.phase_cache_load().get(self.phase_cache_id(), {}).get(cfg)
+
+    def phase_cache_put(self, cfg, pis, amps):
+        '''Remembers the peak phases of cfg for later runs of this FEMB'''
+        with self.hold("cache"):
+            cache = self.phase_cache_load()
+            cache.setdefault(self.phase_cache_id(), {})[cfg] = {"pis" : [int(p) for p in pis], "amps" : [float(a) for a in amps], 
+                                                                "time" : datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
+            #a reader never sees a half written file
+            with open(self.phase_cache + ".tmp", 'w') as fp:
+                json.dump(cache, fp, indent=1)
+            os.replace(self.phase_cache + ".tmp", self.phase_cache)
 
     def femb_rmss(self, femb_no=0 ): 
         hw_ver, fw_ver = self.tcp.wib_ver()
@@ -737,60 +821,93 @@ class QC_runs( ):
             sgs = ["14_0mVfC", "25_0mVfC", "7_8mVfC", "4_7mVfC" ]
             sts = ["1_0us", "0_5us",  "3_0us", "2_0us"]
 
-        self.udp.write_reg_wib_checked(2, 0)
-        time.sleep(0.05)
-        self.udp.write_reg_wib_checked(2, 0)
-        self.udp.write_reg_wib_checked(2, 1)
-        time.sleep(0.05)
-        self.udp.write_reg_wib_checked(2, 1)
-        time.sleep(0.05)
+        with self.hold("wib"):
+            self.udp.write_reg_wib_checked(2, 0)
+            time.sleep(0.05)
+            self.udp.write_reg_wib_checked(2, 0)
+            self.udp.write_reg_wib_checked(2, 1)
+            time.sleep(0.05)
+            self.udp.write_reg_wib_checked(2, 1)
+            time.sleep(0.05)
 
         hdf_dir = self.create_folder(sub_folder = "RMS")
 
-        femb_data = False
-        while femb_data == False:
-            self.tcp.set_fe_reset()
-            self.tcp.femb_cfg()
-            for i in range(len(sncs)):
+        #each setting is analyzed, written and plotted in the workers while the next one is captured
+        scan = qc_ana.Scan_pipeline(self.ana_workers)
+        settings = [(i, j, k) for i in range(len(sncs)) for j in range(len(sgs)) for k in range(len(sts))]
+        while settings:
+            with scan.hardware():
+                self.tcp.set_fe_reset()
+                self.tcp.femb_cfg()
+            results = []
+            for i, j, k in settings:
                 snc=i
-                for j in range(len(sgs)):
-                    sg0 = j%2
-                    sg1 = j//2
-                    for k in range(len(sts)):
-                        st0 = k%2
-                        st1 = k//2
-                        log = "RMS, FE with {}_{}_{}".format(sncs[i], sgs[j], sts[k])
-                        print (log)
-                        self.logs["RMS_{}_{}_{}".format(sncs[i], sgs[j], sts[k])] = log
-                        self.tcp.set_fe_reset()
-                        self.tcp.set_fe_board(snc=snc,sg0=sg0,sg1=sg1,st0=st0,st1=st1)
-                        self.tcp.fe_spi_prog()
-                        time.sleep(0.05)
-                        fp = hdf_dir + "RMS_{}_{}_{}.h5".format(sncs[i], sgs[j], sts[k])
-                        femb_data = self.femb_save_h5 (femb_no=femb_no, fp=fp, val=1000, plot_en = True, rms_en = True ) 
+                sg0 = j%2
+                sg1 = j//2
+                st0 = k%2
+                st1 = k//2
+                log = "RMS, FE with {}_{}_{}".format(sncs[i], sgs[j], sts[k])
+                print (log)
+                self.logs["RMS_{}_{}_{}".format(sncs[i], sgs[j], sts[k])] = log
+                with scan.hardware():
+                    self.tcp.set_fe_reset()
+                    self.tcp.set_fe_board(snc=snc,sg0=sg0,sg1=sg1,st0=st0,st1=st1)
+                    self.tcp.fe_spi_prog()
+                    time.sleep(0.05)
+                fp = hdf_dir + "RMS_{}_{}_{}.h5".format(sncs[i], sgs[j], sts[k])
+                results += self.scan_submit(scan, (i, j, k), femb_no=femb_no, fp=fp, val=1000, plot_en = True, rms_en = True ) 
+            results += self.scan_collect(scan, wait=True)
+            settings = [key for key, fp, ana in results if ana == False]
+            if settings:
+                print ("FEMB configuration error in {} setting(s), retaking them".format(len(settings)))
+        scan.close()
+        scan.report()
 
 
     def load_logs(self): 
-        with open("./logs_dir.txt", 'r') as fp:
-            fp_logs = fp.read()
-        with open(fp_logs, 'rb') as fp:
-            self.logs = pickle.load(fp)
-            self.save_dir = self.logs["save_dir"] 
-            print (self.save_dir)
+        with open(self.logs_file, 'r') as fp:
+            fp_logs = fp.read().strip()
+        if fp_logs.endswith(DB_NAME):
+            self.save_dir = fp_logs[:-len(DB_NAME)]
+            self.open_store()
+        else:
+            #pickled logs of runs from before the result store
+            with open(fp_logs, 'rb') as fp:
+                self.logs = pickle.load(fp)
+        self.save_dir = self.logs["save_dir"] 
+        print (self.save_dir)
 
 
     def dump_logs(self, tm=1 ): 
-        with open(self.save_dir + "logs_tm{:03d}.bin".format(tm), 'wb') as fp:
-            pickle.dump(self.logs, fp)
+        if self.store is None:
+            with open(self.save_dir + "logs_tm{:03d}.bin".format(tm), 'wb') as fp:
+                pickle.dump(self.logs, fp)
+            fp_logs = self.save_dir + "logs_tm{:03d}.bin".format(tm)
+        else:
+            #entries were already written to the store as they were set
+            self.store.set_stage("tm{:03d}".format(tm), tm=tm, status="done", start=None, wall=None, io=None, entries=None, error=None)
+            fp_logs = self.save_dir + DB_NAME
         if (tm ==1):
-            with open("./logs_dir.txt", 'w') as fp:
-                fp.write(self.save_dir + "logs_tm{:03d}.bin".format(tm))
+            with open(self.logs_file, 'w') as fp:
+                fp.write(fp_logs)
 
     def close(self, femb_no=0 ): 
         self.tcp.femb_pwr_set(femb=femb_no, pwr_on=0)
         print ("Turn FEMB off")
+        self.results_db_add()
         print ("FEMB QC is done!")
 
+    def results_db_add(self):
+        '''Adds the per channel results of this run to the database across FEMBs'''
+        with self.hold("cache"):
+            try:
+                qdb = qc_db.QC_db(self.results_db)
+                n = qdb.add_run(self.logs)
+                qdb.close()
+                print ("{} settings added to {}".format(n, self.results_db))
+            except sqlite3.Error as e:
+                print ("Results not added to {}: {}".format(self.results_db, e))
+
 
 
 #    def femb_ext_calis(self, femb_no=0 ): 
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""
+File Name: QC_slots.py
+Description: Runs the FEMB QC of up to four FEMBs on one WIB at once, one
+             QC_pipeline per WIB slot in its own thread. Each slot has its own
+             result folder, result store and analysis workers. The resources
+             the slots share (HS data link and WIB wide registers, monitoring
+             ADC, FEMB power control, pulse generator, pyplot) are handed out
+             by an Arbiter, so one slot configures or captures while the
+             others wait for power up, settle or analyze.
+Created Time: 10/19/2026
+"""
+
+import sys
+import time
+import argparse
+import threading
+import contextlib
+import matplotlib
+matplotlib.use("Agg")
+from QC_runs import QC_runs, input_run_info
+from QC_pipeline import QC_pipeline, STAGES, stage_index
+from gen_33622a import GEN_CTL
+
+class Arbiter():
+    '''
+    Re-entrant locks of the resources shared by the slots of one WIB. hold()
+    takes the locks it is given in RESOURCES order, and the time each slot
+    waited for them is accumulated per resource.
+    '''
+    RESOURCES = ("gen", "psu", "wib", "mon", "plot", "cache")
+
+    def __init__(self):
+        self.locks = dict((name, threading.RLock()) for name in self.RESOURCES)
+        self.waits = dict((name, 0.0) for name in self.RESOURCES)
+        self.holds = dict((name, 0) for name in self.RESOURCES)
+        self.stats_lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def hold(self, *names):
+        names = sorted(set(names), key=self.RESOURCES.index)
+        t0 = time.time()
+        for name in names:
+            self.locks[name].acquire()
+        waited = time.time() - t0
+        with self.stats_lock:
+            for name in names:
+                self.waits[name] += waited
+                self.holds[name] += 1
+        try:
+            yield
+        finally:
+            for name in reversed(names):
+                self.locks[name].release()
+
+    def report(self, pr=print):
+        for name in self.RESOURCES:
+            if self.holds[name]:
+                pr ("{:<6} {:>7} holds, {:>8.1f} s waited".format(name, self.holds[name], self.waits[name]))
+
+class QC_slots():
+    '''
+    One QC_pipeline per populated slot, sharing a generator and an Arbiter.
+    run_info holds the answers common to all boards; femb_sns maps slot to FEMB SN.
+    '''
+    def __init__(self, femb_sns, run_info, workers=1, pr=print):
+        self.arbiter = Arbiter()
+        self.gen = GEN_CTL()
+        self.gen.gen_init()
+        self.pr = pr
+        self.pipes = {}
+        self.status = {}
+        for slot, femb_sn in sorted(femb_sns.items()):
+            qc = QC_runs(slot=slot, arbiter=self.arbiter, gen=self.gen)
+            qc.run_info = dict(run_info, femb_sn=femb_sn)
+            qc.ana_workers = workers
+            qc.logs_file = "./logs_dir_slot{}.txt".format(slot)
+            self.pipes[slot] = QC_pipeline(qc, pr=self.slot_pr(slot))
+
+    def slot_pr(self, slot):
+        def pr(msg):
+            self.pr ("[slot{}] {}".format(slot, msg))
+        return pr
+
+    def run_slot(self, slot, first, last):
+        pipe = self.pipes[slot]
+        try:
+            pipe.run(first, last)
+            self.status[slot] = "done"
+        except BaseException as e:
+            # QC_runs exits on a failed check, that only ends this slot
+            self.status[slot] = "failed in {}: {!r}".format(pipe.qc.stage, e)
+
+    def run(self, first=0, last=len(STAGES)-1):
+        t0 = time.time()
+        threads = []
+        for slot in self.pipes:
+            th = threading.Thread(target=self.run_slot, args=(slot, first, last), name="slot{}".format(slot))
+            th.start()
+            threads.append(th)
+        for th in threads:
+            th.join()
+        self.report(time.time() - t0)
+
+    def report(self, wall):
+        serial = 0
+        for slot, pipe in sorted(self.pipes.items()):
+            slot_wall = pipe.wall or 0
+            serial += slot_wall
+            self.pr ("Slot{} FEMB{:03d}: {:.1f} s, {}, results in {}".format(slot, pipe.qc.run_info["femb_sn"], slot_wall,
+                                                                             self.status.get(slot), pipe.qc.save_dir))
+        self.pr ("{} slots in {:.1f} s, {:.1f} s if run one after the other ({:.2f}x)".format(len(self.pipes), wall, serial, serial/max(wall, 1e-9)))
+        self.arbiter.report(self.pr)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the FEMB QC of several WIB slots at once")
+    parser.add_argument("--slots", "-s", type=int, nargs="+", default=[0, 1, 2, 3], help="Populated WIB slots [0 1 2 3]")
+    parser.add_argument("--to", dest="last", default=str(STAGES[-1][0]), help="Last stage to run [{}]".format(STAGES[-1][0]))
+    parser.add_argument("--workers", "-w", type=int, default=1, help="Analysis worker processes per slot [1]")
+    args = parser.parse_args()
+
+    if any(slot not in range(4) for slot in args.slots):
+        print ("WIB slots are 0-3")
+        sys.exit(1)
+    femb_sns = {}
+    for slot in sorted(set(args.slots)):
+        femb_sns[slot] = int(input ("please input SN (000-999) of the FEMB in WIB Slot{}: ".format(slot)))
+    if len(set(femb_sns.values())) != len(femb_sns):
+        print ("Every slot needs a different FEMB SN")
+        sys.exit(1)
+    run_info = input_run_info(femb_sn=False)
+    slots = QC_slots(femb_sns, run_info, workers=args.workers)
+    slots.run(0, stage_index(args.last))
@@ -413,11 +413,8 @@ tcp.set_fe_board(sts=0,snc=0,sg0=0,sg1=0,st0=1,st1=1,swdac=0,dac=0x0)
 tcp.femb_cfg()
 time.sleep(2)
 pwr_info = tcp.femb_pwr_rd(femb=femb)
-pwr_info = tcp.femb_pwr_rd(femb=femb)
 time.sleep(1)
 pwr_info = tcp.femb_pwr_rd(femb=femb)
-pwr_info = tcp.femb_pwr_rd(femb=femb)
-pwr_info = tcp.femb_pwr_rd(femb=femb)
 pwr_en = pwr_chk(pwr_info, v_fe, v_adc, v_cd, v_bias, iref_fe, iref_adc, iref_cd, iref_bias)
 if pwr_en ==0 :
     tcp.femb_pwr_set(femb=femb, pwr_on=0)
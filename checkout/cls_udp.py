@@ -24,6 +24,7 @@ import time
 import copy
 from socket import AF_INET, SOCK_DGRAM
 import codecs
+import os
 
 class CLS_UDP:
     def write_reg(self, reg , data ):
@@ -166,7 +167,7 @@ class CLS_UDP:
 ########################################################################################################
     #__INIT__#
     def __init__(self):
-        self.UDP_IP = "192.168.121.2"
+        self.UDP_IP = os.environ.get("WIB_UDP_IP", "192.168.121.2")
         self.KEY1 = 0xDEAD
         self.KEY2 = 0xBEEF
         self.FOOTER = 0xFFFF
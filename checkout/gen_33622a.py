@@ -23,8 +23,8 @@ import string
 import time
 import copy
 
-import visa
-from visa import VisaIOError
+import visa_backend as visa
+from visa_backend import VisaIOError
 
 class GEN_CTL:
     def gen_init(self):
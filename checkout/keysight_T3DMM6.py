@@ -13,8 +13,8 @@ import string
 import time
 import copy
 
-import pyvisa as visa
-#from visa import VisaIOError
+import visa_backend as visa
+from visa_backend import VisaIOError
 
 class PS_CTL:
     #Initialize power supply Keysight E36312A
@@ -131,5 +131,6 @@ class PS_CTL:
     def __init__(self):
         self.ADDR = u'USB0::0xF4EC::0xEE38::T0105C20190045::0::INSTR'
 
-a = PS_CTL()
-a.ps_init()
+if __name__ == "__main__":
+    a = PS_CTL()
+    a.ps_init()
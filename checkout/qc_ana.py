@@ -0,0 +1,280 @@
+# -*- coding: utf-8 -*-
+"""
+File Name: qc_ana.py
+Description: Analysis side of the FEMB QC captures: packet checks, decoding,
+             HDF5 writing, data_ana and the check plots. None of it needs the
+             instruments, so QC_runs can hand captures to worker processes
+             with Scan_pipeline and keep reconfiguring the FEMB meanwhile.
+Created Time: 10/19/2026
+"""
+
+import time
+import pickle
+import numpy as np
+import matplotlib.pyplot as plt
+from concurrent.futures import ProcessPoolExecutor
+from raw_convertor import RAW_CONV
+
+# Bump when data_ana changes its results, so QC_reana.py redoes archived files
+ANA_VERSION = 1
+
+def check_packets(raw_data, jumbo_flag=False):
+    '''True if RAW_CONV.raw_conv_feedloc would accept raw_data (consecutive packet counters and frame markers)'''
+    pkg_len = int(0x1E06/2) if jumbo_flag else int(0x406/2)
+    words = np.frombuffer(raw_data, dtype='>u2')
+    npkts = len(words)//pkg_len
+    if npkts < 3:
+        return True
+    pkts = words[:(npkts-1)*pkg_len].reshape(npkts-1, pkg_len)
+    cnt = (pkts[:,0].astype(np.int64) << 16) + pkts[:,1]
+    marker = pkts[:-1,8]
+    return bool(np.all((cnt[:-1] + 1 == cnt[1:]) & ((marker == 0xface) | (marker == 0xfeed))))
+
+def decode(raws):
+    '''raw_conv_feedloc of the packets of each ASIC, None if any of them is rejected'''
+    conv = RAW_CONV()
+    femb_data = []
+    for data in raws:
+        chip_data = conv.raw_conv_feedloc(data)
+        if chip_data == None:
+            return None
+        femb_data.append(chip_data)
+    return femb_data
+
+def pulse_amps(femb_data):
+    '''
+    (8,16) calibration pulse amplitudes (peak of the averaged pulse above its
+    baseline) from however many 500 sample pulses femb_data holds, None if it
+    holds less than one. Much cheaper than data_ana, for the short in memory
+    captures of the phase search.
+    '''
+    amps = []
+    for chip_data in femb_data:
+        n = min(len(d) for d in chip_data)
+        chip = np.array([d[:n] for d in chip_data], dtype=np.int64) & 0xffff
+        plsn = n//500
+        if plsn < 2:
+            return None
+        avg_wf = chip[0, :500*plsn].reshape(plsn, 500).mean(axis=0)
+        posp = int(np.argmax(avg_wf)) + 500-50
+        plsn = (n - posp)//500
+        if plsn < 1:
+            return None
+        wfs = chip[:, posp:posp + 500*plsn].reshape(16, plsn, 500).mean(axis=1)
+        amps.append(wfs.max(axis=1) - wfs[:, 150:].mean(axis=1))
+    return np.array(amps)
+
+def read_h5(fp):
+    '''femb_data (8 ASICs x 16 channels of sample lists) of a file written by write_h5'''
+    import h5py
+    with h5py.File(fp, "r") as f:
+        return [[f['CH{}'.format(asic*16 + i)][()].tolist() for i in range(16)] for asic in range(8)]
+
+def write_h5(fp, femb_data):
+    import h5py
+    with h5py.File(fp, "w") as f:
+        for asic, chip_data in enumerate(femb_data):
+            for i in range(16):
+                dset = f.create_dataset('CH{}'.format(asic*16 + i), (len(chip_data[i]),), maxshape=(None,), dtype='u2', chunks=True)
+                dset[:] = chip_data[i]
+
+def process(fp, raws, plot_en=False, ana_chk=True, rms_en=False, return_data=False):
+    '''
+    Everything femb_save_h5 does after the capture: decode, fp (HDF5), data_ana,
+    fp[:-3]+"ana.bin" and the check plot. Returns the data_ana tuple, or False
+    when the data fails the check (with return_data, (ana, femb_data)).
+    '''
+    femb_data = decode(raws)
+    if femb_data is None:
+        ana = False
+    else:
+        write_h5(fp, femb_data)
+        ana = data_ana(femb_data, ana_chk, rms_en)
+    if ana != False:
+        with open(fp[0:-3] + "ana.bin", 'wb') as fpana:
+            pickle.dump(ana, fpana)
+        if plot_en:
+            FEMB_CHK_PLOT(ana[0],ana[1],ana[2],ana[3],ana[4],ana[5],fp)
+    if return_data:
+        return ana, femb_data
+    return ana
+
+def timed_process(*args, **kwargs):
+    t0 = time.time()
+    ana = process(*args, **kwargs)
+    return ana, time.time() - t0
+
+def init_worker():
+    import matplotlib
+    matplotlib.use("Agg")
+
+class Scan_pipeline():
+    '''
+    Runs process() for the captures of a scan in worker processes. submit() returns
+    at once, so the caller can program and capture the next setting while earlier
+    ones are decoded, analyzed, written and plotted. done() hands back finished
+    (key, fp, ana) in submission order; failed settings come back with ana False.
+    With workers=0 everything runs inline, as before.
+    '''
+    def __init__(self, workers=2):
+        self.workers = workers
+        self.pool = None
+        self.pending = []
+        self.hw_time = 0.0
+        self.ana_time = 0.0
+        self.started = time.time()
+
+    def submit(self, key, fp, raws, **kwargs):
+        if self.workers <= 0:
+            self.pending.append((key, fp, timed_process(fp, raws, **kwargs)))
+            return
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=init_worker)
+        self.pending.append((key, fp, self.pool.submit(timed_process, fp, raws, **kwargs)))
+
+    def done(self, wait=False):
+        out = []
+        while self.pending:
+            key, fp, fut = self.pending[0]
+            if not isinstance(fut, tuple):
+                if not wait and not fut.done():
+                    break
+                fut = fut.result()
+            ana, dt = fut
+            self.ana_time += dt
+            out.append((key, fp, ana))
+            self.pending.pop(0)
+        return out
+
+    def hardware(self):
+        '''Context manager timing the hardware bound part of a setting'''
+        return Hw_timer(self)
+
+    def report(self, pr=print):
+        wall = time.time() - self.started
+        pr ("Scan took {:.1f} s: hardware {:.1f} s, analysis {:.1f} s in {} worker(s)".format(wall, self.hw_time, self.ana_time, self.workers))
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=True)
+            self.pool = None
+
+class Hw_timer():
+    def __init__(self, scan):
+        self.scan = scan
+
+    def __enter__(self):
+        self.t0 = time.time()
+
+    def __exit__(self, *args):
+        self.scan.hw_time += time.time() - self.t0
+
+def data_ana(femb_data, ana_chk = True, rms_en = False):
+    chn_rmss = []
+    chn_peds = []
+    chn_pkps = []
+    chn_pkns = []
+    chn_onewfs = []
+    chn_avgwfs = []
+
+    for chipi in range(8):
+        plsn = (len(femb_data[chipi][0])//500)-10
+        if plsn > 100:
+            plsn = 100
+
+        for i in range(plsn):
+            if i == 0:
+                avg_wf = np.array(femb_data[chipi][0][0:500])&0xffff
+            else:
+                avg_wf = avg_wf + (np.array(femb_data[chipi][0][500*i:500*i+500])&0xffff)
+        avg_wf = avg_wf//plsn
+        posp = np.where(avg_wf == np.max(avg_wf))[0][0] + 500-50
+
+        for chn in range(16):
+            peddata = []
+            chndata = femb_data[chipi][chn][posp:]
+            one_wf = chndata[0:500]
+            for i in range(plsn):
+                peddata += chndata[150 + 500*i: 500 + 500*i] 
+                if i == 0:
+                    avg_wf = np.array(chndata[0:500])&0xffff
+                else:
+                    avg_wf = avg_wf + (np.array(chndata[500*i:500*i+500])&0xffff)
+            avg_wf = avg_wf//plsn
+
+            if rms_en == True:
+                peddata = chndata 
+            rms    = np.std(peddata)
+            ped    = int(np.mean(peddata))
+            peakp = np.max(avg_wf)
+            peakn = np.min(avg_wf)            
+
+            chn_rmss.append( rms   )  
+            chn_peds.append( ped   )  
+            chn_pkps.append( peakp )  
+            chn_pkns.append( peakn )  
+            chn_onewfs.append(one_wf )  
+            chn_avgwfs.append(avg_wf )  
+    if ana_chk:
+        err = config_chk(chn_peds, chn_pkps)
+        if err != None:
+            print (err)
+            return False
+
+    return chn_rmss,chn_peds, chn_pkps, chn_pkns, chn_onewfs, chn_avgwfs
+
+def config_chk(chn_peds, chn_pkps):
+    '''None if every ASIC's mean amplitude and pedestal is within 500 of ASIC 0's, else the error'''
+    chn_ampps = np.array(chn_pkps) - np.array(chn_peds)
+    chip0_ped_mean = np.mean(chn_peds[0:16])
+    chip0_amp_mean = np.mean(chn_ampps[0:16])
+    for tmpi in range(7):
+        if abs(np.mean(chn_ampps[16+16*tmpi:32+16*tmpi]) -  chip0_amp_mean) > 500:
+            return "FEMB configuration error (AMP diff), plase reconfigurate FEMB and retake data..."
+        elif abs(np.mean(chn_peds[16+16*tmpi:32+16*tmpi]) -  chip0_ped_mean) > 500:
+            return "FEMB configuration error (Ped diff), plase reconfigurate FEMB and retake data..."
+    return None
+
+def FEMB_SUB_PLOT(ax, x, y, title, xlabel, ylabel, color='b', marker='.', atwinx=False, ylabel_twx = "", e=None):
+    ax.set_title(title)
+    ax.set_xlabel(xlabel)
+    ax.set_ylabel(ylabel)
+    ax.grid(True)
+    if (atwinx):
+        ax.errorbar(x,y,e, marker=marker, color=color)
+        y_min = int(np.min(y))-1000
+        y_max = int(np.max(y))+1000
+        ax.set_ylim([y_min, y_max])
+        ax2 = ax.twinx()
+        ax2.set_ylabel(ylabel_twx)
+        ax2.set_ylim([int((y_min/16384.0)*2048), int((y_max/16384.0)*2048)])
+    else:
+        ax.plot(x,y, marker=marker, color=color)
+
+def FEMB_CHK_PLOT(chn_rmss,chn_peds, chn_pkps, chn_pkns, chn_onewfs, chn_avgwfs, fp):
+#    import matplotlib.pyplot as plt
+    fig = plt.figure(figsize=(10,6))
+    fn = fp.split("/")[-1][0:-3]
+    print (fn)
+    ax1 = plt.subplot2grid((4, 4), (0, 0), colspan=2, rowspan=2)
+    ax2 = plt.subplot2grid((4, 4), (0, 2), colspan=2, rowspan=2)
+    ax3 = plt.subplot2grid((4, 4), (2, 0), colspan=2, rowspan=2)
+    ax4 = plt.subplot2grid((4, 4), (2, 2), colspan=2, rowspan=2)
+    chns = range(128)
+    FEMB_SUB_PLOT(ax1, chns, chn_rmss, title="RMS Noise", xlabel="CH number", ylabel ="ADC / bin", color='r', marker='.')
+    FEMB_SUB_PLOT(ax2, chns, chn_peds, title="Red: Pos Peak. Blue: Pedestal. Green: Neg Peak", xlabel="CH number", ylabel ="ADC / bin", color='r', marker='.')
+    FEMB_SUB_PLOT(ax2, chns, chn_pkps, title="Red: Pos Peak. Blue: Pedestal. Green: Neg Peak", xlabel="CH number", ylabel ="ADC / bin", color='b', marker='.')
+    FEMB_SUB_PLOT(ax2, chns, chn_pkns, title="Red: Pos Peak. Blue: Pedestal. Green: Neg Peak", xlabel="CH number", ylabel ="ADC / bin", color='g', marker='.')
+    for chni in chns:
+        ts = 100 
+        x = (np.arange(ts)) * 0.5
+        y3 = chn_onewfs[chni][25:ts+25]
+        y4 = chn_avgwfs[chni][25:ts+25]
+        FEMB_SUB_PLOT(ax3, x, y3, title="Waveform Overlap", xlabel="Time / $\mu$s", ylabel="ADC /bin", color='C%d'%(chni%9))
+        FEMB_SUB_PLOT(ax4, x, y4, title="Averaging(100 Cycles) Waveform Overlap", xlabel="Time / $\mu$s", ylabel="ADC /bin", color='C%d'%(chni%9))
+
+    fig.suptitle(fn)
+    plt.tight_layout( rect=[0.05, 0.05, 0.95, 0.95])
+    fn = fp[0:-3] + ".png"
+    plt.savefig(fn)
+    plt.close()
@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+"""
+File Name: qc_db.py
+Description: Results database across FEMB boards. At the end of every QC run
+             the per channel RMS, pedestal and peaks of each capture are added
+             to one SQLite file in the QC root, one row per run and setting with
+             each metric as a 128 channel float32 column, indexed by setting
+             and by FEMB SN and environment. A population query is one indexed
+             read, and percentiles and outlier flags are numpy reductions over
+             the resulting boards x channels array.
+Created Time: 10/19/2026
+"""
+
+import os
+import sys
+import glob
+import time
+import pickle
+import sqlite3
+import argparse
+import numpy as np
+from qc_store import QC_store, DB_NAME as STORE_NAME
+
+DB_NAME = "qc_boards.db"
+METRICS = ("rms", "ped", "pkp", "pkn") #the first four parts of a data_ana tuple, in its order
+CHNS = 128
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    save_dir TEXT UNIQUE NOT NULL,
+    femb_sn INTEGER,
+    env TEXT,
+    cd TEXT,
+    tester TEXT,
+    note TEXT,
+    time REAL
+);
+CREATE INDEX IF NOT EXISTS runs_board ON runs(femb_sn, env);
+CREATE TABLE IF NOT EXISTS results (
+    run_id INTEGER NOT NULL,
+    setting TEXT NOT NULL,
+    stage TEXT,
+    rms BLOB,
+    ped BLOB,
+    pkp BLOB,
+    pkn BLOB,
+    PRIMARY KEY (run_id, setting)
+);
+CREATE INDEX IF NOT EXISTS results_setting ON results(setting, run_id);
+'''
+
+def ana_entries(logs):
+    '''{(stage, setting): data_ana tuple} of the captures in QC_runs.logs, which are keyed by their .h5 path'''
+    out = {}
+    for key, value in logs.items():
+        if isinstance(key, str) and key.endswith(".h5") and isinstance(value, (tuple, list)) and len(value) >= len(METRICS):
+            stage = os.path.basename(os.path.dirname(key))
+            out[(stage, os.path.basename(key)[:-3])] = value
+    return out
+
+def column(x):
+    return np.asarray(x, dtype="<f4").tobytes()
+
+def percentiles(a, q=(5, 50, 95)):
+    '''{q: per channel percentile across boards} of a (boards, channels) array'''
+    return dict(zip(q, np.percentile(a, q, axis=0)))
+
+def outliers(a, k=5.0):
+    '''(boards, channels) flags of the values more than k robust sigma (1.4826 MAD) from the channel median'''
+    med = np.median(a, axis=0)
+    mad = 1.4826 * np.median(np.abs(a - med), axis=0)
+    return np.abs(a - med) > k * np.maximum(mad, 1e-9)
+
+class QC_db():
+    def __init__(self, path, timeout=30.0):
+        self.path = path
+        self.db = sqlite3.connect(path, timeout=timeout)
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def add_run(self, logs, t=None):
+        '''Adds the results of one QC run, replacing those of an earlier add of the same save_dir; returns the number of settings'''
+        entries = ana_entries(logs)
+        with self.db:
+            row = self.db.execute("SELECT id FROM runs WHERE save_dir = ?", (logs["save_dir"],)).fetchone()
+            if row is not None:
+                self.db.execute("DELETE FROM results WHERE run_id = ?", row)
+                self.db.execute("DELETE FROM runs WHERE id = ?", row)
+            cur = self.db.execute("INSERT INTO runs (save_dir, femb_sn, env, cd, tester, note, time) VALUES (?,?,?,?,?,?,?)",
+                                  (logs["save_dir"], logs.get("FEMB_SN"), logs.get("Env"), logs.get("Cd"), logs.get("Tester"), logs.get("Note"),
+                                   time.time() if t is None else t))
+            run_id = cur.lastrowid
+            self.db.executemany("INSERT INTO results (run_id, setting, stage, rms, ped, pkp, pkn) VALUES (?,?,?,?,?,?,?)",
+                                [(run_id, setting, stage) + tuple(column(ana[i]) for i in range(len(METRICS)))
+                                 for (stage, setting), ana in sorted(entries.items())])
+        return len(entries)
+
+    def add_archive(self, root, force=False, pr=print):
+        '''Adds the runs under root from their result stores, or the last pickled logs of runs from before the stores'''
+        known = set(r[0] for r in self.db.execute("SELECT save_dir FROM runs"))
+        added = 0
+        for run_dir in sorted(glob.glob(os.path.join(root, "*", ""))):
+            fp = os.path.join(run_dir, STORE_NAME)
+            if os.path.isfile(fp):
+                store = QC_store(fp)
+                logs = store.load()
+                store.close()
+            else:
+                pickles = sorted(glob.glob(os.path.join(run_dir, "logs_tm*.bin")))
+                if not pickles:
+                    continue
+                fp = pickles[-1]
+                with open(fp, 'rb') as f:
+                    logs = pickle.load(f)
+            if "save_dir" not in logs or (logs["save_dir"] in known and not force):
+                continue
+            n = self.add_run(logs, t=os.path.getmtime(fp))
+            pr ("{}: {} settings".format(logs["save_dir"], n))
+            added += 1
+        return added
+
+    def settings(self, pattern="%"):
+        return [r[0] for r in self.db.execute("SELECT DISTINCT setting FROM results WHERE setting LIKE ? ORDER BY setting", (pattern,))]
+
+    def query(self, setting, metric="rms", env=None, cd=None, femb_sns=None, latest=True):
+        '''
+        (runs, values) of one setting: runs is a list of (femb_sn, env, cd, save_dir,
+        time) and values the (runs, 128) array of metric. With latest only the last
+        run of each FEMB SN, environment and Cd is kept.
+        '''
+        if metric not in METRICS:
+            raise ValueError("metric is one of {}".format(METRICS))
+        sql = ("SELECT runs.femb_sn, runs.env, runs.cd, runs.save_dir, runs.time, results.{} FROM results "
+               "JOIN runs ON runs.id = results.run_id WHERE results.setting = ?".format(metric))
+        args = [setting]
+        if env is not None:
+            sql += " AND runs.env = ?"
+            args.append(env)
+        if cd is not None:
+            sql += " AND runs.cd = ?"
+            args.append(cd)
+        if femb_sns is not None:
+            femb_sns = list(femb_sns)
+            sql += " AND runs.femb_sn IN ({})".format(",".join("?" * len(femb_sns)))
+            args += femb_sns
+        rows = self.db.execute(sql + " ORDER BY runs.time", args).fetchall()
+        if latest:
+            rows = list(dict(((r[0], r[1], r[2]), r) for r in rows).values())
+        if not rows:
+            return [], np.zeros((0, CHNS), dtype=np.float32)
+        values = np.frombuffer(b"".join(r[5] for r in rows), dtype="<f4").reshape(len(rows), -1)
+        return [r[:5] for r in rows], values
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Add QC runs to the results database across FEMBs, or query a population")
+    parser.add_argument("--db", default="D:/IO_1826_1B/QC/" + DB_NAME, help="Database file [D:/IO_1826_1B/QC/{}]".format(DB_NAME))
+    parser.add_argument("--add", metavar="ROOT", default=None, help="Add the runs under the QC root ROOT that are not in the database yet")
+    parser.add_argument("--force", "-f", action="store_true", help="With --add, add the runs already in the database again")
+    parser.add_argument("--list", "-l", metavar="PATTERN", nargs="?", const="%", default=None, help="List the settings (SQL LIKE pattern)")
+    parser.add_argument("--setting", "-s", default=None, help="Setting to query, e.g. RMS_900mVBL_14_0mVfC_2_0us")
+    parser.add_argument("--metric", "-m", default="rms", choices=METRICS, help="Metric to query [rms]")
+    parser.add_argument("--env", "-e", default=None, help="RT or LN [both]")
+    parser.add_argument("--cd", default=None, help="Input capacitance (Cd) [all]")
+    parser.add_argument("--sigma", type=float, default=5.0, help="Outlier threshold in robust sigma [5]")
+    args = parser.parse_args()
+
+    qdb = QC_db(args.db)
+    if args.add is not None:
+        print ("{} runs added".format(qdb.add_archive(args.add, force=args.force)))
+    if args.list is not None:
+        for setting in qdb.settings(args.list):
+            print (setting)
+    if args.setting is not None:
+        t0 = time.time()
+        runs, values = qdb.query(args.setting, args.metric, env=args.env, cd=args.cd)
+        if not runs:
+            print ("No results of {}".format(args.setting))
+            sys.exit(1)
+        pcts = percentiles(values)
+        flags = outliers(values, args.sigma)
+        t1 = time.time()
+        print ("{} {} of {} boards, {} channels ({:.3f} s)".format(args.setting, args.metric, len(runs), values.shape[1], t1 - t0))
+        print ("all channels: p5={:.3f} median={:.3f} p95={:.3f}".format(*np.percentile(values, (5, 50, 95))))
+        print ("channel median min/max: {:.3f}/{:.3f}".format(np.min(pcts[50]), np.max(pcts[50])))
+        for i in np.where(flags.any(axis=1))[0]:
+            femb_sn, env, cd, save_dir, t = runs[i]
+            chns = np.where(flags[i])[0]
+            print ("FEMB{:03d} {} {}: {} outlier channel(s) {}".format(femb_sn, env, cd, len(chns), chns[:16].tolist()))
+    qdb.close()
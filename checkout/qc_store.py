@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+"""
+File Name: qc_store.py
+Description: Append-only SQLite store for the QC logs. Every entry is written
+             once, when QC_runs sets it, as a row tagged with the stage that
+             produced it; numeric results (e.g. the data_ana tuples of 128
+             waveforms) are kept as npz blobs so single parts can be read back.
+             The latest row of a key wins, a deleted key gets a tombstone row.
+Created Time: 10/19/2026
+"""
+
+import io
+import time
+import pickle
+import sqlite3
+from collections.abc import MutableMapping
+import numpy as np
+
+DB_NAME = "qc_results.db"
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS entries (
+    id INTEGER PRIMARY KEY,
+    key TEXT NOT NULL,
+    stage TEXT,
+    time REAL NOT NULL,
+    kind TEXT NOT NULL,
+    value BLOB
+);
+CREATE INDEX IF NOT EXISTS entries_key ON entries(key, id);
+CREATE INDEX IF NOT EXISTS entries_stage ON entries(stage);
+CREATE TABLE IF NOT EXISTS stages (
+    name TEXT PRIMARY KEY,
+    tm INTEGER,
+    status TEXT,
+    start REAL,
+    wall REAL,
+    io REAL,
+    entries INTEGER,
+    error TEXT
+);
+'''
+
+def numeric(x):
+    '''x as a numeric ndarray of at least one dimension, None if it is not one'''
+    if isinstance(x, (str, bytes, dict)):
+        return None
+    try:
+        a = np.asarray(x)
+    except Exception:
+        return None
+    if a.ndim == 0 or a.dtype.kind not in "biuf":
+        return None
+    return a
+
+def encode(value):
+    '''(kind, blob) of a log value'''
+    if isinstance(value, np.ndarray) and value.dtype.kind in "biuf":
+        buf = io.BytesIO()
+        np.save(buf, value)
+        return "array", buf.getvalue()
+    if isinstance(value, (tuple, list)) and len(value) > 0:
+        arrays = [numeric(v) for v in value]
+        if all(a is not None for a in arrays):
+            buf = io.BytesIO()
+            np.savez(buf, *arrays)
+            return ("tuple" if isinstance(value, tuple) else "list"), buf.getvalue()
+    return "pickle", pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+
+def decode(kind, blob, part=None):
+    if kind == "array":
+        return np.load(io.BytesIO(blob))
+    if kind in ("tuple", "list"):
+        with np.load(io.BytesIO(blob)) as npz:
+            if part is not None:
+                return npz["arr_{}".format(part)]
+            vals = [npz["arr_{}".format(i)] for i in range(len(npz.files))]
+        return tuple(vals) if kind == "tuple" else vals
+    if kind == "pickle":
+        return pickle.loads(blob)
+    raise KeyError("deleted")
+
+class QC_store():
+    def __init__(self, path):
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.executescript(SCHEMA)
+        self.stage = None
+
+    def close(self):
+        self.db.close()
+
+    def put(self, key, value):
+        kind, blob = encode(value)
+        with self.db:
+            self.db.execute("INSERT INTO entries (key, stage, time, kind, value) VALUES (?,?,?,?,?)", (key, self.stage, time.time(), kind, blob))
+
+    def delete(self, key):
+        with self.db:
+            self.db.execute("INSERT INTO entries (key, stage, time, kind, value) VALUES (?,?,?,?,NULL)", (key, self.stage, time.time(), "deleted"))
+
+    def latest(self, key):
+        return self.db.execute("SELECT kind, value FROM entries WHERE key = ? ORDER BY id DESC LIMIT 1", (key,)).fetchone()
+
+    def get(self, key, part=None, default=None):
+        '''Latest value of key; part picks one element of a stored tuple/list without decoding the rest'''
+        row = self.latest(key)
+        if row is None or row[0] == "deleted":
+            return default
+        return decode(row[0], row[1], part)
+
+    def keys(self, prefix="", stage=None):
+        '''Current keys starting with prefix, optionally only those last written by stage'''
+        sql = ("SELECT key, kind, stage FROM entries WHERE id IN (SELECT MAX(id) FROM entries WHERE key >= ? AND key < ? GROUP BY key) ORDER BY key")
+        rows = self.db.execute(sql, (prefix, prefix + "\uffff")).fetchall()
+        return [k for k, kind, st in rows if kind != "deleted" and (stage is None or st == stage)]
+
+    def items(self, prefix="", stage=None):
+        return [(k, self.get(k)) for k in self.keys(prefix, stage)]
+
+    def load(self, stages=None):
+        '''Dict of the current value of every key, only entries written by the given stages if stages is not None'''
+        logs = {}
+        for key, kind, stage, blob in self.db.execute("SELECT key, kind, stage, value FROM entries ORDER BY id"):
+            if stages is not None and stage not in stages:
+                continue
+            if kind == "deleted":
+                logs.pop(key, None)
+            else:
+                logs[key] = (kind, blob)
+        return dict((k, decode(kind, blob)) for k, (kind, blob) in logs.items())
+
+    def index(self, stages=None):
+        '''{key: id of its current row} without reading the values, only entries written by the given stages if stages is not None'''
+        rows = {}
+        for rid, key, kind, stage in self.db.execute("SELECT id, key, kind, stage FROM entries ORDER BY id"):
+            if stages is not None and stage not in stages:
+                continue
+            if kind == "deleted":
+                rows.pop(key, None)
+            else:
+                rows[key] = rid
+        return rows
+
+    def row(self, rid, part=None):
+        '''Value of one entry row, part as in get()'''
+        kind, blob = self.db.execute("SELECT kind, value FROM entries WHERE id = ?", (rid,)).fetchone()
+        return decode(kind, blob, part)
+
+    def stage_count(self, stage):
+        return self.db.execute("SELECT COUNT(*) FROM entries WHERE stage = ?", (stage,)).fetchone()[0]
+
+    def set_stage(self, name, **fields):
+        cols = ["name"] + sorted(fields)
+        with self.db:
+            self.db.execute("INSERT OR REPLACE INTO stages ({}) VALUES ({})".format(", ".join(cols), ",".join("?"*len(cols))),
+                            [name] + [fields[c] for c in cols[1:]])
+
+    def stages(self):
+        '''{name: row dict} of the recorded stages'''
+        cur = self.db.execute("SELECT * FROM stages")
+        names = [d[0] for d in cur.description]
+        return dict((row[0], dict(zip(names, row))) for row in cur.fetchall())
+
+class QC_logs(MutableMapping):
+    '''
+    The QC_runs.logs dict, writing every assignment through to a QC_store. The
+    entries already in the store are only decoded when they are first read, so a
+    stage pays for the keys it uses rather than for the whole run. Read and written
+    values are kept in memory.
+    '''
+    def __init__(self, store, initial=None, load=True, stages=None):
+        self.store = store
+        self.cache = {}
+        self.unread = store.index(stages) if load else {} #key: id of the row to decode on first read
+        for k, v in (initial or {}).items():
+            self[k] = v
+
+    def __getitem__(self, key):
+        if key not in self.cache:
+            if key not in self.unread:
+                raise KeyError(key)
+            self.cache[key] = self.store.row(self.unread.pop(key))
+        return self.cache[key]
+
+    def __setitem__(self, key, value):
+        self.store.put(key, value)
+        self.unread.pop(key, None)
+        self.cache[key] = value
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        self.cache.pop(key, None)
+        self.unread.pop(key, None)
+        self.store.delete(key)
+
+    def __contains__(self, key):
+        return key in self.cache or key in self.unread
+
+    def __iter__(self):
+        return iter(list(self.cache) + list(self.unread))
+
+    def __len__(self):
+        return len(self.cache) + len(self.unread)
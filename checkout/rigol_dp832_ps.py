@@ -10,8 +10,8 @@ import string
 import time
 import copy
 
-import visa
-from visa import VisaIOError
+import visa_backend as visa
+from visa_backend import VisaIOError
 
 class RIGOL_PS_CTL:
     def ps_init(self):
@@ -179,13 +179,14 @@ class RIGOL_PS_CTL:
         self.ADDR = u'USB0::0x1AB1::0x0E11::DP8B174901006::INSTR'
         self.gen = None
         
-ps = RIGOL_PS_CTL()
-ps.ps_init()
-if ps.get_on_off(channel=1) :
-    print ("CH1 is ON")
-ps.off(channels = [1])
-time.sleep(5)
-ps.on(channels = [1])
-time.sleep(5)
-tmp = ps.measure_params(channel=1)
-print (tmp)
+if __name__ == "__main__":
+    ps = RIGOL_PS_CTL()
+    ps.ps_init()
+    if ps.get_on_off(channel=1) :
+        print ("CH1 is ON")
+    ps.off(channels = [1])
+    time.sleep(5)
+    ps.on(channels = [1])
+    time.sleep(5)
+    tmp = ps.measure_params(channel=1)
+    print (tmp)
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+File Name: settle.py
+Description: Settle detection for the QC waits. Instead of sleeping a fixed
+             time before the WIB monitor ADC or FEMB power readings are
+             averaged, the reading is sampled until the last few samples agree
+             (spread) and no longer drift (slope). The old fixed wait is the
+             upper bound. Every wait is recorded so the time saved can be
+             reported.
+Created Time: 10/19/2026
+"""
+
+import time
+import numpy as np
+
+# Stability criteria. Monitor ADC readings are in mV, power readings in V and A.
+MON_SETTLE = {"spread" : 1.0, "slope" : 5.0}
+PWR_SETTLE = {"spread" : 0.02, "slope" : 0.05}
+
+class Settle():
+    '''
+    wait() samples read() every interval s until the last window samples have a
+    spread (max - min) of at most spread and a fitted slope of at most slope per
+    s, for every element of the reading, or until timeout s have passed. With
+    enabled=False it sleeps timeout like the fixed waits did.
+    '''
+    def __init__(self, window=5, interval=0.02, enabled=True):
+        self.window = window
+        self.interval = interval
+        self.enabled = enabled
+        self.records = [] #(name, waited, timeout, settled)
+
+    def wait(self, name, read, timeout, spread, slope, min_wait=0.0):
+        '''Returns the time waited, which is at most about timeout plus one read'''
+        t0 = time.time()
+        settled = False
+        if not self.enabled:
+            time.sleep(timeout)
+        else:
+            ts = []
+            vals = []
+            while True:
+                vals.append(np.ravel(np.asarray(read(), dtype=float)))
+                ts.append(time.time() - t0)
+                if len(ts) >= self.window and ts[-1] >= min_wait:
+                    t = np.array(ts[-self.window:])
+                    v = np.array(vals[-self.window:])
+                    if np.all(np.ptp(v, axis=0) <= spread) and np.all(np.abs(np.polyfit(t, v, 1)[0]) <= slope):
+                        settled = True
+                        break
+                left = timeout - (time.time() - t0)
+                if left <= 0:
+                    break
+                time.sleep(min(self.interval, left))
+        waited = time.time() - t0
+        self.records.append((name, waited, timeout, settled))
+        return waited
+
+    def reset(self):
+        self.records = []
+
+    def summary(self):
+        '''{name: (waits, settled, time waited, time the fixed waits took)}'''
+        out = {}
+        for name, waited, timeout, settled in self.records:
+            n, s, w, t = out.get(name, (0, 0, 0.0, 0.0))
+            out[name] = (n + 1, s + int(settled), w + waited, t + timeout)
+        return out
+
+    def report(self, pr=print):
+        total_w = 0.0
+        total_t = 0.0
+        for name, (n, s, w, t) in sorted(self.summary().items()):
+            total_w += w
+            total_t += t
+            pr ("{:<20} {:>5} waits, {:>5} settled, {:>7.1f} s of {:>7.1f} s".format(name, n, s, w, t))
+        if self.records:
+            pr ("Settle waits took {:.1f} s instead of {:.1f} s".format(total_w, total_t))
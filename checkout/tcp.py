@@ -10,12 +10,13 @@ Last modified: 4/29/2022 2:50:39 PM
 
 import socket
 import time
+import os
 import struct
 
 class TCPSocket:
     def __init__(self, sock=None):
         super().__init__()
-        self.host = "192.168.121.1"
+        self.host = os.environ.get("WIB_TCP_HOST", "192.168.121.1")
         self.port = 32010
         self.SYSKEY=0xdeadbeef
         self.link_cs = 0 #femb0 = 0, femb1=2, femb2=4, femb3 = 8
@@ -87,6 +88,39 @@ class TCPSocket:
 #        return b''.join(chunks)
 
 
+    def tcp_pack(self, cmd = 0x0000, aux=0x0000, addr = 0x0, data = 0x0):
+        return self.SYSKEY.to_bytes(4, byteorder = 'big') + cmd.to_bytes(2, byteorder = 'big') + aux.to_bytes(2, byteorder = 'big') + \
+               addr.to_bytes(4, byteorder = 'big') + data.to_bytes(4, byteorder = 'big')
+
+    def tcp_batch(self, groups, replies, delay=0):
+        '''
+        Sends groups of (cmd, aux, addr, data) requests over one connection, delay s
+        apart, without waiting for the replies in between. Returns the 16 byte
+        replies (one per read request), None if they did not all arrive.
+        '''
+        self.create()
+        self.connect()
+        #each group goes out when it is sent, so delay is the time between them on the wire
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        buf = b""
+        try:
+            for i, group in enumerate(groups):
+                if i > 0 and delay > 0:
+                    time.sleep(delay)
+                self.sock.sendall(b"".join(self.tcp_pack(*req) for req in group))
+            self.sock.settimeout(1.0)
+            while len(buf) < 16*replies:
+                chunk = self.sock.recv(16*replies - len(buf))
+                if not chunk:
+                    break
+                buf += chunk
+        except OSError as err:
+            print ("tcp_batch:", err)
+        self.close()
+        if len(buf) < 16*replies:
+            return None
+        return [buf[16*i:16*i+16] for i in range(replies)]
+
     def tcp_poke(self, addr = 0x0, data = 0x0):
         self.create()
         self.connect()
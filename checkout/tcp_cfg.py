@@ -11,9 +11,17 @@ Last modified: 4/28/2022 11:40:00 AM
 from tcp import TCPSocket
 from fe_asic_reg_mapping import FE_ASIC_REG_MAPPING
 import time
-import struct
 import numpy as np
 import copy
+import contextlib
+from settle import Settle, MON_SETTLE
+
+# femb_pwr_rd block: 16 bit big endian words, 7 current codes from word 3 and 7
+# voltage codes from word 10, 14 bits each. Rail 2 has its own sense resistor/gain.
+PWR_C_SCALE = np.full(7, 1.9075E-5/0.1)
+PWR_C_SCALE[2] = 1.9075E-5/0.01/1.238
+PWR_V_SCALE = 0.00030518
+PWR_C_MAX = 3.12 #A, larger readings are an unloaded sense amplifier and read as 0
 
 class TCP_CFG(TCPSocket, FE_ASIC_REG_MAPPING ):
     def __init__(self):
@@ -28,6 +36,15 @@ class TCP_CFG(TCPSocket, FE_ASIC_REG_MAPPING ):
                             [0xA, 0, 0, 0xDF, 0x33, 0x89, 0x67],
                             [0xB, 0, 0, 0xDF, 0x33, 0x89, 0x67],
                           ]
+        self.arbiter = None #QC_slots.Arbiter when several FEMB slots of the WIB are tested at once
+        self.settle = Settle()
+        self.mon_conv_wait = 0.01 #s between the start and stop of a monitor ADC conversion
+
+    def hold(self, *names):
+        '''Exclusive use of WIB resources shared between slots, a no-op with one slot'''
+        if self.arbiter is None:
+            return contextlib.nullcontext()
+        return self.arbiter.hold(*names)
 
     def wib_ww (self, addr = 0, data = 1): #data=1, disable HS DATA
         self.tcp_poke(addr, data)
@@ -204,33 +221,42 @@ class TCP_CFG(TCPSocket, FE_ASIC_REG_MAPPING ):
 #        #self.link_cs = 0x0
 
 
-    def wib_mon_adc_read(self):
-        self.tcp_poke(addr=0x11, data=0x01)
-        time.sleep(0.01)
-        self.tcp_poke(addr=0x11, data=0x00)
-
-        adc0_1_v = self.tcp_peek(addr=0x13)
-        adc0_v = ((adc0_1_v >>16)&0xffff)*2048/16384.0
-        adc1_v = (adc0_1_v&0xffff)*2048/16384.0
+    def wib_mon_adc_batch(self, n=10, skip=0):
+        '''
+        (n,4) monitor ADC readings in mV of FEMB0-3. n+skip conversions are triggered
+        and read back over one TCP connection, the first skip are dropped.
+        '''
+        total = n + skip
+        conv = [(3, 0, 0x11, 0x00), (4, 0, 0x13, 0), (4, 0, 0x14, 0), (3, 0, 0x11, 0x01)]
+        groups = [[(3, 0, 0x11, 0x01)]] + [conv]*(total-1) + [conv[:3]]
+        with self.hold("mon"):
+            while True:
+                replies = self.tcp_batch(groups, 2*total, delay=self.mon_conv_wait)
+                if replies != None:
+                    break
+        words = np.frombuffer(b"".join(r[12:16] for r in replies), dtype=">u4").reshape(total, 2)
+        codes = np.stack([words[:,0] >> 16, words[:,0], words[:,1] >> 16, words[:,1]], axis=1) & 0xffff
+        return (codes*2048/16384.0)[skip:]
 
-        adc2_3_v = self.tcp_peek(addr=0x14)
-        adc2_v = ((adc2_3_v >>16)&0xffff)*2048/16384.0
-        adc3_v = (adc2_3_v&0xffff)*2048/16384.0
+    def wib_mon_adc_read(self):
+        return tuple(float(v) for v in self.wib_mon_adc_batch(n=1)[0])
 
-#        print (adc0_v, adc1_v, adc2_v, adc3_v)
-        return adc0_v, adc1_v, adc2_v, adc3_v
+    def wib_mon_adc_stats(self, avg_n=10):
+        '''(mean, std, samples) of avg_n readings of all four FEMBs, after dropping the first and second'''
+        samples = self.wib_mon_adc_batch(n=avg_n, skip=2)
+        return samples.mean(axis=0), samples.std(axis=0), samples
 
     def wib_mon_adc_avg(self, femb_no=0, avg_n=10):
-        tmp =[]
-        for i in range(avg_n+2): #get rid of the first and second ADC data
-            tmp1 = self.wib_mon_adc_read()[femb_no]
-            if i>=2:
-                tmp.append(tmp1)
-        mon_mean =np.mean(tmp) 
-        mon_std =np.std(tmp) 
+        mon_means, mon_stds, samples = self.wib_mon_adc_stats(avg_n=avg_n)
+        mon_mean = mon_means[femb_no]
+        mon_std = mon_stds[femb_no]
         print ("WIB ADC monitor for FEMB{}: mean={}, std={}".format(femb_no, mon_mean, mon_std))
         return mon_mean, mon_std
 
+    def wib_mon_adc_settle(self, name, femb_no=0, timeout=1):
+        '''Waits for the monitor ADC reading of femb_no to settle, at most timeout s'''
+        return self.settle.wait(name, lambda: self.wib_mon_adc_read()[femb_no], timeout, **MON_SETTLE)
+
     def femb_fedac_mon_cs(self, femb_no=0, ext_lemo=0, rst_fe=0, mon_chip=0, sgp=False, sg0=0, sg1=0,  vdac=0x20, avg_n=50 ):
         if femb_no == 0:
             self.link_cs = 0
@@ -255,7 +281,7 @@ class TCP_CFG(TCPSocket, FE_ASIC_REG_MAPPING ):
         self.fe_spi_prog()
 
         if ext_lemo == 0: #WIB on-board adc monitor
-            time.sleep(1)
+            self.wib_mon_adc_settle("fedac_mon", femb_no=femb_no, timeout=1)
             vmon = self.wib_mon_adc_avg(femb_no=femb_no, avg_n=avg_n)
             self.femb_cd_wr(c_id=3, c_page=0, c_addr=0x26, c_data=0x2)
             self.femb_cd_wr(c_id=2, c_page=0, c_addr=0x26, c_data=0x0)
@@ -309,7 +335,7 @@ class TCP_CFG(TCPSocket, FE_ASIC_REG_MAPPING ):
 
 
         if ext_lemo == 0: #WIB on-board adc monitor
-            time.sleep(0.5)
+            self.wib_mon_adc_settle("fe_mon", femb_no=femb_no, timeout=0.5)
             vmon = self.wib_mon_adc_avg(femb_no=femb_no, avg_n=avg_n)
             self.femb_cd_wr(c_id=3, c_page=0, c_addr=0x26, c_data=0x2)
             self.femb_cd_wr(c_id=2, c_page=0, c_addr=0x26, c_data=0x0)
@@ -340,7 +366,7 @@ class TCP_CFG(TCPSocket, FE_ASIC_REG_MAPPING ):
                 self.femb_wr_chk(c_id=adcs_addr[adc_no], c_page=1, c_addr=0x9a, c_data=vcmo) #vcmo
                 self.femb_wr_chk(c_id=adcs_addr[adc_no], c_page=1, c_addr=0x9b, c_data=vcmi) #vcmi
                 self.femb_cd_wr(c_id=adcs_addr[adc_no], c_page=1, c_addr=0xaf, c_data=(i<<2)|0x01)
-                time.sleep(1)
+                self.wib_mon_adc_settle("adc_mon", femb_no=femb_no, timeout=1)
                 vmon = self.wib_mon_adc_avg(femb_no=femb_no, avg_n=avg_n)
                 vmons.append(vmon)
             self.femb_cd_wr(c_id=3, c_page=0, c_addr=0x26, c_data=0x2)
@@ -348,86 +374,110 @@ class TCP_CFG(TCPSocket, FE_ASIC_REG_MAPPING ):
             return vmons, "CMOS Ref: VREFP=0x{:02x}, VREFN=0x{:02x}, VCMO=0x{:02x}, VCMI=0x{:02x}".format(vrefp, vrefn, vcmo, vcmi)
 
     def femb_cfg (self):
-        self.wib_ww(addr=0, data=0x1)
-        self.wib_cntl_cs(lemo_en = False, reg_cntls = (0,0,0,0) ) 
-        print ("COLDATA CFG ongoing...")
-        self.cd_fc_rst()
-        time.sleep(0.05)
-        self.cd_fc_rst()
-        time.sleep(0.05)
-        self.cd_lvds_current ()
-        self.cd_8b10_p0r3_cfg()
-        self.femb_cd_wr(c_id=3, c_page=0, c_addr=0x27, c_data=0x1f)
-        self.femb_cd_wr(c_id=2, c_page=0, c_addr=0x27, c_data=0x1f)
-        self.femb_cd_wr(c_id=3, c_page=0, c_addr=0x26, c_data=0x2) #tie LArASIC test pin to ground
-        self.femb_cd_wr(c_id=2, c_page=0, c_addr=0x26, c_data=0x0)
-        print ("COLDADC SYNC RESET...")
-        self.adc_sync_rst()
-        print ("COLDADC CFG ongoing...")
-        self.adc_cfg( adc_no=0)
-        self.adc_cfg( adc_no=1)
-        self.adc_cfg( adc_no=2)
-        self.adc_cfg( adc_no=3)
-        self.adc_cfg( adc_no=4)
-        self.adc_cfg( adc_no=5)
-        self.adc_cfg( adc_no=6)
-        self.adc_cfg( adc_no=7)
-
-        self.fc_act_rst_larasic()
-        time.sleep(0.1)
-        print ("LArASIC CFG ongoing...")
-        self.fe_spi_prog()
-        time.sleep(0.01)
-        self.wib_ww(addr=0, data=0x0)
-        time.sleep(0.01)
-        self.wib_ww(addr=0, data=0x1)
-        self.wib_ww(addr=0, data=0x0)
-
-    def femb_pwr_set (self,femb=0, pwr_on=1, v_fe=3.0, v_adc=3.5, v_cd=2.8 ):
-        self.tcp_cmd_io(cmd=0x0E, aux=femb, addr=0x0, data=int(v_fe/1e-7) )
-        self.tcp_cmd_io(cmd=0x0E, aux=femb, addr=0x1, data=int(0/1e-7) )
-        self.tcp_cmd_io(cmd=0x0E, aux=femb, addr=0x2, data=int(v_adc/1e-7) )
-        self.tcp_cmd_io(cmd=0x0E, aux=femb, addr=0x3, data=int(v_cd/1e-7) )
-        self.tcp_cmd_io(cmd=0x0E, aux=femb, addr=0x4, data=int(0/1e-7) )
-        self.tcp_cmd_io(cmd=0x0E, aux=femb, addr=0x5, data=int(0/1e-7) )
-        if pwr_on != 0:
-            self.tcp_cmd_io(cmd=0x0C, aux=femb, addr=0x0, data= 1)
+        with self.hold("wib"):
+            self.wib_ww(addr=0, data=0x1)
+            self.wib_cntl_cs(lemo_en = False, reg_cntls = (0,0,0,0) ) 
+            print ("COLDATA CFG ongoing...")
+            self.cd_fc_rst()
+            time.sleep(0.05)
+            self.cd_fc_rst()
+            time.sleep(0.05)
+            self.cd_lvds_current ()
+            self.cd_8b10_p0r3_cfg()
+            self.femb_cd_wr(c_id=3, c_page=0, c_addr=0x27, c_data=0x1f)
+            self.femb_cd_wr(c_id=2, c_page=0, c_addr=0x27, c_data=0x1f)
+            self.femb_cd_wr(c_id=3, c_page=0, c_addr=0x26, c_data=0x2) #tie LArASIC test pin to ground
+            self.femb_cd_wr(c_id=2, c_page=0, c_addr=0x26, c_data=0x0)
+            print ("COLDADC SYNC RESET...")
+            self.adc_sync_rst()
+            print ("COLDADC CFG ongoing...")
+            self.adc_cfg( adc_no=0)
+            self.adc_cfg( adc_no=1)
+            self.adc_cfg( adc_no=2)
+            self.adc_cfg( adc_no=3)
+            self.adc_cfg( adc_no=4)
+            self.adc_cfg( adc_no=5)
+            self.adc_cfg( adc_no=6)
+            self.adc_cfg( adc_no=7)
+
+            self.fc_act_rst_larasic()
+            time.sleep(0.1)
+            print ("LArASIC CFG ongoing...")
+            self.fe_spi_prog()
+            time.sleep(0.01)
+            self.wib_ww(addr=0, data=0x0)
+            time.sleep(0.01)
+            self.wib_ww(addr=0, data=0x1)
+            self.wib_ww(addr=0, data=0x0)
+
+    def femb_pwr_set (self,femb=0, pwr_on=1, v_fe=3.0, v_adc=3.5, v_cd=2.8, trace=0 ):
+        '''trace > 0 records femb_pwr_trace for trace s (at least the 2 s turn on wait) from the switch and returns it'''
+        with self.hold("psu"):
+            self.tcp_cmd_io(cmd=0x0E, aux=femb, addr=0x0, data=int(v_fe/1e-7) )
+            self.tcp_cmd_io(cmd=0x0E, aux=femb, addr=0x1, data=int(0/1e-7) )
+            self.tcp_cmd_io(cmd=0x0E, aux=femb, addr=0x2, data=int(v_adc/1e-7) )
+            self.tcp_cmd_io(cmd=0x0E, aux=femb, addr=0x3, data=int(v_cd/1e-7) )
+            self.tcp_cmd_io(cmd=0x0E, aux=femb, addr=0x4, data=int(0/1e-7) )
+            self.tcp_cmd_io(cmd=0x0E, aux=femb, addr=0x5, data=int(0/1e-7) )
+            self.tcp_cmd_io(cmd=0x0C, aux=femb, addr=0x0, data= 1 if pwr_on != 0 else 0)
+        pwr_trace = None
+        if trace > 0:
+            pwr_trace = self.femb_pwr_trace(femb, max(trace, 2 if pwr_on != 0 else 0))
+        elif pwr_on != 0:
             time.sleep(2)
+        if pwr_on != 0:
             print ("FEMB{} is turned on.".format(femb))
-        else:
-            self.tcp_cmd_io(cmd=0x0C, aux=femb, addr=0x0, data= 0)
+        return pwr_trace
+
+    def femb_pwr_decode(self, rd):
+        '''(voltages, currents) of the 7 rails in a power monitor block'''
+        nd = np.frombuffer(rd, dtype=">u2", count=len(rd)//2) & 0x3fff
+        c_info = nd[3:3+7]*PWR_C_SCALE
+        c_info[c_info >= PWR_C_MAX] = 0
+        v_info = nd[10:10+7]*PWR_V_SCALE
+        return v_info, c_info
+
+    def femb_pwr_blk(self, femb=0):
+        '''Triggers and reads one power monitor block of femb; the WIB latches one block for all slots'''
+        with self.hold("psu"):
+            return self.femb_pwr_decode(self.tcp_rd_blk(cmd=0x0F, aux=femb, addr = 0))
 
     def femb_pwr_rd (self,femb=0, avg_n=5 ):
-        c_s = []
-        v_s = []
-        for avgi in range(avg_n+1):
-            if (avgi>=1):
-                rd = self.tcp_rd_blk(cmd=0x0F, aux=femb, addr = 0) 
-                rd_len = len(rd)
-                dataNtuple = struct.unpack_from(">%dB"%(rd_len),rd)
-                d_even = dataNtuple[::2]
-                d_odd = dataNtuple[1::2]
-                nd = []
-                for i in range(len(d_even)):
-                    nd.append( (d_even[i]<<8) + d_odd[i])
-                c_info = nd[3:3+7]
-                c_info = ((np.array(c_info)&0x3fff)*1.9075E-5)/0.1
-                c_info[2] = ((c_info[2]*0.1)/0.01)/1.238
-                for i in range(len(c_info)):
-                    if c_info[i] >= 3.12:
-                        c_info[i] = 0
-                v_info = nd[10:10+7]
-                v_info = (np.array(v_info)&0x3fff)*0.00030518
-                if (avgi==1):
-                    c_s = c_info
-                    v_s = v_info
-                else:
-                    c_s =c_s+ c_info
-                    v_s =v_s+ v_info
+        self.femb_pwr_blk(femb) #the first reading is stale
+        v_s = np.zeros(7)
+        c_s = np.zeros(7)
+        for avgi in range(avg_n):
+            v_info, c_info = self.femb_pwr_blk(femb)
+            v_s = v_s + v_info
+            c_s = c_s + c_info
         c_info = c_s/avg_n
         v_info = v_s/avg_n
         return (v_info[0], c_info[0]), (v_info[2], c_info[2]), (v_info[3], c_info[3]), (v_info[6], c_info[6])
 
+    def femb_pwr_trace (self, femb=0, duration=2.0, interval=0.005):
+        '''
+        (t, v, c): power monitor readings of femb every interval s (or as fast as they come) for duration s,
+        t (n,) in s from the call, v and c (n,7). As a reply holds the block latched
+        by the request before it, each reading is stamped with that request's time.
+        '''
+        t0 = time.time()
+        self.femb_pwr_blk(femb)
+        latched = 0.0
+        ts = []
+        vs = []
+        cs = []
+        while latched < duration:
+            t = time.time() - t0
+            if ts and t < ts[-1] + interval:
+                time.sleep(ts[-1] + interval - t)
+                t = time.time() - t0
+            v_info, c_info = self.femb_pwr_blk(femb)
+            ts.append(latched)
+            vs.append(v_info)
+            cs.append(c_info)
+            latched = t
+        return np.array(ts), np.array(vs), np.array(cs)
+
 
 
 #a = TCP_CFG ()
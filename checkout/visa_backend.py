@@ -0,0 +1,344 @@
+# -*- coding: utf-8 -*-
+"""
+File Name: visa_backend.py
+Description: Pluggable VISA layer for the bench instruments (33622A generator,
+             DP832 power supply, T3DMM6 multimeter). settings_instruments.ini
+             or the QC_VISA_BACKEND environment variable selects either the
+             real pyvisa backend or simulated instruments with realistic
+             latencies. Every write/read/query is timed per resource so the
+             instrument share of a QC run can be reported with io_report().
+Created Time: 10/19/2026
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import random
+import configparser
+
+try:
+    import pyvisa as _pyvisa
+except ImportError:
+    try:
+        import visa as _pyvisa
+    except ImportError:
+        _pyvisa = None
+
+if _pyvisa is not None:
+    VisaIOError = _pyvisa.VisaIOError
+else:
+    class VisaIOError(Exception):
+        def __init__(self, error_code=-1073807339):
+            super().__init__("VISA I/O error %d"%error_code)
+            self.error_code = error_code
+
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "settings_instruments.ini")
+
+#per resource I/O accounting, {addr: {"model":..., "writes":n, "reads":n, "queries":n, "time":s}}
+io_stats = {}
+
+def io_account(addr, model, kind, dt):
+    st = io_stats.setdefault(addr, {"model":model, "writes":0, "reads":0, "queries":0, "time":0.0})
+    st[kind] += 1
+    st["time"] += dt
+
+def io_reset():
+    io_stats.clear()
+
+def io_total():
+    return sum(st["time"] for st in io_stats.values())
+
+def io_report(wall=None, pr=print):
+    '''Prints the instrument I/O time per resource, and its share of wall if given'''
+    for addr, st in sorted(io_stats.items()):
+        pr ("%-8s %s: %d writes, %d reads, %d queries, %.3f s"%(st["model"], addr, st["writes"], st["reads"], st["queries"], st["time"]))
+    total = io_total()
+    if wall:
+        pr ("Instrument I/O %.3f s of %.3f s wall (%.1f%%)"%(total, wall, 100.0*total/wall))
+    else:
+        pr ("Instrument I/O %.3f s"%total)
+
+def load_config(path=CONFIG_PATH):
+    cfg = configparser.ConfigParser()
+    cfg.optionxform = str
+    if os.path.exists(path):
+        cfg.read(path)
+    return cfg
+
+def backend_name(cfg=None):
+    if "QC_VISA_BACKEND" in os.environ:
+        return os.environ["QC_VISA_BACKEND"].strip().lower()
+    if cfg is None:
+        cfg = load_config()
+    return cfg.get("backend", "BACKEND", fallback="visa").strip().lower()
+
+def ResourceManager(*args, cfg=None):
+    '''Drop-in for visa.ResourceManager() honouring the configured backend'''
+    if cfg is None:
+        cfg = load_config()
+    name = backend_name(cfg)
+    if name == "sim":
+        return SimResourceManager(cfg)
+    if _pyvisa is None:
+        print ("visa_backend: pyvisa is not installed, set BACKEND = sim in %s to run without instruments"%CONFIG_PATH)
+        sys.exit()
+    return TimedResourceManager(_pyvisa.ResourceManager(*args))
+
+class TimedResource:
+    '''Wraps a pyvisa resource, timing write/read/query calls'''
+    def __init__(self, res, addr, model="visa"):
+        self.res = res
+        self.addr = addr
+        self.model = model
+
+    def _timed(self, kind, func, *args, **kwargs):
+        t0 = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            io_account(self.addr, self.model, kind, time.perf_counter()-t0)
+
+    def write(self, cmd, *args, **kwargs):
+        return self._timed("writes", self.res.write, cmd, *args, **kwargs)
+
+    def read(self, *args, **kwargs):
+        return self._timed("reads", self.res.read, *args, **kwargs)
+
+    def query(self, cmd, *args, **kwargs):
+        return self._timed("queries", self.res.query, cmd, *args, **kwargs)
+
+    def query_ascii_values(self, cmd, *args, **kwargs):
+        return self._timed("queries", self.res.query_ascii_values, cmd, *args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.res, name)
+
+class TimedResourceManager:
+    def __init__(self, rm):
+        self.rm = rm
+
+    def list_resources(self, *args):
+        return self.rm.list_resources(*args)
+
+    def open_resource(self, addr, *args, **kwargs):
+        return TimedResource(self.rm.open_resource(addr, *args, **kwargs), addr)
+
+    def __getattr__(self, name):
+        return getattr(self.rm, name)
+
+class SimInstrument:
+    '''
+    SCPI instrument stand-in. Subclasses fill self.handlers with (regex, func)
+    pairs; func(match) returns the response string for queries or None.
+    Commands listed in a script file are answered from there first; a list
+    of responses is returned in turn and the last one repeats.
+    '''
+    model = "sim"
+
+    def __init__(self, addr, write_latency=0.002, query_latency=0.01, jitter=0.0, script=None, seed=None):
+        self.addr = addr
+        self.write_latency = write_latency
+        self.query_latency = query_latency
+        self.jitter = jitter
+        self.rng = random.Random(seed)
+        self.script = {}
+        if script:
+            with open(script, "r") as fin:
+                for k, v in json.load(fin).items():
+                    self.script[self.normalize(k)] = v if isinstance(v, list) else [v]
+        self.pending = None
+        self.timeout = 2000
+        self.handlers = []
+
+    def normalize(self, cmd):
+        return " ".join(cmd.strip().upper().split())
+
+    def delay(self, latency):
+        if latency > 0:
+            time.sleep(max(0.0, latency + self.rng.uniform(-self.jitter, self.jitter)))
+
+    def respond(self, cmd):
+        key = self.normalize(cmd)
+        if key in self.script:
+            responses = self.script[key]
+            return str(responses.pop(0) if len(responses) > 1 else responses[0])
+        if key == "*IDN?":
+            return "SIM,%s,%s,0.1"%(self.model, self.addr)
+        for pattern, func in self.handlers:
+            m = re.fullmatch(pattern, cmd.strip(), re.IGNORECASE)
+            if m:
+                return func(m)
+        raise VisaIOError(-1073807339)
+
+    def write(self, cmd):
+        t0 = time.perf_counter()
+        self.delay(self.write_latency)
+        resp = self.respond(cmd)
+        #a query sent with write is answered by the next read
+        if "?" in cmd.split()[0]:
+            self.pending = resp
+        io_account(self.addr, self.model, "writes", time.perf_counter()-t0)
+        return len(cmd)
+
+    def read(self):
+        t0 = time.perf_counter()
+        self.delay(self.query_latency)
+        if self.pending is None:
+            io_account(self.addr, self.model, "reads", time.perf_counter()-t0)
+            raise VisaIOError(-1073807339)
+        resp, self.pending = self.pending, None
+        io_account(self.addr, self.model, "reads", time.perf_counter()-t0)
+        return resp + "\n"
+
+    def query(self, cmd):
+        t0 = time.perf_counter()
+        self.delay(self.write_latency + self.query_latency)
+        resp = self.respond(cmd)
+        io_account(self.addr, self.model, "queries", time.perf_counter()-t0)
+        return resp + "\n"
+
+    def query_ascii_values(self, cmd):
+        return [float(x) for x in self.query(cmd).strip().split(",")]
+
+    def close(self):
+        pass
+
+def _fmt(x):
+    return "%+.15E"%x
+
+class Sim33622A(SimInstrument):
+    '''Keysight 33622A, two channels: load, Apply, Output, PHASe and VOLTage'''
+    model = "33622A"
+
+    def __init__(self, addr, **kwargs):
+        super().__init__(addr, **kwargs)
+        self.chns = {c:{"load":"INF", "wave":"SIN", "freq":1000.0, "amp":0.1, "oft":0.0, "out":0, "phase":0.0} for c in (1, 2)}
+        self.handlers = [
+            (r"Output(\d):Load\s+(\S+)", self.set_load),
+            (r"Source(\d):Apply:(\w+)\s+([^,]+),([^,]+),([^,]+)", self.apply),
+            (r"Source(\d):Apply\?", self.apply_q),
+            (r"Output(\d)\s+(ON|OFF|1|0)", self.output),
+            (r"Output(\d)\?", lambda m: str(self.chns[int(m.group(1))]["out"])),
+            (r"Source(\d):PHASe\s+(\S+)", lambda m: self.set(m, "phase")),
+            (r"Source(\d):PHASe\?", lambda m: _fmt(self.chns[int(m.group(1))]["phase"])),
+            (r"Source(\d):VOLTage\s+(\S+)", lambda m: self.set(m, "amp")),
+            (r"Source(\d):VOLTage:OFFSet\s+(\S+)", lambda m: self.set(m, "oft")),
+        ]
+
+    def set(self, m, key):
+        self.chns[int(m.group(1))][key] = float(m.group(2))
+
+    def set_load(self, m):
+        self.chns[int(m.group(1))]["load"] = m.group(2).upper()
+
+    def apply(self, m):
+        chn = self.chns[int(m.group(1))]
+        chn["wave"] = m.group(2).upper()[:3]
+        chn["freq"], chn["amp"], chn["oft"] = (float(m.group(i)) for i in (3, 4, 5))
+        #APPLy turns the output on
+        chn["out"] = 1
+
+    def apply_q(self, m):
+        chn = self.chns[int(m.group(1))]
+        return '"%s %s,%s,%s"'%(chn["wave"], _fmt(chn["freq"]), _fmt(chn["amp"]), _fmt(chn["oft"]))
+
+    def output(self, m):
+        self.chns[int(m.group(1))]["out"] = 1 if m.group(2).upper() in ("ON", "1") else 0
+
+class SimDP832(SimInstrument):
+    '''Rigol DP832, three channels driving resistive loads (LOAD_OHMS in the config)'''
+    model = "DP832"
+
+    def __init__(self, addr, load_ohms=(10.0, 10.0, 10.0), **kwargs):
+        super().__init__(addr, **kwargs)
+        self.load_ohms = load_ohms
+        self.chns = {c:{"VOLT":0.0, "CURR":1.0, "VOLT:PROT":33.0, "CURR:PROT":3.3, "VOLT:PROT:STATE":"OFF", "CURR:PROT:STATE":"OFF", "out":False} for c in (1, 2, 3)}
+        self.handlers = [
+            (r":OUTP\s+CH(\d),\s*(ON|OFF)", self.output),
+            (r":OUTP\?\s+CH(\d)", lambda m: "ON" if self.chns[int(m.group(1))]["out"] else "OFF"),
+            (r":SOUR(\d):((?:VOLT|CURR)(?::PROT(?::STATE)?)?)\s+(\S+)", self.set),
+            (r":SOUR(\d):((?:VOLT|CURR)(?::PROT(?::STATE)?)?)\?", self.get),
+            (r":MEAS:ALL\?\s+CH(\d)", self.meas_all),
+            (r":SYSTem:BEEPer:IMMediate", lambda m: None),
+        ]
+
+    def output(self, m):
+        self.chns[int(m.group(1))]["out"] = m.group(2).upper() == "ON"
+
+    def set(self, m):
+        key = m.group(2).upper()
+        self.chns[int(m.group(1))][key] = m.group(3).upper() if key.endswith("STATE") else float(m.group(3))
+
+    def get(self, m):
+        val = self.chns[int(m.group(1))][m.group(2).upper()]
+        return val if isinstance(val, str) else "%.3f"%val
+
+    def meas_all(self, m):
+        c = int(m.group(1))
+        chn = self.chns[c]
+        if not chn["out"]:
+            return "0.000,0.000,0.000"
+        v = chn["VOLT"]
+        i = v/self.load_ohms[c-1]
+        if i > chn["CURR"]:
+            #constant current mode
+            i = chn["CURR"]
+            v = i*self.load_ohms[c-1]
+        v += self.rng.gauss(0, 0.001)
+        i += self.rng.gauss(0, 0.0005)
+        return "%.3f,%.4f,%.3f"%(v, i, v*i)
+
+class SimT3DMM6(SimInstrument):
+    '''Teledyne T3DMM6 multimeter, MEAS:VOLT? returns VOLTAGE plus noise'''
+    model = "T3DMM6"
+
+    def __init__(self, addr, voltage=0.0, noise=1e-4, **kwargs):
+        super().__init__(addr, **kwargs)
+        self.voltage = voltage
+        self.noise = noise
+        self.handlers = [
+            (r":?MEAS(?:ure)?:VOLT(?:age)?(?::DC)?\?", lambda m: "%+.8E"%(self.voltage + self.rng.gauss(0, self.noise))),
+        ]
+
+SIM_MODELS = {"33622A":Sim33622A, "DP832":SimDP832, "T3DMM6":SimT3DMM6}
+
+class SimResourceManager:
+    '''Lists and opens the instruments declared in the [sim:<ADDR>] sections of the config'''
+    def __init__(self, cfg):
+        self.sections = {}
+        for s in cfg.sections():
+            if s.startswith("sim:"):
+                self.sections[s[4:]] = cfg[s]
+        self.opened = {}
+
+    def list_resources(self, *args):
+        return tuple(self.sections.keys())
+
+    def open_resource(self, addr, *args, **kwargs):
+        if addr not in self.sections:
+            raise VisaIOError(-1073807343)
+        if addr in self.opened:
+            return self.opened[addr]
+        sec = self.sections[addr]
+        model = sec.get("MODEL")
+        kw = {
+            "write_latency" : sec.getfloat("WRITE_LATENCY", 0.002),
+            "query_latency" : sec.getfloat("QUERY_LATENCY", 0.01),
+            "jitter" : sec.getfloat("JITTER", 0.0),
+            "script" : sec.get("SCRIPT", None) or None,
+        }
+        if kw["script"] and not os.path.isabs(kw["script"]):
+            kw["script"] = os.path.join(os.path.dirname(CONFIG_PATH), kw["script"])
+        if model == "DP832" and "LOAD_OHMS" in sec:
+            kw["load_ohms"] = tuple(float(x) for x in sec["LOAD_OHMS"].split(","))
+        if model == "T3DMM6":
+            kw["voltage"] = sec.getfloat("VOLTAGE", 0.0)
+            kw["noise"] = sec.getfloat("NOISE", 1e-4)
+        inst = SIM_MODELS[model](addr, **kw)
+        self.opened[addr] = inst
+        return inst
+
+    def close(self):
+        pass
@@ -0,0 +1,359 @@
+# -*- coding: utf-8 -*-
+"""
+File Name: wib_emu.py
+Description: Emulator of the WIB UDP register/high speed data ports and the
+             TCP command port used by cls_udp.py, tcp.py and tcp_cfg.py, so the
+             QC flow can be run and profiled without a bench setup.
+             Point the clients at it with WIB_UDP_IP=127.0.0.1 WIB_TCP_HOST=127.0.0.1
+Created Time: 10/19/2026
+"""
+
+import socket
+import socketserver
+import struct
+import threading
+import argparse
+import time
+import numpy as np
+
+KEY1 = 0xDEAD
+KEY2 = 0xBEEF
+SYSKEY = 0xdeadbeef
+UDP_PORT_WREG = 32000
+UDP_PORT_RREG = 32001
+UDP_PORT_RREGRESP = 32002
+UDP_PORT_HSDATA = 32003
+TCP_PORT = 32010
+PKG_WORDS = 515     #non-jumbo high speed packet, 0x406 bytes
+PKG_FRAMES = 39     #13 word frames starting at word 8
+PULSE_PERIOD = 500  #samples between calibration pulses
+LINK_CS_FEMB = {0:0, 2:1, 4:2, 8:3}
+GAINS_MV_PER_FC = {(0,0):4.7, (1,0):7.8, (0,1):14.0, (1,1):25.0} #(sg0,sg1)
+
+def pack_frames(samples, markers):
+    """samples (n,16) 12 bit values -> (n,13) uint16 frames with the marker word first"""
+    s = samples.astype(np.uint16) & 0xFFF
+    q = s.reshape(-1, 4, 4)
+    w = np.empty((len(s), 4, 3), dtype=np.uint16)
+    w[:,:,0] = (q[:,:,0] << 4) | (q[:,:,1] >> 8)
+    w[:,:,1] = ((q[:,:,1] & 0xFF) << 8) | (q[:,:,2] >> 4)
+    w[:,:,2] = ((q[:,:,2] & 0xF) << 12) | q[:,:,3]
+    frames = np.empty((len(s), 13), dtype=np.uint16)
+    frames[:,0] = markers
+    frames[:,1:] = w.reshape(-1, 12)
+    return frames
+
+class FEMBModel:
+    """Analog behaviour of one FEMB: pedestals, noise, calibration pulses and the monitor mux"""
+    def __init__(self, rng, idx):
+        self.idx = idx
+        self.ped_ofst = rng.normal(0, 30, 128)
+        self.noise = rng.uniform(2.0, 6.0, 128)
+        self.best_phase = rng.integers(0, 16, 8)
+        self.on = False
+        self.v = {"fe":0.0, "adc":0.0, "cd":0.0}
+        self.mon_prev = 0.0
+        self.mon_target = 0.0
+        self.mon_changed = 0.0
+
+class WIBEmu:
+    def __init__(self, host="127.0.0.1", rate=20000, pulse_fc=1.0, settle_tau=0.15, feed=False, seed=None):
+        self.host = host
+        self.rate = rate
+        self.pulse_fc = pulse_fc
+        self.settle_tau = settle_tau
+        self.feed = feed
+        self.rng = np.random.default_rng(seed)
+        self.lock = threading.Lock()
+        self.udp_regs = {0x100: 0x20220429}
+        self.tcp_regs = {0x00: 0x1}
+        self.cd_regs = {}
+        self.fembs = [FEMBModel(self.rng, i) for i in range(4)]
+        self.client_ip = None
+        self.pkg_cnt = 0
+        self.smp_cnt = 0
+        self.packets_sent = 0
+        self.hw_ver = 0x0102
+        self.fw_ver = 0x0429
+        self.stop_event = threading.Event()
+        self.threads = []
+
+    #################### COLDATA/LArASIC model ####################
+    def cd_rd(self, femb, c_id, page, addr):
+        return self.cd_regs.get((femb, c_id, page, addr), 0)
+
+    def fe_chip(self, femb, chip):
+        """(channel regs [16], global reg, dac reg) of one LArASIC as programmed over COLDATA i2c"""
+        c_id = 3 if chip < 4 else 2
+        page = chip % 4 + 1
+        regs = [self.cd_rd(femb, c_id, page, 0x91 - i) for i in range(18)]
+        chn = [regs[15 - ch] for ch in range(16)]
+        return chn, regs[16], regs[17]
+
+    def chip_pulse(self, femb, chip):
+        """(pedestal, amplitude) in ADC counts for each of the 16 channels of a chip"""
+        chn, glb, dacreg = self.fe_chip(femb, chip)
+        swdac = dacreg & 0x03
+        dac = sum((((dacreg >> (7 - k)) & 0x01) << k) for k in range(6))
+        chn = np.array(chn)
+        snc = (chn >> 6) & 0x01
+        ped = np.where(snc == 1, 400.0, 1800.0)
+        gain = np.array([GAINS_MV_PER_FC[((c >> 5) & 0x01, (c >> 4) & 0x01)] for c in chn])
+        amp = np.zeros(16)
+        if swdac in (1, 2):
+            phase = self.cd_rd(femb, 3 - (chip // 4), 1 + (chip % 4), 0x07) & 0x0F
+            d = min((phase - self.fembs[femb].best_phase[chip]) % 16, (self.fembs[femb].best_phase[chip] - phase) % 16)
+            amp = dac * self.pulse_fc * gain * 2.0 * (1.0 - 0.15 * (d / 8.0) ** 2)
+        return ped, amp
+
+    def mon_target(self, femb):
+        """Voltage in mV routed to the WIB monitor ADC for one FEMB"""
+        if self.cd_rd(femb, 3, 0, 0x26) == 0x4: #COLDADC reference monitoring
+            for c_id in range(4, 12):
+                sel = self.cd_rd(femb, c_id, 1, 0xaf)
+                if sel & 0x01:
+                    ref = (sel >> 2) & 0x07
+                    if ref < 4:
+                        return self.cd_rd(femb, c_id, 1, 0x98 + ref) * 2000.0 / 256
+                    return 300.0 + 100.0 * ref
+            return 0.0
+        if self.cd_rd(femb, 3, 0, 0x26) == 0x2: #test pin tied to ground
+            return 1.0
+        for chip in range(8):
+            chn, glb, dacreg = self.fe_chip(femb, chip)
+            if (dacreg & 0x03) == 3:
+                dac = sum((((dacreg >> (7 - k)) & 0x01) << k) for k in range(6))
+                return 50.0 + 19.5 * dac
+            if (glb >> 1) & (glb >> 2) & 0x01:
+                return 1180.0 #bandgap
+            if (glb >> 2) & 0x01:
+                return 880.0 #temperature
+            for c in chn:
+                if (c >> 1) & 0x01:
+                    return 200.0 if (c >> 6) & 0x01 else 900.0
+        return 0.0
+
+    def fe_programmed(self, femb):
+        """New monitor target after an SPI load, the reading relaxes towards it with settle_tau"""
+        f = self.fembs[femb]
+        f.mon_prev = self.mon_value(femb)
+        f.mon_target = self.mon_target(femb)
+        f.mon_changed = time.time()
+
+    def mon_value(self, femb):
+        f = self.fembs[femb]
+        dt = time.time() - f.mon_changed
+        return f.mon_target + (f.mon_prev - f.mon_target) * np.exp(-dt / self.settle_tau)
+
+    #################### TCP command port ####################
+    def pwr_block(self, femb):
+        f = self.fembs[femb]
+        nd = np.zeros(20, dtype=np.int64)
+        nd[0], nd[1], nd[2] = 0xdead, 0xbeef, 0x11
+        if f.on:
+            volts = [f.v["fe"], 0, f.v["adc"], f.v["cd"], 0, 0, 5.0]
+            amps = [0.42, 0, 1.29, 0.18, 0, 0, 0.05]
+        else:
+            volts = [0.0] * 7
+            amps = [0.0] * 7
+        for i in range(7):
+            v = max(volts[i] + self.rng.normal(0, 0.002), 0)
+            a = max(amps[i] + self.rng.normal(0, 0.002), 0)
+            nd[10 + i] = min(int(v / 0.00030518), 0x3fff)
+            if i == 2:
+                a = a * 1.238 * 0.01 / 0.1
+            nd[3 + i] = min(int(a * 0.1 / 1.9075E-5), 0x3fff)
+        return struct.pack(">20H", *[int(x) for x in nd])
+
+    def tcp_msg(self, msg):
+        """Handles one 16 byte request, returns the reply bytes or None"""
+        key, cmd, aux, addr, data = struct.unpack(">IHHII", msg)
+        if key != SYSKEY:
+            return None
+        with self.lock:
+            if cmd == 0x0:
+                return struct.pack(">IHHIHH", SYSKEY, cmd, aux, addr, self.hw_ver, self.fw_ver)
+            elif cmd == 3:
+                self.tcp_regs[addr] = data
+                if addr == 0x11 and data == 0:
+                    #monitor ADC conversion on the falling edge of the start bit
+                    mv = [min(max(self.mon_value(i) + self.rng.normal(0, 0.5), 0), 2047) * 16384 / 2048 for i in range(4)]
+                    self.tcp_regs[0x13] = (int(mv[0]) << 16) | int(mv[1])
+                    self.tcp_regs[0x14] = (int(mv[2]) << 16) | int(mv[3])
+            elif cmd == 4:
+                return struct.pack(">IHHII", SYSKEY, cmd, aux, addr, self.tcp_regs.get(addr, 0))
+            elif cmd == 0x0C:
+                self.fembs[aux & 0x3].on = data != 0
+            elif cmd == 0x0E:
+                rail = {0:"fe", 2:"adc", 3:"cd"}.get(addr)
+                if rail is not None:
+                    self.fembs[aux & 0x3].v[rail] = data * 1e-7
+            elif cmd == 0x0F:
+                self.pwr_latched = self.pwr_block(aux & 0x3)
+            elif cmd == 0x11:
+                return getattr(self, "pwr_latched", self.pwr_block(0))
+            elif cmd == 0x12:
+                femb = LINK_CS_FEMB.get(aux, 0)
+                c_id, page, c_addr, c_data = (data >> 24) & 0xff, (data >> 16) & 0xff, (data >> 8) & 0xff, data & 0xff
+                self.cd_regs[(femb, c_id, page, c_addr)] = c_data
+            elif cmd == 0x13:
+                femb = LINK_CS_FEMB.get(aux, 0)
+                c_id, page, c_addr = (data >> 24) & 0xff, (data >> 16) & 0xff, (data >> 8) & 0xff
+                c_data = self.cd_rd(femb, c_id, page, c_addr)
+                return struct.pack(">IHHII", SYSKEY, cmd, aux, addr, c_data << 16)
+            elif cmd == 0x14:
+                femb = LINK_CS_FEMB.get(aux, 0)
+                if data == 1: #act, what happens depends on register 0x20 of each COLDATA
+                    act = self.cd_rd(femb, 3, 0, 0x20)
+                    if act == 8:
+                        self.fe_programmed(femb)
+                    elif act == 3:
+                        self.cd_regs[(femb, 3, 0, 0x24)] = 0xff
+                        self.cd_regs[(femb, 2, 0, 0x24)] = 0xff
+        return None
+
+    def tcp_serve(self):
+        emu = self
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                buf = b""
+                while True:
+                    try:
+                        chunk = self.request.recv(4096)
+                    except OSError:
+                        break
+                    if not chunk:
+                        break
+                    buf += chunk
+                    while len(buf) >= 16:
+                        rep = emu.tcp_msg(buf[:16])
+                        buf = buf[16:]
+                        if rep is not None:
+                            self.request.sendall(rep)
+        #connections are served one at a time, in order, like the firmware does: the
+        #clients open a new connection per command and expect a write to land before
+        #the following read
+        socketserver.TCPServer.allow_reuse_address = True
+        self.tcp_server = socketserver.TCPServer((self.host, TCP_PORT), Handler)
+        self.tcp_server.serve_forever(poll_interval=0.1)
+
+    #################### UDP register and data ports ####################
+    def udp_serve(self, port):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((self.host, port))
+        sock.settimeout(0.1)
+        resp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        while not self.stop_event.is_set():
+            try:
+                data, addr = sock.recvfrom(1024)
+            except socket.timeout:
+                continue
+            if len(data) < 12:
+                continue
+            words = struct.unpack("!6H", data[:12])
+            if words[0] != KEY1 or words[1] != KEY2:
+                continue
+            reg = words[2]
+            with self.lock:
+                self.client_ip = addr[0]
+                if port == UDP_PORT_WREG:
+                    self.udp_regs[reg] = (words[3] << 16) | words[4]
+                else:
+                    val = self.udp_regs.get(reg, 0)
+                    resp.sendto(struct.pack(">HI", reg, val), (addr[0], UDP_PORT_RREGRESP))
+        sock.close()
+        resp.close()
+
+    def hs_packets(self, n):
+        """n consecutive high speed packets of the FEMB/ASIC selected by register 7"""
+        sel = self.udp_regs.get(7, 0)
+        femb = (sel >> 16) & 0x3
+        chip = (sel >> 8) & 0x7
+        f = self.fembs[femb]
+        nsmp = n * PKG_FRAMES
+        t = (self.smp_cnt + np.arange(nsmp)) % PULSE_PERIOD
+        self.smp_cnt += nsmp
+        if f.on:
+            ped, amp = self.chip_pulse(femb, chip)
+            chs = slice(chip * 16, chip * 16 + 16)
+            tp = 4.0
+            shape = (t / tp) ** 4 * np.exp(4 * (1 - t / tp))
+            smps = ped + f.ped_ofst[chs] + self.rng.standard_normal((nsmp, 16)) * f.noise[chs] + shape[:,None] * amp
+            smps = np.clip(smps, 0, 4095)
+        else:
+            smps = np.zeros((nsmp, 16))
+        markers = np.full(nsmp, 0xface, dtype=np.uint16)
+        if self.feed:
+            markers[t == 0] = 0xfeed
+        frames = pack_frames(smps, markers).reshape(n, PKG_FRAMES * 13)
+        pkts = np.zeros((n, PKG_WORDS), dtype=np.uint16)
+        cnt = (self.pkg_cnt + np.arange(n)) & 0xFFFFFFFF
+        self.pkg_cnt += n
+        pkts[:,0] = cnt >> 16
+        pkts[:,1] = cnt & 0xFFFF
+        pkts[:,8:] = frames
+        return pkts.astype(">u2")
+
+    def hs_stream(self, batch=32):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 8192000)
+        t_next = time.perf_counter()
+        while not self.stop_event.is_set():
+            with self.lock:
+                streaming = (self.client_ip is not None) and (self.tcp_regs.get(0, 1) == 0) and not (self.udp_regs.get(7, 0) & 0x80000000)
+                pkts = self.hs_packets(batch) if streaming else None
+                ip = self.client_ip
+            if pkts is None:
+                time.sleep(0.01)
+                t_next = time.perf_counter()
+                continue
+            for p in pkts:
+                try:
+                    sock.sendto(p.tobytes(), (ip, UDP_PORT_HSDATA))
+                except OSError:
+                    pass
+            self.packets_sent += batch
+            if self.rate > 0:
+                t_next += batch / self.rate
+                dt = t_next - time.perf_counter()
+                if dt > 0:
+                    time.sleep(dt)
+                else:
+                    t_next = time.perf_counter()
+        sock.close()
+
+    def start(self):
+        self.stop_event.clear()
+        for target, args in [(self.tcp_serve, ()), (self.udp_serve, (UDP_PORT_WREG,)), (self.udp_serve, (UDP_PORT_RREG,)), (self.hs_stream, ())]:
+            t = threading.Thread(target=target, args=args, daemon=True)
+            t.start()
+            self.threads.append(t)
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        if hasattr(self, "tcp_server"):
+            self.tcp_server.shutdown()
+            self.tcp_server.server_close()
+        for t in self.threads:
+            t.join()
+        self.threads = []
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Emulate the WIB UDP/TCP ports used by the checkout QC scripts")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on [127.0.0.1]")
+    parser.add_argument("--rate", "-r", default=20000, type=float, help="High speed packets per second, 0 for as fast as possible [20000]")
+    parser.add_argument("--pulse_fc", default=1.0, type=float, help="Injected charge per LArASIC DAC step in fC [1.0]")
+    parser.add_argument("--settle_tau", default=0.15, type=float, help="Time constant of the monitor ADC input after a LArASIC load in s [0.15]")
+    parser.add_argument("--feed", action="store_true", help="Mark the first sample of each pulse with 0xfeed")
+    parser.add_argument("--seed", default=None, type=int, help="Random seed for reproducible boards")
+    args = parser.parse_args()
+    emu = WIBEmu(args.host, args.rate, args.pulse_fc, args.settle_tau, args.feed, args.seed).start()
+    print ("WIB emulator on {}: UDP {}-{}, TCP {}".format(args.host, UDP_PORT_WREG, UDP_PORT_RREG, TCP_PORT))
+    try:
+        while True:
+            time.sleep(10)
+            print ("{} high speed packets sent".format(emu.packets_sent))
+    except KeyboardInterrupt:
+        emu.stop()
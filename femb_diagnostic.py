@@ -13,6 +13,7 @@ from matplotlib.colors import LogNorm
 
 from wib import WIB
 #import wib_pb2 as wibpb
+from wib_source import LiveSource, replay_dialog
 
 try:
     from matplotlib.backends.qt_compat import QtCore, QtWidgets, QtGui
@@ -304,6 +305,7 @@ class FEMBDiagnostics(QtWidgets.QWidget):
         #self.setCentralWidget(self._main)
         layout = QtWidgets.QVBoxLayout(self)
         self.wib = wib
+        self.source = LiveSource(self,ignore_failure=False)
         self.print_gui = print_gui
         self.get_femb_status = femb_status
         self.grid = QtWidgets.QGridLayout()
@@ -335,6 +337,12 @@ class FEMBDiagnostics(QtWidgets.QWidget):
         button.clicked.connect(self.toggle_continuous)
         self.continuious_button = button
         
+        button = QtWidgets.QPushButton('Replay')
+        nav_layout.addWidget(button)
+        button.setToolTip('Show stored captures instead of the WIB spy buffer')
+        button.clicked.connect(self.toggle_source)
+        self.source_button = button
+        
         self.timer = QtCore.QTimer(self)
         self.timer.timeout.connect(self.acquire_data)
         
@@ -353,11 +361,25 @@ class FEMBDiagnostics(QtWidgets.QWidget):
         if self.continuious_button.text() == 'Continuous':
             self.continuious_button.setText('Stop')
             print('Starting continuous acquisition')
-            self.timer.start(500)
+            self.timer.start(self.source.interval_ms)
         else:
             self.continuious_button.setText('Continuous')
             self.timer.stop()
     
+    @QtCore.pyqtSlot()
+    def toggle_source(self):
+        if isinstance(self.source,LiveSource):
+            source = replay_dialog(self,self.print_gui)
+            if source is None:
+                return
+            self.source = source
+            self.source_button.setText('Live')
+        else:
+            self.source = LiveSource(self,ignore_failure=False)
+            self.source_button.setText('Replay')
+        if self.timer.isActive():
+            self.timer.start(self.source.interval_ms)
+    
     @QtCore.pyqtSlot()
     def acquire_data(self):
 #        buf0, buf1 = self.get_femb_status()
@@ -371,8 +393,10 @@ class FEMBDiagnostics(QtWidgets.QWidget):
 #        if (set_up == False):
 #            self.print_gui(f"Can't acquire data if you haven't run the power sequence for FEMB {self.femb}")
 #            return
-        data = self.wib.acquire_data(buf0=self.femb<2,buf1=self.femb>=2)
+        data = self.source.acquire(buf0=self.femb<2,buf1=self.femb>=2,print_gui=self.print_gui)
         if data is None:
+            if self.timer.isActive() and self.source.finished():
+                self.toggle_continuous()
             return
             
         self.timestamps,self.samples = data
@@ -1,40 +1,78 @@
+import os
 import zmq
 import json
+import time
+import zlib
+import hashlib
 import numpy as np
 import platform
 import wib_pb2 as wibpb
+from wib_stats import CommandStats, TimeoutPolicy, command_name
 
 class WIB:
     '''Encapsulates python methods for interacting with wib_server running on a WIB'''
 
-    def __init__(self,wib_server='127.0.0.1'):
+    def __init__(self,wib_server='127.0.0.1',stats=None,policy=None):
+        self.wib_server = wib_server
+        #pass a shared CommandStats to keep the statistics across reconnects
+        self.stats = stats if stats is not None else CommandStats()
+        #receive timeouts adapt to the observed latency, use TimeoutPolicy(stats,adaptive=False) for the fixed ones
+        self.policy = policy if policy is not None else TimeoutPolicy(self.stats)
         self.context = zmq.Context()
+        self.connect()
+
+    def connect(self):
         self.socket = self.context.socket(zmq.REQ)
-        self.socket.connect('tcp://%s:1234'%wib_server)
+        self.socket.connect('tcp://%s:1234'%self.wib_server)
+
+    def reconnect(self):
+        '''A REQ socket that timed out waiting for a reply can not send again, replace it'''
+        self.socket.close(linger=0)
+        self.connect()
 
-    def send_command(self,req,rep,print_gui=None):
+    def send_command(self,req,rep,print_gui=None,retries=0):
+        '''
+        Sends req and parses the reply into rep, returns 1 on failure. Timing of every
+        command is recorded in self.stats. After a timeout the socket is replaced and
+        the command is sent again up to retries times (only use for idempotent commands).
+        '''
+        name = command_name(req)
+        t0 = time.perf_counter()
         cmd = wibpb.Command()
         cmd.cmd.Pack(req)
-        if (type(req) == type(wibpb.PowerWIB())):
-            self.socket.setsockopt(zmq.RCVTIMEO, 60000) # milliseconds
-        elif (type(req) == type(wibpb.Script())):
-            self.socket.setsockopt(zmq.RCVTIMEO, 15000) # milliseconds
-        elif (type(req) == type(wibpb.Calibrate())):
-            self.socket.setsockopt(zmq.RCVTIMEO, 20000) # milliseconds
-        elif (type(req) == type(wibpb.ResetTiming())):
-            self.socket.setsockopt(zmq.RCVTIMEO, 20000) # milliseconds
-        else:
-            self.socket.setsockopt(zmq.RCVTIMEO, 5000) # milliseconds
-        try:
-            self.socket.send(cmd.SerializeToString())
-        except:
-            print_gui("Socket timed out while sending. Please check to make sure the network cable is connected and restart the GUI!")
-            return 1
-        try:
-            rep.ParseFromString(self.socket.recv())
-        except:
-            print_gui("Socket timed out while receiving. Please check to make sure the network cable is connected and restart the GUI!")
-            return 1
+        msg = cmd.SerializeToString()
+        t_serialize = time.perf_counter()-t0
+        for attempt in range(retries+1):
+            if attempt > 0:
+                self.stats.record_retry(name)
+            timeout,size = self.policy.timeout(name,req,len(msg)) # milliseconds
+            self.socket.setsockopt(zmq.RCVTIMEO, timeout)
+            t0 = time.perf_counter()
+            try:
+                self.socket.send(msg)
+            except:
+                self.stats.record_error(name)
+                print_gui("Socket timed out while sending. Please check to make sure the network cable is connected and restart the GUI!")
+                return 1
+            t1 = time.perf_counter()
+            try:
+                reply = self.socket.recv()
+            except:
+                self.stats.record_timeout(name,time.perf_counter()-t1)
+                self.reconnect()
+                if attempt < retries:
+                    continue
+                print_gui("Socket timed out while receiving. Please check to make sure the network cable is connected and restart the GUI!")
+                return 1
+            t2 = time.perf_counter()
+            try:
+                rep.ParseFromString(reply)
+            except:
+                self.stats.record_error(name)
+                print_gui("Could not parse the reply to %s from the WIB!"%name)
+                return 1
+            self.stats.record(name,t_serialize,t1-t0,t2-t1,time.perf_counter()-t2,len(msg),len(reply),size)
+            return 0
         
     def defaults(self):
         req = wibpb.ConfigureWIB()
@@ -132,6 +170,78 @@ class WIB:
         samples = np.frombuffer(rep.deframed_samples,dtype=np.uint16).reshape((4,128,num))
         return timestamps,samples
     
+    def update(self,root_archive,boot_archive,chunk_size=1024*1024,upload_id=None,progress=None,print_gui=print,retries=3):
+        '''
+        Uploads root and boot archives with UpdateBegin/UpdateChunk/UpdateCommit, reading
+        one chunk at a time so memory use is bounded by chunk_size. By default the upload
+        id is derived from the archive digests, so running the same update again resumes
+        from the last chunk the WIB acknowledged. progress(sent,total) is called after
+        every chunk. Returns True once the WIB has verified and deployed the archives.
+        '''
+        paths = [root_archive,boot_archive]
+        sizes = [os.path.getsize(p) for p in paths]
+        digests = []
+        for p in paths:
+            h = hashlib.sha256()
+            with open(p,'rb') as fin:
+                for block in iter(lambda: fin.read(chunk_size),b''):
+                    h.update(block)
+            digests.append(h.digest())
+        if upload_id is None:
+            upload_id = hashlib.sha256(digests[0]+digests[1]).hexdigest()[:16]
+
+        req = wibpb.UpdateBegin()
+        req.upload_id = upload_id
+        req.root_size,req.boot_size = sizes
+        req.root_sha256,req.boot_sha256 = digests
+        rep = wibpb.UpdateStatus()
+        if self.send_command(req,rep,print_gui,retries=retries) or not rep.success:
+            print_gui('Update %s could not be started: %s'%(upload_id,rep.extra.decode('ascii',errors='replace')))
+            return False
+        received = [rep.root_received,rep.boot_received]
+        total = sum(sizes)
+        if sum(received):
+            print_gui('Resuming update %s at %i of %i bytes'%(upload_id,sum(received),total))
+
+        rejected = 0
+        for archive,path in enumerate(paths):
+            with open(path,'rb') as fin:
+                while received[archive] < sizes[archive]:
+                    offset = received[archive]
+                    fin.seek(offset)
+                    data = fin.read(chunk_size)
+                    req = wibpb.UpdateChunk()
+                    req.upload_id = upload_id
+                    req.archive = archive
+                    req.offset = offset
+                    req.data = data
+                    req.crc32 = zlib.crc32(data)
+                    rep = wibpb.UpdateStatus()
+                    #chunks carry their offset, so sending one again is harmless
+                    if self.send_command(req,rep,print_gui,retries=retries):
+                        print_gui('Update %s interrupted at %i of %i bytes, run it again to resume'%(upload_id,sum(received),total))
+                        return False
+                    if not rep.success:
+                        print_gui('Chunk at %i of archive %i rejected: %s'%(offset,archive,rep.extra.decode('ascii',errors='replace')))
+                        rejected += 1
+                        if rejected > retries:
+                            return False
+                    else:
+                        rejected = 0
+                    #the WIB reports what it really has, continue from there
+                    received = [rep.root_received,rep.boot_received]
+                    if progress is not None:
+                        progress(sum(received),total)
+
+        req = wibpb.UpdateCommit()
+        req.upload_id = upload_id
+        rep = wibpb.Status()
+        if self.send_command(req,rep,print_gui):
+            return False
+        if not rep.success:
+            print_gui('Update %s failed: %s'%(upload_id,rep.extra.decode('ascii',errors='replace')))
+        return rep.success
+
     def print_timing_status(self,timing_status):
         print('--- PLL INFO ---')
         print('LOS:         0x%x'%(timing_status.los_val & 0x0f))
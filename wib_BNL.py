@@ -12,6 +12,9 @@ import datetime
 from collections import deque
 from wib_scope import WIBScope
 from wib_mon import WIBMon
+from wib_latency import WIBLatency
+from wib_stats import CommandStats
+from wib_sensors import parse_tiers, DEFAULT_TIERS
 from femb_diagnostic import FEMBDiagnostics
 from wib_buttons1 import WIBButtons1
 from wib_buttons2 import WIBButtons2
@@ -39,7 +42,9 @@ class WIBMain(QtWidgets.QMainWindow):
         self.text = QtWidgets.QTextBrowser(text_box)
         #self.showMaximized()
         self.parse_config(config_path)
-        self.wib = WIB(self.wib_address)
+        #Shared by every WIB object so the statistics survive address changes and restarts
+        self.command_stats = CommandStats()
+        self.wib = WIB(self.wib_address,self.command_stats)
         self.wib_modules = []
         #If the pulser is on or not, so multiple areas of GUI can make decisions based on that
         self.pulser = False
@@ -111,7 +116,7 @@ class WIBMain(QtWidgets.QMainWindow):
         
         power_tab = QtWidgets.QWidget()
         power_tab.layout = QtWidgets.QVBoxLayout(power_tab)
-        wib_mon = WIBMon(self.wib, self.gui_print)
+        wib_mon = WIBMon(self.wib, self.gui_print, self.history_tiers, os.path.join(os.path.dirname(config_path), "settings_alarms.ini"))
         self.wib_modules.append(wib_mon)
         power_tab.layout.addWidget(wib_mon)
         left_tabs.addTab(power_tab,"Power Monitoring")
@@ -127,6 +132,12 @@ class WIBMain(QtWidgets.QMainWindow):
         self.wib_modules.append(femb_diagnostics)
         femb_tab.layout.addWidget(femb_diagnostics)
         left_tabs.addTab(femb_tab,"FEMB Diagnostics")
+        latency_tab = QtWidgets.QWidget()
+        latency_tab.layout = QtWidgets.QVBoxLayout(latency_tab)
+        wib_latency = WIBLatency(self.wib, self.gui_print)
+        self.wib_modules.append(wib_latency)
+        latency_tab.layout.addWidget(wib_latency)
+        left_tabs.addTab(latency_tab,"Command Latency")
         
         right_tabs = QtWidgets.QTabWidget()
         
@@ -443,7 +454,7 @@ class WIBMain(QtWidgets.QMainWindow):
     def wib_address_edited(self):
         ip_text_field = self.wib_ip_input.text()
         del self.wib
-        self.wib = WIB(ip_text_field)
+        self.wib = WIB(ip_text_field,self.command_stats)
         self.text.append(f"IP Address changed to {ip_text_field}")
         for i in self.wib_modules:
             i.wib = self.wib
@@ -454,10 +465,12 @@ class WIBMain(QtWidgets.QMainWindow):
             config.read(config_path, encoding='utf-8')
             self.wib_address = config["DEFAULT"]["WIB_ADDRESS"]
             self.default_femb = config["DEFAULT"]["FEMB"]
+            self.history_tiers = parse_tiers(config["DEFAULT"].get("HISTORY_TIERS", "1:3600,60:1440,3600:720"))
         except:
             self.gui_print("Error: Config file not found at {}. Using default values")
             self.wib_address = "192.168.121.1"
             self.default_femb = 0
+            self.history_tiers = DEFAULT_TIERS
             
     def gui_print(self, text):
         self.text.append("---------------")
@@ -475,7 +488,7 @@ class WIBMain(QtWidgets.QMainWindow):
     def restart_zmq(self):
         ip_text_field = self.wib_ip_input.text()
         del self.wib
-        self.wib = WIB(ip_text_field)
+        self.wib = WIB(ip_text_field,self.command_stats)
         self.text.append(f"ZeroMQ interface restarted with IP Address of {ip_text_field}")
         for i in self.wib_modules:
             i.wib = self.wib
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+
+import fnmatch
+import configparser
+import numpy as np
+
+OK = 0
+WARNING = 1
+CRITICAL = 2
+STATE_NAMES = ['OK','WARNING','CRITICAL']
+
+class Limit:
+    '''Limits for one value, any bound may be None'''
+
+    def __init__(self,lo=None,hi=None,crit_lo=None,crit_hi=None,hysteresis=0.0,debounce=1,crit_debounce=1,trip=False):
+        self.lo = lo
+        self.hi = hi
+        self.crit_lo = crit_lo
+        self.crit_hi = crit_hi
+        self.hysteresis = hysteresis
+        self.debounce = debounce
+        self.crit_debounce = crit_debounce
+        self.trip = trip
+
+    @staticmethod
+    def around(ref,tol,crit_tol=None):
+        '''Window of +/- tol (and optionally +/- crit_tol) around a reference value'''
+        if crit_tol is None:
+            return Limit(lo=ref-tol,hi=ref+tol)
+        return Limit(lo=ref-tol,hi=ref+tol,crit_lo=ref-crit_tol,crit_hi=ref+crit_tol)
+
+def _opt(section,key):
+    val = section.get(key,fallback='').strip()
+    return None if val == '' else float(val)
+
+def _read(path):
+    config = configparser.ConfigParser()
+    if not config.read(path,encoding='utf-8'):
+        raise IOError('Alarm limits file %s not found'%path)
+    return config
+
+def _section(config,column):
+    '''First section of config whose name matches column, None if there is none'''
+    for pattern in config.sections():
+        if fnmatch.fnmatchcase(column,pattern):
+            return config[pattern]
+    return None
+
+def _common(s):
+    return dict(hysteresis=s.getfloat('hysteresis',fallback=0.0),debounce=s.getint('debounce',fallback=1),
+                crit_debounce=s.getint('crit_debounce',fallback=1),trip=s.getboolean('trip',fallback=False))
+
+def load_limits(path,columns):
+    '''
+    Reads an ini file where each section name is a column name or fnmatch pattern
+    (e.g. femb*.dc2dc_v1.mA) with keys lo, hi, crit_lo, crit_hi, hysteresis, debounce,
+    crit_debounce and trip. The first matching section wins. Returns {column:Limit}.
+    '''
+    config = _read(path)
+    limits = {}
+    for column in columns:
+        s = _section(config,column)
+        if s is not None:
+            limits[column] = Limit(lo=_opt(s,'lo'),hi=_opt(s,'hi'),crit_lo=_opt(s,'crit_lo'),crit_hi=_opt(s,'crit_hi'),**_common(s))
+    return limits
+
+def load_windows(path,refs):
+    '''
+    Like load_limits, for sections giving a window of +/- tol (and optionally
+    crit_tol) around a reference known only when checking, e.g. the set voltage of
+    a rail. refs is {column:reference}. Returns {column:Limit}.
+    '''
+    config = _read(path)
+    limits = {}
+    for column,ref in refs.items():
+        s = _section(config,column)
+        if s is not None and _opt(s,'tol') is not None:
+            limits[column] = Limit.around(ref,_opt(s,'tol'),_opt(s,'crit_tol'))
+            for k,v in _common(s).items():
+                setattr(limits[column],k,v)
+    return limits
+
+class AlarmEngine:
+    '''
+    Evaluates the limits of every column at once on each snapshot. A column must be
+    out of range for `debounce` consecutive snapshots (`crit_debounce` for critical)
+    to raise its state, and must come back inside the limits by `hysteresis` for as
+    many snapshots to lower it. nan values leave the state unchanged.
+    '''
+
+    def __init__(self,columns,limits):
+        self.columns = list(columns)
+        n = len(self.columns)
+        def bound(attr,default):
+            return np.array([default if limits.get(c) is None or getattr(limits[c],attr) is None else getattr(limits[c],attr) for c in self.columns],dtype=np.float64)
+        self.lo = bound('lo',-np.inf)
+        self.hi = bound('hi',np.inf)
+        self.crit_lo = bound('crit_lo',-np.inf)
+        self.crit_hi = bound('crit_hi',np.inf)
+        self.hysteresis = bound('hysteresis',0.0)
+        self.debounce = bound('debounce',1).astype(np.int64)
+        self.crit_debounce = bound('crit_debounce',1).astype(np.int64)
+        self.trip = np.array([c in limits and limits[c].trip for c in self.columns],dtype=bool)
+        self.monitored = np.array([c in limits for c in self.columns],dtype=bool)
+        self.state = np.zeros(n,dtype=np.int8)
+        self.candidate = np.zeros(n,dtype=np.int8)
+        self.count = np.zeros(n,dtype=np.int64)
+
+    def level(self,values):
+        '''State each value would have with no hysteresis or debounce'''
+        raw = np.zeros(len(self.columns),dtype=np.int8)
+        with np.errstate(invalid='ignore'):
+            raw[(values < self.lo) | (values > self.hi)] = WARNING
+            raw[(values < self.crit_lo) | (values > self.crit_hi)] = CRITICAL
+        return raw
+
+    def evaluate(self,values):
+        '''Updates the alarm states from one snapshot, returns a list of (column,old,new,value) transitions'''
+        values = np.asarray(values,dtype=np.float64)
+        raw = self.level(values)
+        h = self.hysteresis
+        with np.errstate(invalid='ignore'):
+            # leaving a state needs the value back inside that state's limits by the hysteresis
+            inside_warn = (values >= self.lo+h) & (values <= self.hi-h)
+            inside_crit = (values >= self.crit_lo+h) & (values <= self.crit_hi-h)
+        hold = ((self.state == WARNING) & (raw < WARNING) & ~inside_warn) | ((self.state == CRITICAL) & (raw < CRITICAL) & ~inside_crit)
+        target = np.where(hold,self.state,raw)
+        target[np.isnan(values)] = self.state[np.isnan(values)]
+
+        changing = target != self.state
+        same = changing & (target == self.candidate)
+        self.count = np.where(same,self.count+1,np.where(changing,1,0))
+        self.candidate = np.where(changing,target,self.state).astype(np.int8)
+        needed = np.where(target == CRITICAL,self.crit_debounce,self.debounce)
+        flip = changing & (self.count >= needed)
+
+        transitions = []
+        for i in np.nonzero(flip)[0]:
+            transitions.append((self.columns[i],int(self.state[i]),int(target[i]),float(values[i])))
+        self.state[flip] = target[flip]
+        self.count[flip] = 0
+        return transitions
+
+    def tripped(self):
+        '''Columns marked trip=true that are currently CRITICAL'''
+        return [self.columns[i] for i in np.nonzero(self.trip & (self.state == CRITICAL))[0]]
+
+    def worst(self,cols):
+        return int(np.max(self.state[cols])) if len(cols) else OK
+
+    def describe(self,transition):
+        column,old,new,value = transition
+        i = self.columns.index(column)
+        return '%s %s -> %s (%0.3f, limits [%g, %g] critical [%g, %g])'%(column,STATE_NAMES[old],STATE_NAMES[new],value,self.lo[i],self.hi[i],self.crit_lo[i],self.crit_hi[i])
+
+def power_off_all(wib,print_gui=print):
+    '''Turns every FEMB off, used when a trip column goes CRITICAL'''
+    import wib_pb2 as wibpb
+    req = wibpb.PowerWIB()
+    req.femb0 = False
+    req.femb1 = False
+    req.femb2 = False
+    req.femb3 = False
+    req.cold = False
+    req.stage = 0
+    rep = wibpb.Status()
+    print_gui('ALARM: critical over-current, turning all FEMBs off')
+    if not wib.send_command(req,rep,print_gui):
+        print_gui(rep.extra.decode('ascii'))
+        return rep.success
+    return False
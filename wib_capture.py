@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+
+import os
+import time
+import json
+import queue
+import signal
+import argparse
+import datetime
+import threading
+
+from wib import WIB
+import wib_pb2 as wibpb
+from wib_frames import frame_view, TS_LO_OFFSET, TS_HI_OFFSET
+
+def first_timestamp(buf):
+    '''Timestamp of the first frame in a raw spy buffer, None if there is none'''
+    if len(buf) == 0:
+        return None
+    frames = frame_view(buf)
+    if len(frames) == 0:
+        return None
+    return int(frames[0,TS_LO_OFFSET]) | (int(frames[0,TS_HI_OFFSET]) << 32)
+
+class Capture:
+    '''One ReadDaqSpy reply with the metadata of the request that produced it'''
+
+    def __init__(self,index,armed,received,success,trigger_command,trigger_rec_ticks,buf0,buf1):
+        self.index = index
+        self.armed = armed          # unix time the request was sent
+        self.received = received    # unix time the reply arrived
+        self.success = success
+        self.trigger_command = trigger_command
+        self.trigger_rec_ticks = trigger_rec_ticks
+        self.buf0 = buf0
+        self.buf1 = buf1
+        self.timestamp = first_timestamp(buf0) if len(buf0) else first_timestamp(buf1)
+
+    def metadata(self):
+        return {
+            'index' : self.index,
+            'armed' : self.armed,
+            'received' : self.received,
+            'success' : self.success,
+            'trigger_command' : self.trigger_command,
+            'trigger_rec_ticks' : self.trigger_rec_ticks,
+            'timestamp' : self.timestamp,
+            'buf0_bytes' : len(self.buf0),
+            'buf1_bytes' : len(self.buf1),
+        }
+
+class CaptureWriter:
+    '''
+    Appends captures to <prefix>.bin (buf0 then buf1 of each capture, like wib_client
+    daqspy) and one JSON line per capture with its offset to <prefix>.jsonl
+    '''
+
+    def __init__(self,directory,prefix=None,flush_every=1):
+        os.makedirs(directory,exist_ok=True)
+        if prefix is None:
+            prefix = 'captures_'+datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
+        self.path = os.path.join(directory,prefix)
+        self.fbin = open(self.path+'.bin','ab')
+        self.fmeta = open(self.path+'.jsonl','a')
+        self.flush_every = flush_every
+        self.offset = self.fbin.tell()
+        self.count = 0
+        self.bytes = 0
+        self.seconds = 0.0
+
+    def write(self,capture):
+        start = time.perf_counter()
+        meta = capture.metadata()
+        meta['offset'] = self.offset
+        self.fbin.write(capture.buf0)
+        self.fbin.write(capture.buf1)
+        size = len(capture.buf0)+len(capture.buf1)
+        self.offset += size
+        self.fmeta.write(json.dumps(meta)+'\n')
+        self.count += 1
+        self.bytes += size
+        if self.count % self.flush_every == 0:
+            self.fbin.flush()
+            self.fmeta.flush()
+        self.seconds += time.perf_counter()-start
+
+    def close(self):
+        self.fbin.close()
+        self.fmeta.close()
+
+class CaptureScheduler:
+    '''
+    Keeps a triggered ReadDaqSpy armed on its own WIB connection: as soon as one
+    reply arrives the next request is sent and the reply is handed to a writer
+    thread through a queue of at most queue_size captures. When the writer falls
+    behind, arming waits for room in the queue (or the capture is dropped with
+    drop_when_full) so memory stays bounded.
+
+    Live time is the time a request was outstanding, dead time the rest: queue
+    back pressure, writing and the turnaround between reply and the next request.
+    '''
+
+    def __init__(self,wib_server,writer,trigger_command=0,trigger_rec_ticks=180360,trigger_timeout_ms=60000,
+                 buf0=True,buf1=True,queue_size=16,drop_when_full=False,max_captures=None,log=print):
+        self.wib = WIB(wib_server)
+        self.writer = writer
+        self.trigger_command = trigger_command
+        self.trigger_rec_ticks = trigger_rec_ticks
+        self.trigger_timeout_ms = trigger_timeout_ms
+        self.buf0 = buf0
+        self.buf1 = buf1
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.drop_when_full = drop_when_full
+        self.max_captures = max_captures
+        self.log = log
+        self.stop_event = threading.Event()
+        self.lock = threading.Lock()
+        self.attempts = 0
+        self.captures = 0
+        self.timeouts = 0
+        self.failures = 0
+        self.dropped = 0
+        self.live = 0.0
+        self.queue_high_water = 0
+        self.started = None
+        self.stopped = None
+        self.arm_thread = threading.Thread(target=self.arm_loop,name='capture-arm',daemon=True)
+        self.write_thread = threading.Thread(target=self.write_loop,name='capture-write',daemon=True)
+
+    def request(self):
+        req = wibpb.ReadDaqSpy()
+        req.buf0 = self.buf0
+        req.buf1 = self.buf1
+        req.deframe = False
+        req.trigger_command = self.trigger_command
+        req.trigger_rec_ticks = self.trigger_rec_ticks
+        req.trigger_timeout_ms = self.trigger_timeout_ms
+        return req
+
+    def arm_loop(self):
+        req = self.request()
+        while not self.stop_event.is_set():
+            if self.max_captures is not None and self.captures >= self.max_captures:
+                break
+            rep = wibpb.ReadDaqSpy.DaqSpy()
+            armed = time.time()
+            start = time.perf_counter()
+            failed = self.wib.send_command(req,rep,self.log)
+            live = time.perf_counter()-start
+            with self.lock:
+                self.attempts += 1
+                self.live += live
+                if failed:
+                    self.failures += 1
+                    continue
+                if not rep.success:
+                    #no trigger within trigger_timeout_ms
+                    self.timeouts += 1
+                    continue
+                self.captures += 1
+                index = self.captures-1
+            capture = Capture(index,armed,time.time(),rep.success,self.trigger_command,self.trigger_rec_ticks,rep.buf0,rep.buf1)
+            if self.drop_when_full:
+                try:
+                    self.queue.put_nowait(capture)
+                except queue.Full:
+                    with self.lock:
+                        self.dropped += 1
+            else:
+                while not self.stop_event.is_set():
+                    try:
+                        self.queue.put(capture,timeout=0.1)
+                        break
+                    except queue.Full:
+                        pass
+            self.queue_high_water = max(self.queue_high_water,self.queue.qsize())
+        self.queue.put(None)
+
+    def write_loop(self):
+        while True:
+            capture = self.queue.get()
+            if capture is None:
+                break
+            self.writer.write(capture)
+        self.writer.close()
+
+    def start(self):
+        self.started = time.monotonic()
+        self.write_thread.start()
+        self.arm_thread.start()
+        return self
+
+    def stop(self):
+        '''Stops arming after the outstanding request, then waits for the queue to drain'''
+        self.stop_event.set()
+        self.join()
+
+    def join(self):
+        self.arm_thread.join()
+        self.write_thread.join()
+        if self.stopped is None:
+            self.stopped = time.monotonic()
+
+    def done(self):
+        return not self.arm_thread.is_alive()
+
+    def stats(self):
+        with self.lock:
+            elapsed = (self.stopped or time.monotonic())-self.started if self.started is not None else 0.0
+            return {
+                'elapsed' : elapsed,
+                'attempts' : self.attempts,
+                'captures' : self.captures,
+                'timeouts' : self.timeouts,
+                'failures' : self.failures,
+                'dropped' : self.dropped,
+                'written' : self.writer.count,
+                'bytes_written' : self.writer.bytes,
+                'write_seconds' : self.writer.seconds,
+                'trigger_rate' : self.captures/elapsed if elapsed > 0 else 0.0,
+                'live_time' : self.live,
+                'dead_time' : max(0.0,elapsed-self.live),
+                'live_fraction' : self.live/elapsed if elapsed > 0 else 0.0,
+                'efficiency' : (self.captures-self.dropped)/self.attempts if self.attempts else 0.0,
+                'queue_depth' : self.queue.qsize(),
+                'queue_high_water' : self.queue_high_water,
+            }
+
+    def describe(self):
+        s = self.stats()
+        return ('%(captures)i captures in %(elapsed)0.1f s (%(trigger_rate)0.2f Hz), %(timeouts)i without trigger, '
+                '%(failures)i failed, %(dropped)i dropped, live %(live_fraction)0.1f%%, dead %(dead_time)0.1f s, '
+                'efficiency %(efficiency)0.2f, queue %(queue_depth)i (max %(queue_high_water)i)')%dict(s,live_fraction=s['live_fraction']*100)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Keep a triggered ReadDaqSpy armed and write every capture to disk')
+    parser.add_argument('--wib_server','-w',default='127.0.0.1',help='IP of wib_server to connect to [127.0.0.1]')
+    parser.add_argument('--buffers','-b',choices=['buf0','buf1','both'],default='both',help='Select specific buffers [both]')
+    parser.add_argument('--cmd',type=int,default=0,help='TLU commmand to use as trigger, or 0 for software trigger [0]')
+    parser.add_argument('--rec',type=int,default=180360,help='Record time after trigger in 4.158ns ticks [180360 ~750us]')
+    parser.add_argument('--timeout',type=int,default=60000,help='Trigger timeout time in ms [60000 ~1min]')
+    parser.add_argument('--count','-n',type=int,default=None,help='Stop after this many captures [run until interrupted]')
+    parser.add_argument('--duration','-d',type=float,default=None,help='Stop after this many seconds [run until interrupted]')
+    parser.add_argument('--queue','-q',type=int,default=16,help='Captures held in memory waiting to be written [16]')
+    parser.add_argument('--drop',action='store_true',help='Drop captures when the queue is full instead of pausing the trigger')
+    parser.add_argument('--status',type=float,default=10.0,help='Seconds between status lines [10]')
+    parser.add_argument('directory',help='Directory for the capture files')
+    args = parser.parse_args()
+
+    writer = CaptureWriter(args.directory)
+    print('Writing captures to %s.bin'%writer.path)
+    sched = CaptureScheduler(args.wib_server,writer,args.cmd,args.rec,args.timeout,
+                             args.buffers in ['buf0','both'],args.buffers in ['buf1','both'],
+                             args.queue,args.drop,args.count).start()
+    stop = threading.Event()
+    signal.signal(signal.SIGINT,lambda *_: stop.set())
+    signal.signal(signal.SIGTERM,lambda *_: stop.set())
+    start = time.monotonic()
+    while not stop.is_set() and not sched.done():
+        remaining = None if args.duration is None else args.duration-(time.monotonic()-start)
+        if remaining is not None and remaining <= 0:
+            break
+        stop.wait(args.status if remaining is None else min(args.status,remaining))
+        print(sched.describe())
+    sched.stop()
+    print(sched.describe())
@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import time
+import json
+import sqlite3
+import argparse
+import numpy as np
+
+from wib_frames import frame_view, unpack_frames, TS_LO_OFFSET, TS_HI_OFFSET
+
+# ConfigureWIB.ConfigureFEMB fields stored as columns of the femb table
+FEMB_FIELDS = ('test_cap','gain','peak_time','baseline','pulse_dac','gain_match','leak','leak_10x','ac_couple','buffer',
+               'strobe_skip','strobe_delay','strobe_length')
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS captures (
+    id INTEGER PRIMARY KEY,
+    time REAL NOT NULL,
+    wib_server TEXT,
+    femb_mask INTEGER,
+    cold INTEGER,
+    pulser INTEGER,
+    adc_test_pattern INTEGER,
+    frame_dd INTEGER,
+    temperature REAL,
+    kind TEXT NOT NULL,
+    offset INTEGER NOT NULL,
+    nbytes INTEGER NOT NULL,
+    dtype TEXT NOT NULL,
+    shape TEXT NOT NULL,
+    first_timestamp INTEGER,
+    trigger_command INTEGER,
+    source TEXT,
+    extra TEXT
+);
+CREATE TABLE IF NOT EXISTS fembs (
+    capture_id INTEGER NOT NULL REFERENCES captures(id),
+    femb INTEGER NOT NULL,
+    serial TEXT,
+    %s,
+    PRIMARY KEY (capture_id,femb)
+);
+CREATE INDEX IF NOT EXISTS captures_time ON captures(time);
+CREATE INDEX IF NOT EXISTS captures_wib ON captures(wib_server,time);
+CREATE INDEX IF NOT EXISTS fembs_serial ON fembs(serial,gain,peak_time);
+CREATE INDEX IF NOT EXISTS fembs_settings ON fembs(gain,peak_time,baseline);
+'''%',\n    '.join('%s INTEGER'%f for f in FEMB_FIELDS)
+
+def config_fields(config):
+    '''
+    (global settings, list of 4 per FEMB dicts or None) from a ConfigureWIB message
+    or a config dict in the format WIB.configure loads
+    '''
+    if config is None:
+        return {},[None]*4
+    if hasattr(config,'fembs'):
+        glob = {k:int(getattr(config,k)) for k in ('cold','pulser','adc_test_pattern','frame_dd')}
+        fembs = [dict({k:int(getattr(f,k)) for k in FEMB_FIELDS},enabled=bool(f.enabled)) for f in config.fembs]
+    else:
+        glob = {k:int(config[k]) for k in ('cold','pulser','adc_test_pattern','frame_dd') if k in config}
+        fembs = []
+        for i,fconfig in enumerate(config.get('femb_configs',[None]*4)):
+            if fconfig is None:
+                fembs.append(None)
+                continue
+            femb = {k:int(fconfig[k]) for k in FEMB_FIELDS if k in fconfig}
+            femb['enabled'] = bool(config['enabled_fembs'][i]) if 'enabled_fembs' in config else True
+            fembs.append(femb)
+    fembs = (fembs+[None]*4)[:4]
+    glob['femb_mask'] = sum(1<<i for i,f in enumerate(fembs) if f is not None and f['enabled'])
+    return glob,fembs
+
+def frame14_slots(buffer):
+    '''FEMB slots held by spy buffer buffer'''
+    return [2*buffer,2*buffer+1]
+
+class Catalog:
+    '''
+    Capture store: sample blocks are appended to one data file and indexed in an
+    SQLite database with the WIB, FEMB configuration, serial numbers and
+    temperature they were taken with. Blocks are read back as memmaps, so a query
+    over many captures only touches the data it actually uses.
+
+    kind is 'frame14' for raw spy buffers (uint32 words, decoded on request) or
+    'samples' for already deframed (4,128,num) uint16 samples. A spy buffer only
+    holds two FEMBs (buf0 FEMB 0/1, buf1 FEMB 2/3), so only those two are indexed.
+    '''
+
+    DATA = 'captures.dat'
+    INDEX = 'catalog.db'
+
+    def __init__(self,directory):
+        os.makedirs(directory,exist_ok=True)
+        self.directory = directory
+        self.data_path = os.path.join(directory,self.DATA)
+        self.db = sqlite3.connect(os.path.join(directory,self.INDEX))
+        self.db.row_factory = sqlite3.Row
+        self.db.executescript(SCHEMA)
+        self.fdata = open(self.data_path,'ab')
+
+    def close(self):
+        self.fdata.close()
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*args):
+        self.close()
+
+    def append(self,array):
+        '''Appends array to the data file, returns its offset. The data is flushed before it is indexed.'''
+        self.fdata.seek(0,os.SEEK_END)
+        offset = self.fdata.tell()
+        self.fdata.write(np.ascontiguousarray(array).tobytes())
+        self.fdata.flush()
+        os.fsync(self.fdata.fileno())
+        return offset
+
+    def add(self,data,kind='samples',wib_server=None,config=None,serials=None,temperature=None,t=None,
+            trigger_command=None,source=None,extra=None,buffer=0):
+        '''
+        Stores one capture and returns its id. data is a (4,128,num) sample array
+        for kind 'samples', or the bytes of raw spy buffer buffer (0 or 1) for kind
+        'frame14'. config and serials are given for all four FEMB slots.
+        '''
+        if kind == 'frame14':
+            array = frame_view(data)
+            first_ts = int(array[0,TS_LO_OFFSET]) | (int(array[0,TS_HI_OFFSET]) << 32) if len(array) else None
+            extra = dict(extra or {},buffer=buffer)
+            slots = frame14_slots(buffer)
+        elif kind == 'samples':
+            array = np.asarray(data,dtype=np.uint16)
+            first_ts = None
+            slots = range(4)
+        else:
+            raise ValueError('Unknown capture kind %s'%kind)
+        glob,fembs = config_fields(config)
+        serials = (list(serials or [])+[None]*4)[:4]
+        offset = self.append(array)
+        with self.db:
+            cur = self.db.execute('INSERT INTO captures (time,wib_server,femb_mask,cold,pulser,adc_test_pattern,frame_dd,temperature,'
+                                  'kind,offset,nbytes,dtype,shape,first_timestamp,trigger_command,source,extra) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)',
+                                  (time.time() if t is None else t,wib_server,glob.get('femb_mask'),glob.get('cold'),glob.get('pulser'),
+                                   glob.get('adc_test_pattern'),glob.get('frame_dd'),temperature,kind,offset,array.nbytes,
+                                   array.dtype.str,json.dumps(array.shape),first_ts,trigger_command,source,
+                                   None if extra is None else json.dumps(extra)))
+            capture_id = cur.lastrowid
+            for i,(femb,serial) in enumerate(zip(fembs,serials)):
+                if i not in slots or (femb is None and serial is None):
+                    continue
+                femb = femb or {}
+                self.db.execute('INSERT INTO fembs (capture_id,femb,serial,%s) VALUES (?,?,?,%s)'%(','.join(FEMB_FIELDS),','.join('?'*len(FEMB_FIELDS))),
+                                (capture_id,i,serial)+tuple(femb.get(k) for k in FEMB_FIELDS))
+        return capture_id
+
+    def query(self,wib_server=None,serial=None,since=None,until=None,kind=None,cold=None,limit=None,**settings):
+        '''
+        Captures matching all given criteria, oldest first, as sqlite3.Row objects.
+        serial and FEMB settings (gain=, peak_time=, ...) match if any FEMB of the
+        capture has them, on the same FEMB when given together.
+        '''
+        where,args = [],[]
+        for col,op,val in (('c.wib_server','=',wib_server),('c.time','>=',since),('c.time','<',until),('c.kind','=',kind),('c.cold','=',cold)):
+            if val is not None:
+                where.append('%s %s ?'%(col,op))
+                args.append(int(val) if isinstance(val,bool) else val)
+        femb_where,femb_args = [],[]
+        if serial is not None:
+            femb_where.append('f.serial = ?')
+            femb_args.append(serial)
+        for k,v in settings.items():
+            if k not in FEMB_FIELDS:
+                raise ValueError('Unknown FEMB setting %s'%k)
+            femb_where.append('f.%s = ?'%k)
+            femb_args.append(int(v))
+        if femb_where:
+            where.append('EXISTS (SELECT 1 FROM fembs f WHERE f.capture_id = c.id AND %s)'%' AND '.join(femb_where))
+            args += femb_args
+        sql = 'SELECT c.* FROM captures c'
+        if where:
+            sql += ' WHERE '+' AND '.join(where)
+        sql += ' ORDER BY c.time, c.id'
+        if limit is not None:
+            sql += ' LIMIT %i'%int(limit)
+        return self.db.execute(sql,args).fetchall()
+
+    def get(self,capture_id):
+        return self.db.execute('SELECT * FROM captures WHERE id = ?',(capture_id,)).fetchone()
+
+    def fembs(self,capture_id):
+        return self.db.execute('SELECT * FROM fembs WHERE capture_id = ? ORDER BY femb',(capture_id,)).fetchall()
+
+    def block(self,capture):
+        '''Read only memmap of the stored array of a capture (row or id)'''
+        if not isinstance(capture,sqlite3.Row):
+            capture = self.get(capture)
+        self.fdata.flush()
+        return np.memmap(self.data_path,dtype=np.dtype(capture['dtype']),mode='r',offset=capture['offset'],shape=tuple(json.loads(capture['shape'])))
+
+    def slots(self,capture):
+        '''FEMB slots of the rows of samples(capture)'''
+        if not isinstance(capture,sqlite3.Row):
+            capture = self.get(capture)
+        if capture['kind'] == 'frame14':
+            return frame14_slots(json.loads(capture['extra'] or '{}').get('buffer',0))
+        return list(range(4))
+
+    def samples(self,capture):
+        '''(timestamps,samples) of a capture; samples is (2,128,num) for frame14 captures (FEMBs slots(capture)) and (4,128,num) otherwise'''
+        if not isinstance(capture,sqlite3.Row):
+            capture = self.get(capture)
+        block = self.block(capture)
+        if capture['kind'] == 'frame14':
+            return unpack_frames(block)
+        return None,block
+
+    def import_daqspy(self,path,both=True,buffer=0,**kwargs):
+        '''Adds a file written by wib_client daqspy (buf0 then buf1 when both, otherwise only spy buffer buffer)'''
+        data = np.memmap(path,dtype=np.uint8,mode='r')
+        if not both:
+            return [self.add(data,kind='frame14',source=os.path.abspath(path),buffer=buffer,**kwargs)]
+        parts = [data[:len(data)//2],data[len(data)//2:]]
+        return [self.add(part,kind='frame14',source=os.path.abspath(path),buffer=i,**kwargs) for i,part in enumerate(parts)]
+
+    def import_captures(self,prefix,**kwargs):
+        '''Adds the captures written by wib_capture.CaptureWriter to <prefix>.bin/.jsonl'''
+        ids = []
+        data = np.memmap(prefix+'.bin',dtype=np.uint8,mode='r')
+        with open(prefix+'.jsonl','r') as fin:
+            for line in fin:
+                meta = json.loads(line)
+                offset = meta['offset']
+                for i,key in enumerate(('buf0_bytes','buf1_bytes')):
+                    if meta[key] == 0:
+                        continue
+                    ids.append(self.add(data[offset:offset+meta[key]],kind='frame14',t=meta['received'],trigger_command=meta['trigger_command'],
+                                        source=os.path.abspath(prefix+'.bin'),extra={'index':meta['index']},buffer=i,**kwargs))
+                    offset += meta[key]
+        return ids
+
+def load_config(path):
+    if path is None:
+        return None
+    with open(path,'r') as fin:
+        return json.load(fin)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Index spy buffer captures and query them by WIB, FEMB and configuration')
+    parser.add_argument('catalog',help='Catalog directory')
+    sub = parser.add_subparsers(dest='cmd',help='catalog command')
+
+    add_parser = sub.add_parser('add',help='Add wib_client daqspy files or wib_capture runs')
+    add_parser.add_argument('--wib_server','-w',default=None,help='IP of the WIB the data came from')
+    add_parser.add_argument('--config','-C',default=None,help='WIB configuration JSON the data was taken with')
+    add_parser.add_argument('--serials','-s',default=None,help='Comma separated FEMB serial numbers, in slot order')
+    add_parser.add_argument('--temperature','-T',default=None,type=float,help='Temperature the data was taken at')
+    add_parser.add_argument('--single',action='store_true',help='daqspy files hold a single buffer')
+    add_parser.add_argument('--buffer',type=int,choices=[0,1],default=0,help='Spy buffer the --single files hold [0]')
+    add_parser.add_argument('files',nargs='+',help='.bin files from wib_client daqspy, or .jsonl files from wib_capture')
+
+    query_parser = sub.add_parser('query',help='List matching captures')
+    query_parser.add_argument('--wib_server','-w',default=None,help='Only captures from this WIB')
+    query_parser.add_argument('--serial','-s',default=None,help='Only captures of this FEMB serial number')
+    query_parser.add_argument('--gain','-g',default=None,type=int,help='Only captures with a FEMB at this gain setting')
+    query_parser.add_argument('--peak_time','-p',default=None,type=int,help='Only captures with a FEMB at this peak time setting')
+    query_parser.add_argument('--since',default=None,type=float,help='Only captures after this unix time')
+    query_parser.add_argument('--until',default=None,type=float,help='Only captures before this unix time')
+    query_parser.add_argument('--stats',action='store_true',help='Print the mean and RMS of each capture')
+    args = parser.parse_args()
+
+    if args.cmd is None:
+        parser.print_help()
+        sys.exit(1)
+
+    with Catalog(args.catalog) as cat:
+        if args.cmd == 'add':
+            kwargs = {'wib_server':args.wib_server,'config':load_config(args.config),'temperature':args.temperature,
+                      'serials':None if args.serials is None else args.serials.split(',')}
+            for path in args.files:
+                if path.endswith('.jsonl'):
+                    ids = cat.import_captures(path[:-len('.jsonl')],**kwargs)
+                else:
+                    ids = cat.import_daqspy(path,both=not args.single,buffer=args.buffer,**kwargs)
+                print('%s: added %i captures'%(path,len(ids)))
+        elif args.cmd == 'query':
+            settings = {k:v for k,v in (('gain',args.gain),('peak_time',args.peak_time)) if v is not None}
+            for row in cat.query(wib_server=args.wib_server,serial=args.serial,since=args.since,until=args.until,**settings):
+                line = '%6i %s %-15s mask 0x%x %-8s %10i bytes'%(row['id'],time.strftime('%Y-%m-%d %H:%M:%S',time.localtime(row['time'])),
+                                                                row['wib_server'] or '-',row['femb_mask'] or 0,row['kind'],row['nbytes'])
+                if args.stats:
+                    timestamps,samples = cat.samples(row)
+                    line += '  mean %0.1f rms %0.1f'%(np.mean(samples),np.std(samples))
+                print(line)
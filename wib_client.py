@@ -219,6 +219,8 @@ bind_parser(cdfastcmd_parser,cdfastcmd)
 update_parser = sub.add_parser('update',help='Deploy a new root and boot archive to the WIB',add_help=False)
 update_parser.add_argument('root_archive',help='Root filesystem archive')
 update_parser.add_argument('boot_archive',help='Boot filesystem archive')
+update_parser.add_argument('--chunked',action='store_true',help='Upload with UpdateBegin/UpdateChunk/UpdateCommit, resumable (needs a wib_server with chunked updates)')
+update_parser.add_argument('--chunk_mb',default=1.0,type=float,help='With --chunked, upload in chunks of this many MB [1]')
 def update(args):
     if not os.path.exists(args.root_archive):
         print('Root archive',args.root_archive,'not found. Aborting update.')
@@ -226,15 +228,28 @@ def update(args):
     if not os.path.exists(args.boot_archive):
         print('Boot archive',args.boot_archive,'not found. Aborting update.')
         return
-    req = wibpb.Update()
-    with open(args.root_archive,'rb') as froot:
-        req.root_archive = froot.read()
-    with open(args.boot_archive,'rb') as fboot:
-        req.boot_archive = fboot.read()
-    rep = wibpb.Empty()
-    print('Sending update command...')
-    wib.send_command(req,rep) 
-    print('WIB will now update and reboot.')
+    if not args.chunked:
+        req = wibpb.Update()
+        with open(args.root_archive,'rb') as froot:
+            req.root_archive = froot.read()
+        with open(args.boot_archive,'rb') as fboot:
+            req.boot_archive = fboot.read()
+        rep = wibpb.Empty()
+        print('Sending update command...')
+        wib.send_command(req,rep) 
+        print('WIB will now update and reboot.')
+        return
+    start = time.time()
+    def progress(sent,total):
+        rate = sent/max(time.time()-start,1e-6)/1e6
+        print('\rUploaded %0.1f of %0.1f MB (%0.1f MB/s)'%(sent/1e6,total/1e6,rate),end='',flush=True)
+    print('Sending update in %0.1f MB chunks...'%args.chunk_mb)
+    success = wib.update(args.root_archive,args.boot_archive,chunk_size=int(args.chunk_mb*1024*1024),progress=progress)
+    print()
+    if success:
+        print('Update deployed, reboot the WIB to run it.')
+    else:
+        print('Update failed, run the same command again to resume.')
 bind_parser(update_parser,update)
 
 exit_parser = sub.add_parser('exit',help='Closes the command interface',add_help=False)
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+
+import numpy as np
+
+# Frame-14 layout of the DAQ spy buffers, in 32 bit little endian words:
+#   start_frame, wib_pre[4], femb_a_seg[56], femb_b_seg[56], wib_post[2], idle_frame
+# Each femb seg carries 128 14 bit samples packed LSB first in stream (uvx) order.
+# wib_pre[2] and wib_pre[3] hold the low and high words of the 64 bit timestamp.
+FRAME14_WORDS = 120
+FRAME14_BYTES = FRAME14_WORDS*4
+FRAME14_START = 0x3c
+FRAME14_IDLE = 0xbc
+FEMB_A_OFFSET = 5
+FEMB_B_OFFSET = 61
+SEG_WORDS = 56
+TS_LO_OFFSET = 3
+TS_HI_OFFSET = 4
+
+_bit_weights = (np.uint64(1) << np.arange(32,dtype=np.uint64))
+# word and bit offset of each of the 128 samples in a seg, for unpack14
+_sample_word = (np.arange(128)*14)//32
+_sample_shift = ((np.arange(128)*14) % 32).astype(np.uint64)
+
+def pack14(samples):
+    '''Packs (...,128) 14 bit samples into (...,56) uint32 words'''
+    samples = np.asarray(samples,dtype=np.uint16)
+    bits = (samples[...,np.newaxis] >> np.arange(14,dtype=np.uint16)) & 1
+    bits = bits.reshape(samples.shape[:-1]+(SEG_WORDS,32)).astype(np.uint64)
+    return np.sum(bits*_bit_weights,axis=-1).astype(np.uint32)
+
+def unpack14(words):
+    '''Unpacks (...,56) uint32 words into (...,128) uint16 samples'''
+    words = np.asarray(words,dtype=np.uint32).astype(np.uint64)
+    padded = np.concatenate([words,np.zeros(words.shape[:-1]+(1,),dtype=np.uint64)],axis=-1)
+    value = (padded[...,_sample_word] >> _sample_shift) | (padded[...,_sample_word+1] << (np.uint64(32)-_sample_shift))
+    return (value & np.uint64(0x3fff)).astype(np.uint16)
+
+def pack_frames(femb_a,femb_b,timestamps,crate=0,slot=0):
+    '''
+    Builds the contents of one spy buffer. femb_a and femb_b are (128,num) sample
+    arrays, timestamps is (num,). Returns bytes of num frames.
+    '''
+    num = len(timestamps)
+    frames = np.zeros((num,FRAME14_WORDS),dtype=np.uint32)
+    frames[:,0] = FRAME14_START
+    frames[:,1] = (crate & 0xff) | ((slot & 0x7) << 12)
+    timestamps = np.asarray(timestamps,dtype=np.uint64)
+    frames[:,TS_LO_OFFSET] = (timestamps & np.uint64(0xffffffff)).astype(np.uint32)
+    frames[:,TS_HI_OFFSET] = (timestamps >> np.uint64(32)).astype(np.uint32)
+    frames[:,FEMB_A_OFFSET:FEMB_A_OFFSET+SEG_WORDS] = pack14(np.asarray(femb_a).T)
+    frames[:,FEMB_B_OFFSET:FEMB_B_OFFSET+SEG_WORDS] = pack14(np.asarray(femb_b).T)
+    frames[:,-1] = FRAME14_IDLE
+    return frames.astype('<u4').tobytes()
+
+def frame_view(buf):
+    '''(num,FRAME14_WORDS) uint32 view of whole frames in a buffer or memmap, starting at the first start word'''
+    words = np.frombuffer(buf,dtype='<u4') if not isinstance(buf,np.ndarray) else buf.reshape(-1).view('<u4')
+    starts = np.nonzero(words[:FRAME14_WORDS] == FRAME14_START)[0]
+    first = int(starts[0]) if len(starts) else 0
+    num = (len(words)-first)//FRAME14_WORDS
+    return words[first:first+num*FRAME14_WORDS].reshape((num,FRAME14_WORDS))
+
+def unpack_frames(buf):
+    '''Returns (timestamps (num,), samples (2,128,num)) from one spy buffer'''
+    frames = frame_view(buf)
+    timestamps = frames[:,TS_LO_OFFSET].astype(np.uint64) | (frames[:,TS_HI_OFFSET].astype(np.uint64) << np.uint64(32))
+    samples = np.empty((2,128,len(frames)),dtype=np.uint16)
+    samples[0] = unpack14(frames[:,FEMB_A_OFFSET:FEMB_A_OFFSET+SEG_WORDS]).T
+    samples[1] = unpack14(frames[:,FEMB_B_OFFSET:FEMB_B_OFFSET+SEG_WORDS]).T
+    return timestamps,samples
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+
+import time
+import math
+
+try:
+    from matplotlib.backends.qt_compat import QtCore, QtWidgets
+except:
+    from matplotlib.backends.backend_qt4agg import QtCore, QtWidgets
+
+COLUMNS = [
+    ('Command',None),
+    ('Count','count'),
+    ('Timeouts','timeouts'),
+    ('Retries','retries'),
+    ('Errors','errors'),
+    ('Mean (ms)','mean'),
+    ('p50 (ms)','p50'),
+    ('p90 (ms)','p90'),
+    ('p99 (ms)','p99'),
+    ('Max (ms)','max'),
+    ('Wait p50 (ms)','wait_p50'),
+    ('Timeout (ms)','timeout_ms'),
+    ('kB sent','bytes_sent'),
+    ('kB received','bytes_received'),
+]
+
+def format_value(key,value):
+    if value is None or (isinstance(value,float) and math.isnan(value)):
+        return '-'
+    if key == 'timeout_ms':
+        return str(value)
+    if key.startswith('bytes'):
+        return '%0.1f'%(value/1024)
+    if isinstance(value,float):
+        return '%0.2f'%(value*1000)
+    return str(value)
+
+class WIBLatency(QtWidgets.QWidget):
+    '''Table of the per command latency statistics collected by WIB.send_command'''
+
+    def __init__(self, wib, gui_print):
+        super().__init__()
+        self.wib = wib
+        self.gui_print = gui_print
+        layout = QtWidgets.QVBoxLayout(self)
+
+        self.table = QtWidgets.QTableWidget(0,len(COLUMNS),self)
+        self.table.setHorizontalHeaderLabels([c[0] for c in COLUMNS])
+        self.table.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        self.table.verticalHeader().setVisible(False)
+        layout.addWidget(self.table)
+
+        buttons = QtWidgets.QHBoxLayout()
+        self.status_label = QtWidgets.QLabel()
+        buttons.addWidget(self.status_label)
+        reset_button = QtWidgets.QPushButton('Reset')
+        reset_button.setToolTip('Clear the collected statistics')
+        reset_button.clicked.connect(self.reset)
+        buttons.addWidget(reset_button)
+        dump_button = QtWidgets.QPushButton('Save Statistics')
+        dump_button.setToolTip('Save the statistics and latency histograms to a JSON file')
+        dump_button.clicked.connect(self.dump)
+        buttons.addWidget(dump_button)
+        layout.addLayout(buttons)
+
+        self.timer = QtCore.QTimer()
+        self.timer.timeout.connect(self.refresh)
+        self.timer.start(2000)
+
+    @QtCore.pyqtSlot()
+    def refresh(self):
+        if not self.isVisible():
+            return
+        summary = self.wib.stats.summary()
+        self.table.setRowCount(len(summary))
+        for row,(name,stat) in enumerate(summary.items()):
+            for col,(label,key) in enumerate(COLUMNS):
+                text = name if key is None else format_value(key,stat[key])
+                item = self.table.item(row,col)
+                if item is None:
+                    item = QtWidgets.QTableWidgetItem(text)
+                    self.table.setItem(row,col,item)
+                elif item.text() != text:
+                    item.setText(text)
+        self.status_label.setText('Since %s'%time.strftime('%H:%M:%S',time.localtime(self.wib.stats.started)))
+
+    def reset(self):
+        self.wib.stats.reset()
+        self.table.setRowCount(0)
+        self.refresh()
+
+    def dump(self):
+        name,_ = QtWidgets.QFileDialog.getSaveFileName(None,'Save Command Statistics','','*.json')
+        if name:
+            self.wib.stats.dump(name)
+            self.gui_print('Command statistics saved to %s'%name)
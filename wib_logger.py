@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+
+import os
+import time
+import json
+import signal
+import argparse
+import datetime
+import threading
+import numpy as np
+
+from wib import WIB
+import wib_pb2 as wibpb
+from wib_sensors import SENSOR_NAMES, NUM_SENSOR_VALUES, DEFAULT_DECODER, flatten_sensors
+from wib_alarms import AlarmEngine, load_limits, power_off_all
+
+# One fixed width record per poll. A failed poll is still written (ok=0, values nan)
+# so gaps in the data are visible.
+RECORD_DTYPE = np.dtype([
+    ('time','<f8'),     # unix time the request was sent
+    ('latency','<f4'),  # seconds until the reply was parsed
+    ('ok','u1'),        # 1 if the WIB replied
+    ('missed','u1'),    # polling ticks skipped before this one (saturates at 255)
+    ('values','<f4',(NUM_SENSOR_VALUES,)),
+])
+
+class RecordFile:
+    '''Append-only binary file of RECORD_DTYPE rows with a JSON header sidecar, rotated by size or age'''
+
+    def __init__(self,directory,wib_server,index,rotate_bytes=64*1024*1024,rotate_seconds=24*3600,flush_every=10):
+        self.directory = directory
+        self.wib_server = wib_server
+        self.index = index
+        self.rotate_bytes = rotate_bytes
+        self.rotate_seconds = rotate_seconds
+        self.flush_every = flush_every
+        self.fout = None
+        self.path = None
+
+    def open(self,t):
+        stamp = datetime.datetime.fromtimestamp(t).strftime('%Y%m%d_%H%M%S')
+        base = os.path.join(self.directory,'sensors_%s_%s'%(self.wib_server.replace(':','_'),stamp))
+        self.path = base+'.bin'
+        n = 1
+        while os.path.exists(self.path):
+            self.path = '%s_%i.bin'%(base,n)
+            n += 1
+        header = {
+            'wib_server' : self.wib_server,
+            'created' : t,
+            'dtype' : [list(d) if len(d) == 2 else [d[0],d[1],list(d[2])] for d in RECORD_DTYPE.descr],
+            'record_size' : RECORD_DTYPE.itemsize,
+            'sensor_names' : SENSOR_NAMES,
+        }
+        with open(self.path+'.json','w') as fout:
+            json.dump(header,fout,indent=1)
+        self.fout = open(self.path,'ab')
+        self.opened = t
+        self.first = None
+        self.last = None
+        self.count = 0
+        self.size = 0
+
+    def write(self,record):
+        t = float(record['time'])
+        if self.fout is None:
+            self.open(t)
+        elif self.size >= self.rotate_bytes or t-self.opened >= self.rotate_seconds:
+            self.close()
+            self.open(t)
+        self.fout.write(record.tobytes())
+        self.size += RECORD_DTYPE.itemsize
+        self.count += 1
+        if self.first is None:
+            self.first = t
+        self.last = t
+        if self.count % self.flush_every == 0:
+            self.fout.flush()
+            self.index.update(self.path,self.wib_server,self.first,self.last,self.count)
+
+    def close(self):
+        if self.fout is not None:
+            self.fout.close()
+            self.fout = None
+            self.index.update(self.path,self.wib_server,self.first,self.last,self.count)
+
+class LogIndex:
+    '''index.json in the log directory listing the time range covered by each record file'''
+
+    def __init__(self,directory):
+        self.path = os.path.join(directory,'index.json')
+        self.lock = threading.Lock()
+        if os.path.exists(self.path):
+            with open(self.path,'r') as fin:
+                self.files = json.load(fin)
+        else:
+            self.files = {}
+
+    def update(self,path,wib_server,first,last,count):
+        with self.lock:
+            self.files[os.path.basename(path)] = {'wib_server':wib_server,'first':first,'last':last,'count':count}
+            tmp = self.path+'.tmp'
+            with open(tmp,'w') as fout:
+                json.dump(self.files,fout,indent=1)
+            os.replace(tmp,self.path)
+
+def read_records(path):
+    '''Memory maps a record file written by RecordFile'''
+    with open(path+'.json','r') as fin:
+        header = json.load(fin)
+    dtype = np.dtype([tuple(d) if len(d) == 2 else (d[0],d[1],tuple(d[2])) for d in header['dtype']])
+    nrec = os.path.getsize(path)//dtype.itemsize
+    if nrec == 0:
+        return header,np.zeros(0,dtype=dtype)
+    return header,np.memmap(path,dtype=dtype,mode='r',shape=(nrec,))
+
+def read_range(directory,wib_server,t0,t1):
+    '''Concatenates all records from wib_server with t0 <= time < t1 using the index'''
+    with open(os.path.join(directory,'index.json'),'r') as fin:
+        files = json.load(fin)
+    chunks = []
+    for name,info in sorted(files.items(),key=lambda x: x[1]['first']):
+        if info['wib_server'] != wib_server or info['last'] < t0 or info['first'] >= t1:
+            continue
+        header,records = read_records(os.path.join(directory,name))
+        sel = (records['time'] >= t0) & (records['time'] < t1)
+        chunks.append(np.array(records[sel]))
+    if len(chunks) == 0:
+        return np.zeros(0,dtype=RECORD_DTYPE)
+    return np.concatenate(chunks)
+
+class SensorPoller(threading.Thread):
+    '''Polls GetSensors on one WIB on an absolute schedule so a slow reply never shifts later polls'''
+
+    def __init__(self,wib_server,interval,writer,stop,log=print,alarms=None):
+        super().__init__(name='poll-%s'%wib_server,daemon=True)
+        self.wib_server = wib_server
+        self.alarms = alarms
+        self.tripped = False
+        self.interval = interval
+        self.writer = writer
+        self.stop = stop
+        self.log = log
+        self.wib = WIB(wib_server)
+        self.polls = 0
+        self.failures = 0
+        self.missed = 0
+        self.max_jitter = 0.0
+
+    def poll(self,missed):
+        record = np.zeros((),dtype=RECORD_DTYPE)
+        record['missed'] = min(missed,255)
+        req = wibpb.GetSensors()
+        rep = wibpb.GetSensors.Sensors()
+        t = time.time()
+        start = time.perf_counter()
+        failed = self.wib.send_command(req,rep,lambda text: self.log('%s: %s'%(self.wib_server,text)))
+        record['time'] = t
+        record['latency'] = time.perf_counter()-start
+        if failed:
+            self.failures += 1
+            record['values'] = np.nan
+        else:
+            record['ok'] = 1
+            record['values'] = flat = flatten_sensors(rep)
+            if self.alarms is not None:
+                self.check_alarms(DEFAULT_DECODER.decode(flat))
+        self.writer.write(record)
+        self.polls += 1
+
+    def check_alarms(self,values):
+        log = lambda text: self.log('%s: %s'%(self.wib_server,text))
+        for t in self.alarms.evaluate(values):
+            log('ALARM: '+self.alarms.describe(t))
+        tripped = self.alarms.tripped()
+        if tripped and not self.tripped:
+            log('ALARM: %s critical'%', '.join(tripped))
+            power_off_all(self.wib,log)
+        self.tripped = len(tripped) > 0
+
+    def run(self):
+        deadline = time.monotonic()
+        missed = 0
+        while not self.stop.is_set():
+            self.max_jitter = max(self.max_jitter,time.monotonic()-deadline)
+            self.poll(missed)
+            deadline += self.interval
+            now = time.monotonic()
+            missed = 0
+            if now > deadline:
+                missed = int((now-deadline)//self.interval)+1
+                deadline += missed*self.interval
+                self.missed += missed
+            self.stop.wait(deadline-now)
+        self.writer.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Log GetSensors from one or more WIBs without the GUI')
+    parser.add_argument('--wib_server','-w',action='append',help='IP of wib_server to poll, may be given multiple times [127.0.0.1]')
+    parser.add_argument('--interval','-i',default=1.0,type=float,help='Seconds between polls of each WIB [1.0]')
+    parser.add_argument('--rotate_mb',default=64.0,type=float,help='Start a new file after this many MB [64]')
+    parser.add_argument('--rotate_hours',default=24.0,type=float,help='Start a new file after this many hours [24]')
+    parser.add_argument('--duration','-d',default=None,type=float,help='Stop after this many seconds [run until interrupted]')
+    parser.add_argument('--alarms','-a',default=None,help='Alarm limits file (e.g. settings_alarms.ini) to evaluate on every poll, trip limits turn the FEMBs off')
+    parser.add_argument('--latency',default=None,help='Save the GetSensors latency statistics of each WIB to this JSON file on exit (WIB address is appended)')
+    parser.add_argument('--status',default=60.0,type=float,help='Seconds between status lines [60]')
+    parser.add_argument('directory',help='Directory for the record files and index.json')
+    args = parser.parse_args()
+
+    wib_servers = args.wib_server if args.wib_server else ['127.0.0.1']
+    os.makedirs(args.directory,exist_ok=True)
+    index = LogIndex(args.directory)
+    stop = threading.Event()
+    signal.signal(signal.SIGINT,lambda *_: stop.set())
+    signal.signal(signal.SIGTERM,lambda *_: stop.set())
+
+    pollers = []
+    for wib_server in wib_servers:
+        writer = RecordFile(args.directory,wib_server,index,rotate_bytes=int(args.rotate_mb*1024*1024),rotate_seconds=args.rotate_hours*3600)
+        alarms = None
+        if args.alarms is not None:
+            alarms = AlarmEngine(DEFAULT_DECODER.columns,load_limits(args.alarms,DEFAULT_DECODER.columns))
+        pollers.append(SensorPoller(wib_server,args.interval,writer,stop,alarms=alarms))
+    for p in pollers:
+        p.start()
+
+    start = time.monotonic()
+    while not stop.is_set():
+        remaining = None if args.duration is None else args.duration-(time.monotonic()-start)
+        if remaining is not None and remaining <= 0:
+            stop.set()
+            break
+        stop.wait(args.status if remaining is None else min(args.status,remaining))
+        for p in pollers:
+            print('%s: %i polls, %i failed, %i ticks missed, max jitter %0.1f ms'%(p.wib_server,p.polls,p.failures,p.missed,p.max_jitter*1000))
+    for p in pollers:
+        p.join()
+        if args.latency is not None:
+            root,ext = os.path.splitext(args.latency)
+            p.wib.stats.dump('%s_%s%s'%(root,p.wib_server.replace(':','_'),ext or '.json'))
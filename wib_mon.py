@@ -11,8 +11,11 @@ from math import nan
 
 from wib import WIB
 import wib_pb2 as wibpb
+from wib_alarms import AlarmEngine, load_limits, power_off_all, OK, WARNING, CRITICAL
+from wib_sensors import SensorHistory, SENSOR_NAMES, DEFAULT_TIERS, DEFAULT_DECODER, flatten_sensors, sensor_index, tier_label
 
 colors = [(0x00,0x2b,0x36),(0x07,0x36,0x42),(0x58,0x6e,0x75),(0x83,0x94,0x96)]
+alarm_colors = {OK:colors[1],WARNING:(0xb5,0x89,0x00),CRITICAL:(0xdc,0x32,0x2f)}
 
 try:
     from matplotlib.backends.qt_compat import QtCore, QtWidgets, QtGui
@@ -36,13 +39,20 @@ class Sensor(QtWidgets.QWidget):
         p = self.palette()
         p.setColor(self.backgroundRole(), QtGui.QColor(r,g,b))
         self.setPalette(p)
+        
+    def set_text(self,label,text):
+        #setText repaints even when the text is the same, skip it unless the value changed
+        if label.text() != text:
+            label.setText(text)
 
 class IVSensor(Sensor):
-    def __init__(self,parent,label,accessor,sense_ohms=0.1,disabled=False):
+    def __init__(self,parent,label,key,disabled=False):
+        ''' key is the SensorDecoder iv name, e.g. femb0.dc2dc_v1 '''
         super().__init__(parent)
-        self.accessor = accessor
+        self.col_v = DEFAULT_DECODER.column(key+'.V')
+        self.col_i = DEFAULT_DECODER.column(key+'.mA')
+        self.columns = [self.col_v,self.col_i]
         self.label = label
-        self.sense_ohms = sense_ohms
         self.disabled = disabled
         
         layout = QtWidgets.QVBoxLayout(self)
@@ -62,27 +72,25 @@ class IVSensor(Sensor):
         self.I.setStyleSheet('QLabel { font-weight: bold; color: #6c71c4; } ')
         sub_layout.addWidget(self.I)
         self.I.setMinimumWidth(100);
-        
-        layout.addWidget(sub)
-            
-    def load_data(self,sensors):
-        before,after = self.accessor(sensors)
-        current = (before-after)/self.sense_ohms*1000.0 #mA
         if self.disabled:
             self.V.setText('---- V')
             self.I.setText('---- mA')
-        else:
-            self.V.setText('%0.2f V'%before)
-            self.I.setText('%0.1f mA'%current)
+        
+        layout.addWidget(sub)
+            
+    def load_data(self,values):
+        if not self.disabled:
+            self.set_text(self.V,'%0.2f V'%values[self.col_v])
+            self.set_text(self.I,'%0.1f mA'%values[self.col_i])
         
     
 class VTSensor(Sensor):
-    def __init__(self,parent,label,accessor,calib=(0.5,75,-0.002)):
-        ''' calib tuple is (calib_voltage, calib_temp_c, volts_per_deg_c) '''
+    def __init__(self,parent,label,key):
+        ''' key is the SensorDecoder vt name, the calibration is part of the decoder '''
         super().__init__(parent)
-        self.accessor = accessor
+        self.col = DEFAULT_DECODER.column(key+'.C')
+        self.columns = [self.col]
         self.label = label
-        self.calib_v,self.calib_c,self.calib_v_per_c = calib
         
         layout = QtWidgets.QVBoxLayout(self)
         
@@ -100,16 +108,15 @@ class VTSensor(Sensor):
             
         layout.addWidget(sub)
         
-    def load_data(self,sensors):
-        vtemp = self.accessor(sensors)
-        temp = (vtemp-self.calib_v)/self.calib_v_per_c + self.calib_c
-        self.V.setText('%0.1f C'%temp)
+    def load_data(self,values):
+        self.set_text(self.V,'%0.1f C'%values[self.col])
         
     
 class TSensor(Sensor):
-    def __init__(self,parent,label,accessor):
+    def __init__(self,parent,label,key):
         super().__init__(parent)
-        self.accessor = accessor
+        self.col = DEFAULT_DECODER.column(key+'.C')
+        self.columns = [self.col]
         self.label = label
         
         layout = QtWidgets.QVBoxLayout(self)
@@ -128,21 +135,10 @@ class TSensor(Sensor):
             
         layout.addWidget(sub)
         
-    def load_data(self,sensors):
-        temp = self.accessor(sensors)
-        self.T.setText('%0.1f C'%temp)
+    def load_data(self,values):
+        self.set_text(self.T,'%0.1f C'%values[self.col])
         
 
-def dc2dc(s,idx):
-    if idx == 0:
-        return s.femb0_dc2dc_ltc2991_voltages
-    elif idx == 1:
-        return s.femb1_dc2dc_ltc2991_voltages
-    elif idx == 2:
-        return s.femb2_dc2dc_ltc2991_voltages
-    elif idx == 3:
-        return s.femb3_dc2dc_ltc2991_voltages
-
 class FEMBPane(QtWidgets.QGroupBox):
     def __init__(self,parent,idx):
         super().__init__('FEMB%i'%idx,parent)
@@ -154,25 +150,26 @@ class FEMBPane(QtWidgets.QGroupBox):
         self.setPalette(p)
         self.setStyleSheet('QGroupBox { font-weight: bold; color: #cb4b16; } ')
             
-        self.tpower_sensor = VTSensor(self,'Power Temp',lambda s: s.ltc2499_15_temps[self.idx])
+        femb = 'femb%i'%idx
+        self.tpower_sensor = VTSensor(self,'Power Temp',femb+'.power_temp')
         self.iv_sensors = []
-        self.iv_sensors.append(IVSensor(self,'LDO A0',lambda s: s.femb_ldo_a0_ltc2991_voltages[self.idx*2:(self.idx+1)*2],sense_ohms=0.01,disabled=True))
-        self.iv_sensors.append(IVSensor(self,'LDO A1',lambda s: s.femb_ldo_a1_ltc2991_voltages[self.idx*2:(self.idx+1)*2],sense_ohms=0.01,disabled=True))
-        self.iv_sensors.append(IVSensor(self,'5V Bias',lambda s: s.femb_bias_ltc2991_voltages[self.idx*2:(self.idx+1)*2],sense_ohms=0.1))
-        self.iv_sensors.append(IVSensor(self,'DC/DC V1',lambda s: dc2dc(s,self.idx)[0:2],sense_ohms=0.1))
-        self.iv_sensors.append(IVSensor(self,'DC/DC V2',lambda s: dc2dc(s,self.idx)[2:4],sense_ohms=0.1))
-        self.iv_sensors.append(IVSensor(self,'DC/DC V3',lambda s: dc2dc(s,self.idx)[4:6],sense_ohms=0.01))
-        self.iv_sensors.append(IVSensor(self,'DC/DC V4',lambda s: dc2dc(s,self.idx)[6:8],sense_ohms=0.1))
+        self.iv_sensors.append(IVSensor(self,'LDO A0',femb+'.ldo_a0',disabled=True))
+        self.iv_sensors.append(IVSensor(self,'LDO A1',femb+'.ldo_a1',disabled=True))
+        self.iv_sensors.append(IVSensor(self,'5V Bias',femb+'.bias'))
+        self.iv_sensors.append(IVSensor(self,'DC/DC V1',femb+'.dc2dc_v1'))
+        self.iv_sensors.append(IVSensor(self,'DC/DC V2',femb+'.dc2dc_v2'))
+        self.iv_sensors.append(IVSensor(self,'DC/DC V3',femb+'.dc2dc_v3'))
+        self.iv_sensors.append(IVSensor(self,'DC/DC V4',femb+'.dc2dc_v4'))
         
         layout = QtWidgets.QGridLayout(self)
         layout.addWidget(self.tpower_sensor,0,0)
         for i,t in enumerate(self.iv_sensors):
             layout.addWidget(t,(i+1)//4,(i+1)%4)
         
-    def load_data(self,sensors):
-        self.tpower_sensor.load_data(sensors)
+    def load_data(self,values):
+        self.tpower_sensor.load_data(values)
         for s in self.iv_sensors:
-            s.load_data(sensors)
+            s.load_data(values)
         
 class WIBPane(QtWidgets.QGroupBox):
     def __init__(self,parent):
@@ -185,21 +182,21 @@ class WIBPane(QtWidgets.QGroupBox):
         self.setStyleSheet('QGroupBox { font-weight: bold; color: #cb4b16; } ')
         
         self.t_sensors = []
-        self.t_sensors.append(TSensor(self,'Board Temp 1',lambda s: s.ad7414_49_temp))
-        self.t_sensors.append(TSensor(self,'Board Temp 2',lambda s: s.ad7414_4d_temp))
-        self.t_sensors.append(TSensor(self,'Board Temp 3',lambda s: s.ad7414_4a_temp))
-        self.t_sensors.append(TSensor(self,'DDR Temp',lambda s: nan)) #FIXME
-        self.t_sensors.append(VTSensor(self,'Power Temp 1',lambda s: s.ltc2499_15_temps[4]))
-        self.t_sensors.append(VTSensor(self,'Power Temp 2',lambda s: s.ltc2499_15_temps[5]))
-        self.t_sensors.append(VTSensor(self,'Power Temp 3',lambda s: s.ltc2499_15_temps[6]))
+        self.t_sensors.append(TSensor(self,'Board Temp 1','wib.board_temp1'))
+        self.t_sensors.append(TSensor(self,'Board Temp 2','wib.board_temp2'))
+        self.t_sensors.append(TSensor(self,'Board Temp 3','wib.board_temp3'))
+        self.t_sensors.append(TSensor(self,'DDR Temp','wib.ddr_temp')) #FIXME
+        self.t_sensors.append(VTSensor(self,'Power Temp 1','wib.power_temp1'))
+        self.t_sensors.append(VTSensor(self,'Power Temp 2','wib.power_temp2'))
+        self.t_sensors.append(VTSensor(self,'Power Temp 3','wib.power_temp3'))
         self.iv_sensors = []
-        self.iv_sensors.append(IVSensor(self,'WIB 5 V',lambda s: s.ltc2990_4e_voltages[0:2],sense_ohms=0.001))
-        self.iv_sensors.append(IVSensor(self,'WIB 1.2 V',lambda s: s.ltc2990_4c_voltages[0:2],sense_ohms=0.001))
-        self.iv_sensors.append(IVSensor(self,'WIB 3.3 V',lambda s: s.ltc2990_4c_voltages[2:4],sense_ohms=0.001))
-        self.iv_sensors.append(IVSensor(self,'WIB 0.85 V',lambda s: s.ltc2991_48_voltages[0:2],sense_ohms=0.001))
-        self.iv_sensors.append(IVSensor(self,'WIB 0.9 V',lambda s: s.ltc2991_48_voltages[2:4],sense_ohms=0.001))
-        self.iv_sensors.append(IVSensor(self,'WIB 2.5 V',lambda s: s.ltc2991_48_voltages[4:6],sense_ohms=0.001))
-        self.iv_sensors.append(IVSensor(self,'WIB 1.8 V',lambda s: s.ltc2991_48_voltages[6:8],sense_ohms=0.001))
+        self.iv_sensors.append(IVSensor(self,'WIB 5 V','wib.5V'))
+        self.iv_sensors.append(IVSensor(self,'WIB 1.2 V','wib.1.2V'))
+        self.iv_sensors.append(IVSensor(self,'WIB 3.3 V','wib.3.3V'))
+        self.iv_sensors.append(IVSensor(self,'WIB 0.85 V','wib.0.85V'))
+        self.iv_sensors.append(IVSensor(self,'WIB 0.9 V','wib.0.9V'))
+        self.iv_sensors.append(IVSensor(self,'WIB 2.5 V','wib.2.5V'))
+        self.iv_sensors.append(IVSensor(self,'WIB 1.8 V','wib.1.8V'))
         
         layout = QtWidgets.QGridLayout(self)
         for i,t in enumerate(self.t_sensors):
@@ -207,12 +204,133 @@ class WIBPane(QtWidgets.QGroupBox):
         for i,t in enumerate(self.iv_sensors):
             layout.addWidget(t,1,i)
         
-    def load_data(self,sensors):
+    def load_data(self,values):
         for s in self.t_sensors:
-            s.load_data(sensors)
+            s.load_data(values)
         for s in self.iv_sensors:
-            s.load_data(sensors)
+            s.load_data(values)
             
+class Sparkline(QtWidgets.QWidget):
+    def __init__(self,parent,history,idx=0,tier=0):
+        super().__init__(parent)
+        self.history = history
+        self.idx = idx
+        self.tier = tier
+        self.setMinimumHeight(60)
+        self.setMinimumWidth(200)
+        self.setSizePolicy(QtWidgets.QSizePolicy.Expanding, QtWidgets.QSizePolicy.Fixed)
+        self._cache_key = None
+        self._points = None
+        self._scale = None
+        self.vmin = nan
+        self.vmax = nan
+        
+    def set_series(self,idx,tier):
+        self.idx = idx
+        self.tier = tier
+        self._cache_key = None
+        self.update()
+        
+    def _polygon(self):
+        #the closed bins are only converted to points when a bin closes or the widget size changed,
+        #the open bin (whose start stays the same until it closes) is appended on every call
+        pending = self.history.pending(self.idx,self.tier)
+        key = (self.idx,self.tier,self.history.version(self.tier),self.width(),self.height())
+        if key != self._cache_key or not self._in_scale(pending):
+            self._cache_key = key
+            self._build(pending)
+        if self._points is None or pending is None or np.isnan(pending[1]):
+            return self._points
+        t0,span_t,span_v,w,h = self._scale
+        points = QtGui.QPolygonF(self._points)
+        points.append(QtCore.QPointF(2+(pending[0]-t0)/span_t*w,2+h-(pending[1]-self.vmin)/span_v*h))
+        return points
+        
+    def _in_scale(self,pending):
+        if self._scale is None or pending is None or np.isnan(pending[1]):
+            return True
+        return pending[0] <= self._scale[0]+self._scale[1] and self.vmin <= pending[1] <= self.vmax
+        
+    def _build(self,pending):
+        self._points = None
+        self._scale = None
+        times,values = self.history.series(self.idx,self.tier,include_pending=False)
+        closed = ~np.isnan(values)
+        all_times,all_values = times[closed],values[closed]
+        if pending is not None and not np.isnan(pending[1]):
+            all_times = np.append(all_times,pending[0])
+            all_values = np.append(all_values,pending[1])
+        if len(all_values) < 2:
+            self.vmin,self.vmax = nan,nan
+            return
+        self.vmin,self.vmax = float(np.min(all_values)),float(np.max(all_values))
+        t0 = all_times[0]
+        span_t = all_times[-1]-t0 if all_times[-1] > t0 else 1.0
+        span_v = self.vmax-self.vmin if self.vmax > self.vmin else 1.0
+        w,h = self.width()-4,self.height()-4
+        self._scale = (t0,span_t,span_v,w,h)
+        xs = 2+(times[closed]-t0)/span_t*w
+        ys = 2+h-(values[closed]-self.vmin)/span_v*h
+        self._points = QtGui.QPolygonF([QtCore.QPointF(x,y) for x,y in zip(xs,ys)])
+        
+    def paintEvent(self,event):
+        painter = QtGui.QPainter(self)
+        painter.fillRect(self.rect(),QtGui.QColor(*colors[1]))
+        points = self._polygon()
+        if points is not None:
+            painter.setRenderHint(QtGui.QPainter.Antialiasing)
+            painter.setPen(QtGui.QPen(QtGui.QColor(0x26,0x8b,0xd2),1.5))
+            painter.drawPolyline(points)
+        painter.end()
+        
+class TrendPane(QtWidgets.QGroupBox):
+    def __init__(self,parent,history,defaults):
+        super().__init__('Sensor Trends',parent)
+        self.history = history
+        self.setAutoFillBackground(True)
+        p = self.palette()
+        p.setColor(self.backgroundRole(), QtGui.QColor(*colors[0]))
+        self.setPalette(p)
+        self.setStyleSheet('QGroupBox { font-weight: bold; color: #cb4b16; } ')
+        layout = QtWidgets.QGridLayout(self)
+        
+        self.rows = []
+        for row,idx in enumerate(defaults):
+            sensor_box = QtWidgets.QComboBox()
+            sensor_box.addItems(SENSOR_NAMES)
+            sensor_box.setCurrentIndex(idx)
+            sensor_box.setToolTip('GetSensors value to plot')
+            tier_box = QtWidgets.QComboBox()
+            tier_box.addItems([tier_label(t.resolution) for t in history.tiers])
+            tier_box.setToolTip('Resolution of the plotted history')
+            line = Sparkline(self,history,idx,0)
+            value = QtWidgets.QLabel('nan')
+            value.setMinimumWidth(160)
+            value.setStyleSheet('QLabel { font-weight: bold; color: #93a1a1; } ')
+            sensor_box.currentIndexChanged.connect(lambda _,r=row: self.select(r))
+            tier_box.currentIndexChanged.connect(lambda _,r=row: self.select(r))
+            layout.addWidget(sensor_box,row,0)
+            layout.addWidget(tier_box,row,1)
+            layout.addWidget(line,row,2)
+            layout.addWidget(value,row,3)
+            self.rows.append((sensor_box,tier_box,line,value))
+            
+    def select(self,row):
+        sensor_box,tier_box,line,value = self.rows[row]
+        line.set_series(sensor_box.currentIndex(),tier_box.currentIndex())
+        self.refresh_label(row)
+        
+    def refresh_label(self,row):
+        sensor_box,tier_box,line,value = self.rows[row]
+        line._polygon()
+        last = nan if self.history.last_values is None else self.history.last_values[line.idx]
+        value.setText('%0.3f [%0.3f, %0.3f]'%(last,line.vmin,line.vmax))
+        
+    def refresh(self):
+        for row,(sensor_box,tier_box,line,value) in enumerate(self.rows):
+            line.update()
+            self.refresh_label(row)
+
 class PollPane(QtWidgets.QGroupBox):
     def __init__(self,parent):
         super().__init__('Polling Information',parent)
@@ -274,10 +392,19 @@ class PollPane(QtWidgets.QGroupBox):
             self.poll_button.setToolTip("Click to disable polling for power status")
         
 class WIBMon(QtWidgets.QMainWindow):
-    def __init__(self, wib, gui_print):
+    def __init__(self, wib, gui_print, history_tiers=DEFAULT_TIERS, alarm_config=None):
         QtWidgets.QWidget.__init__(self)
         self.wib = wib
         self.gui_print = gui_print
+        self.history = SensorHistory(history_tiers)
+        self.values = None
+        self.alarms = None
+        self.tripped = False
+        if alarm_config is not None:
+            try:
+                self.alarms = AlarmEngine(DEFAULT_DECODER.columns,load_limits(alarm_config,DEFAULT_DECODER.columns))
+            except Exception as e:
+                self.gui_print('Sensor alarms disabled: %s'%e)
         self.setAutoFillBackground(True)
         p = self.palette()
         p.setColor(self.backgroundRole(), QtGui.QColor(*colors[0]))
@@ -300,6 +427,10 @@ class WIBMon(QtWidgets.QMainWindow):
         
         self.wib_pane = WIBPane(self)
         self.femb_panes = [FEMBPane(self,idx) for idx in range(4)]
+        self.sensors = self.wib_pane.t_sensors + self.wib_pane.iv_sensors
+        for f in self.femb_panes:
+            self.sensors += [f.tpower_sensor] + f.iv_sensors
+        self.sensor_by_column = {col:s for s in self.sensors for col in s.columns}
 
         monLayout.addWidget(self.wib_pane)
         fembs = QtWidgets.QWidget(self._main)
@@ -308,6 +439,10 @@ class WIBMon(QtWidgets.QMainWindow):
             fembs_layout.addWidget(f,idx//2,idx%2)
         monLayout.addWidget(fembs)
         
+        trend_defaults = [sensor_index('ltc2990_4e_voltages',0),sensor_index('femb0_dc2dc_ltc2991_voltages',0),sensor_index('ad7414_49_temp')]
+        self.trend_pane = TrendPane(self,self.history,trend_defaults)
+        monLayout.addWidget(self.trend_pane)
+        
         self.poll_pane = PollPane(self)
         monLayout.addWidget(self.poll_pane)
         
@@ -319,7 +454,26 @@ class WIBMon(QtWidgets.QMainWindow):
         req = wibpb.GetSensors()
         rep = wibpb.GetSensors.Sensors()
         if not self.wib.send_command(req,rep, self.gui_print):
-            self.wib_pane.load_data(rep)
+            flat = flatten_sensors(rep)
+            self.history.append(flat)
+            self.values = DEFAULT_DECODER.decode(flat,self.values)
+            self.wib_pane.load_data(self.values)
             for f in self.femb_panes:
-                f.load_data(rep)
+                f.load_data(self.values)
+            if self.alarms is not None:
+                self.check_alarms()
+            self.trend_pane.refresh()
+            
+    def check_alarms(self):
+        transitions = self.alarms.evaluate(self.values)
+        for t in transitions:
+            self.gui_print('ALARM: '+self.alarms.describe(t))
+            sensor = self.sensor_by_column.get(self.alarms.columns.index(t[0]))
+            if sensor is not None:
+                sensor.set_color(*alarm_colors[self.alarms.worst(sensor.columns)])
+        tripped = self.alarms.tripped()
+        if tripped and not self.tripped:
+            self.gui_print('ALARM: %s critical'%', '.join(tripped))
+            power_off_all(self.wib,self.gui_print)
+        self.tripped = len(tripped) > 0
     #        QtCore.QTimer.singleShot(1000, self.get_sensors)
@@ -20,7 +20,7 @@ DESCRIPTOR = _descriptor.FileDescriptor(
   package='wib',
   syntax='proto3',
   serialized_options=None,
-  serialized_pb=_b('\n\twib.proto\x12\x03wib\x1a\x19google/protobuf/any.proto\",\n\x07\x43ommand\x12!\n\x03\x63md\x18\x01 \x01(\x0b\x32\x14.google.protobuf.Any\"&\n\x06Script\x12\x0e\n\x06script\x18\x01 \x01(\x0c\x12\x0c\n\x04\x66ile\x18\x02 \x01(\x08\"\xe6\x02\n\nReadDaqSpy\x12\x0c\n\x04\x62uf0\x18\x01 \x01(\x08\x12\x0c\n\x04\x62uf1\x18\x02 \x01(\x08\x12\x0f\n\x07\x64\x65\x66rame\x18\x03 \x01(\x08\x12\x10\n\x08\x63hannels\x18\x04 \x01(\x08\x12\x17\n\x0ftrigger_command\x18\x05 \x01(\r\x12\x19\n\x11trigger_rec_ticks\x18\x06 \x01(\r\x12\x1a\n\x12trigger_timeout_ms\x18\x07 \x01(\r\x1a\x35\n\x06\x44\x61qSpy\x12\x0c\n\x04\x62uf0\x18\x01 \x01(\x0c\x12\x0c\n\x04\x62uf1\x18\x02 \x01(\x0c\x12\x0f\n\x07success\x18\x03 \x01(\x08\x1a\x91\x01\n\x0e\x44\x65\x66ramedDaqSpy\x12\x11\n\tcrate_num\x18\x01 \x01(\r\x12\x0f\n\x07wib_num\x18\x02 \x01(\r\x12\x13\n\x0bnum_samples\x18\x04 \x01(\r\x12\x18\n\x10\x64\x65\x66ramed_samples\x18\x05 \x01(\x0c\x12\x1b\n\x13\x64\x65\x66ramed_timestamps\x18\x06 \x01(\x0c\x12\x0f\n\x07success\x18\x07 \x01(\x08\"x\n\x0e\x43onfigurePower\x12\x10\n\x08\x64\x63\x32\x64\x63_o1\x18\x01 \x01(\x01\x12\x10\n\x08\x64\x63\x32\x64\x63_o2\x18\x02 \x01(\x01\x12\x10\n\x08\x64\x63\x32\x64\x63_o3\x18\x03 \x01(\x01\x12\x10\n\x08\x64\x63\x32\x64\x63_o4\x18\x04 \x01(\x01\x12\x0e\n\x06ldo_a0\x18\x05 \x01(\x01\x12\x0e\n\x06ldo_a1\x18\x06 \x01(\x01\"c\n\x08PowerWIB\x12\r\n\x05\x66\x65mb0\x18\x01 \x01(\x08\x12\r\n\x05\x66\x65mb1\x18\x02 \x01(\x08\x12\r\n\x05\x66\x65mb2\x18\x03 \x01(\x08\x12\r\n\x05\x66\x65mb3\x18\x04 \x01(\x08\x12\x0c\n\x04\x63old\x18\x05 \x01(\x08\x12\r\n\x05stage\x18\x06 \x01(\r\"\xe5\x04\n\x0c\x43onfigureWIB\x12.\n\x05\x66\x65mbs\x18\x01 \x03(\x0b\x32\x1f.wib.ConfigureWIB.ConfigureFEMB\x12\x0c\n\x04\x63old\x18\x02 \x01(\x08\x12\x0e\n\x06pulser\x18\x03 \x01(\x08\x12\x18\n\x10\x61\x64\x63_test_pattern\x18\x04 \x01(\x08\x12\x34\n\x08\x61\x64\x63_conf\x18\x05 \x01(\x0b\x32\".wib.ConfigureWIB.ConfigureCOLDADC\x12\x10\n\x08\x66rame_dd\x18\x06 \x01(\x08\x1a\x91\x02\n\rConfigureFEMB\x12\x0f\n\x07\x65nabled\x18\x01 \x01(\x08\x12\x10\n\x08test_cap\x18\x02 \x01(\x08\x12\x0c\n\x04gain\x18\x03 \x01(\r\x12\x11\n\tpeak_time\x18\x04 \x01(\r\x12\x10\n\x08\x62\x61seline\x18\x05 \x01(\r\x12\x11\n\tpulse_dac\x18\x06 \x01(\r\x12\x12\n\ngain_match\x18\x0e \x01(\x08\x12\x0c\n\x04leak\x18\x07 \x01(\r\x12\x10\n\x08leak_10x\x18\x08 \x01(\x08\x12\x11\n\tac_couple\x18\t \x01(\x08\x12\x0e\n\x06\x62uffer\x18\n \x01(\r\x12\x13\n\x0bstrobe_skip\x18\x0b \x01(\r\x12\x14\n\x0cstrobe_delay\x18\x0c \x01(\r\x12\x15\n\rstrobe_length\x18\r \x01(\r\x1a\x90\x01\n\x10\x43onfigureCOLDADC\x12\r\n\x05reg_0\x18\x01 \x01(\r\x12\r\n\x05reg_4\x18\x02 \x01(\r\x12\x0e\n\x06reg_24\x18\x03 \x01(\r\x12\x0e\n\x06reg_25\x18\x04 \x01(\r\x12\x0e\n\x06reg_26\x18\x05 \x01(\r\x12\x0e\n\x06reg_27\x18\x06 \x01(\r\x12\x0e\n\x06reg_29\x18\x07 \x01(\r\x12\x0e\n\x06reg_30\x18\x08 \x01(\r\"\x0b\n\tCalibrate\"4\n\x06Update\x12\x14\n\x0croot_archive\x18\x01 \x01(\x0c\x12\x14\n\x0c\x62oot_archive\x18\x02 \x01(\x0c\"\x08\n\x06Reboot\"\x14\n\x04Peek\x12\x0c\n\x04\x61\x64\x64r\x18\x01 \x01(\x04\"#\n\x04Poke\x12\x0c\n\x04\x61\x64\x64r\x18\x01 \x01(\x04\x12\r\n\x05value\x18\x02 \x01(\r\"t\n\x06\x43\x44Poke\x12\x10\n\x08\x66\x65mb_idx\x18\x01 \x01(\r\x12\x13\n\x0b\x63oldata_idx\x18\x02 \x01(\r\x12\x11\n\tchip_addr\x18\x03 \x01(\r\x12\x10\n\x08reg_page\x18\x04 \x01(\r\x12\x10\n\x08reg_addr\x18\x05 \x01(\r\x12\x0c\n\x04\x64\x61ta\x18\x06 \x01(\r\"f\n\x06\x43\x44Peek\x12\x10\n\x08\x66\x65mb_idx\x18\x01 \x01(\r\x12\x13\n\x0b\x63oldata_idx\x18\x02 \x01(\r\x12\x11\n\tchip_addr\x18\x03 \x01(\r\x12\x10\n\x08reg_page\x18\x04 \x01(\r\x12\x10\n\x08reg_addr\x18\x05 \x01(\r\"\x18\n\tCDFastCmd\x12\x0b\n\x03\x63md\x18\x01 \x01(\r\"\xd9\x03\n\nGetSensors\x1a\xca\x03\n\x07Sensors\x12\x1b\n\x13ltc2990_4e_voltages\x18\x01 \x03(\x01\x12\x1b\n\x13ltc2990_4c_voltages\x18\x02 \x03(\x01\x12\x1b\n\x13ltc2991_48_voltages\x18\x03 \x03(\x01\x12\x16\n\x0e\x61\x64\x37\x34\x31\x34_49_temp\x18\x04 \x01(\x01\x12\x16\n\x0e\x61\x64\x37\x34\x31\x34_4d_temp\x18\x05 \x01(\x01\x12\x16\n\x0e\x61\x64\x37\x34\x31\x34_4a_temp\x18\x06 \x01(\x01\x12\x18\n\x10ltc2499_15_temps\x18\x07 \x03(\x01\x12$\n\x1c\x66\x65mb0_dc2dc_ltc2991_voltages\x18\x08 \x03(\x01\x12$\n\x1c\x66\x65mb1_dc2dc_ltc2991_voltages\x18\t \x03(\x01\x12$\n\x1c\x66\x65mb2_dc2dc_ltc2991_voltages\x18\n \x03(\x01\x12$\n\x1c\x66\x65mb3_dc2dc_ltc2991_voltages\x18\x0b \x03(\x01\x12$\n\x1c\x66\x65mb_ldo_a0_ltc2991_voltages\x18\x0c \x03(\x01\x12$\n\x1c\x66\x65mb_ldo_a1_ltc2991_voltages\x18\r \x03(\x01\x12\"\n\x1a\x66\x65mb_bias_ltc2991_voltages\x18\x0e \x03(\x01\"\x80\x01\n\x0cGetTimestamp\x1ap\n\tTimestamp\x12\x11\n\ttimestamp\x18\x01 \x01(\r\x12\x0b\n\x03\x64\x61y\x18\x02 \x01(\r\x12\r\n\x05month\x18\x03 \x01(\r\x12\x0c\n\x04year\x18\x04 \x01(\r\x12\x0c\n\x04hour\x18\x05 \x01(\r\x12\x0b\n\x03min\x18\x06 \x01(\r\x12\x0b\n\x03sec\x18\x07 \x01(\r\"*\n\x0cGetSWVersion\x1a\x1a\n\x07Version\x12\x0f\n\x07version\x18\x01 \x01(\t\"\r\n\x0bResetTiming\"\x81\x01\n\x0fGetTimingStatus\x1an\n\x0cTimingStatus\x12\x0f\n\x07lol_val\x18\x01 \x01(\r\x12\x13\n\x0blol_flg_val\x18\x02 \x01(\r\x12\x0f\n\x07los_val\x18\x03 \x01(\r\x12\x13\n\x0blos_flg_val\x18\x04 \x01(\r\x12\x12\n\nept_status\x18\x05 \x01(\r\"\x1b\n\x0bSetFakeTime\x12\x0c\n\x04time\x18\x01 \x01(\x04\"\x0f\n\rStartFakeTime\"^\n\nLogControl\x12\x11\n\tclear_log\x18\x01 \x01(\x08\x12\x12\n\nreturn_log\x18\x02 \x01(\x08\x12\x10\n\x08\x62oot_log\x18\x03 \x01(\x08\x1a\x17\n\x03Log\x12\x10\n\x08\x63ontents\x18\x01 \x01(\x0c\"\x07\n\x05\x45mpty\"(\n\x06Status\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\r\n\x05\x65xtra\x18\x02 \x01(\x0c\"\'\n\x08RegValue\x12\x0c\n\x04\x61\x64\x64r\x18\x01 \x01(\x04\x12\r\n\x05value\x18\x02 \x01(\r\"x\n\nCDRegValue\x12\x10\n\x08\x66\x65mb_idx\x18\x01 \x01(\r\x12\x13\n\x0b\x63oldata_idx\x18\x02 \x01(\r\x12\x11\n\tchip_addr\x18\x03 \x01(\r\x12\x10\n\x08reg_page\x18\x04 \x01(\r\x12\x10\n\x08reg_addr\x18\x05 \x01(\r\x12\x0c\n\x04\x64\x61ta\x18\x06 \x01(\rb\x06proto3')
+  serialized_pb=_b('\n\twib.proto\x12\x03wib\x1a\x19google/protobuf/any.proto\",\n\x07\x43ommand\x12!\n\x03\x63md\x18\x01 \x01(\x0b\x32\x14.google.protobuf.Any\"&\n\x06Script\x12\x0e\n\x06script\x18\x01 \x01(\x0c\x12\x0c\n\x04\x66ile\x18\x02 \x01(\x08\"\xe6\x02\n\nReadDaqSpy\x12\x0c\n\x04\x62uf0\x18\x01 \x01(\x08\x12\x0c\n\x04\x62uf1\x18\x02 \x01(\x08\x12\x0f\n\x07\x64\x65\x66rame\x18\x03 \x01(\x08\x12\x10\n\x08\x63hannels\x18\x04 \x01(\x08\x12\x17\n\x0ftrigger_command\x18\x05 \x01(\r\x12\x19\n\x11trigger_rec_ticks\x18\x06 \x01(\r\x12\x1a\n\x12trigger_timeout_ms\x18\x07 \x01(\r\x1a\x35\n\x06\x44\x61qSpy\x12\x0c\n\x04\x62uf0\x18\x01 \x01(\x0c\x12\x0c\n\x04\x62uf1\x18\x02 \x01(\x0c\x12\x0f\n\x07success\x18\x03 \x01(\x08\x1a\x91\x01\n\x0e\x44\x65\x66ramedDaqSpy\x12\x11\n\tcrate_num\x18\x01 \x01(\r\x12\x0f\n\x07wib_num\x18\x02 \x01(\r\x12\x13\n\x0bnum_samples\x18\x04 \x01(\r\x12\x18\n\x10\x64\x65\x66ramed_samples\x18\x05 \x01(\x0c\x12\x1b\n\x13\x64\x65\x66ramed_timestamps\x18\x06 \x01(\x0c\x12\x0f\n\x07success\x18\x07 \x01(\x08\"x\n\x0e\x43onfigurePower\x12\x10\n\x08\x64\x63\x32\x64\x63_o1\x18\x01 \x01(\x01\x12\x10\n\x08\x64\x63\x32\x64\x63_o2\x18\x02 \x01(\x01\x12\x10\n\x08\x64\x63\x32\x64\x63_o3\x18\x03 \x01(\x01\x12\x10\n\x08\x64\x63\x32\x64\x63_o4\x18\x04 \x01(\x01\x12\x0e\n\x06ldo_a0\x18\x05 \x01(\x01\x12\x0e\n\x06ldo_a1\x18\x06 \x01(\x01\"c\n\x08PowerWIB\x12\r\n\x05\x66\x65mb0\x18\x01 \x01(\x08\x12\r\n\x05\x66\x65mb1\x18\x02 \x01(\x08\x12\r\n\x05\x66\x65mb2\x18\x03 \x01(\x08\x12\r\n\x05\x66\x65mb3\x18\x04 \x01(\x08\x12\x0c\n\x04\x63old\x18\x05 \x01(\x08\x12\r\n\x05stage\x18\x06 \x01(\r\"\xe5\x04\n\x0c\x43onfigureWIB\x12.\n\x05\x66\x65mbs\x18\x01 \x03(\x0b\x32\x1f.wib.ConfigureWIB.ConfigureFEMB\x12\x0c\n\x04\x63old\x18\x02 \x01(\x08\x12\x0e\n\x06pulser\x18\x03 \x01(\x08\x12\x18\n\x10\x61\x64\x63_test_pattern\x18\x04 \x01(\x08\x12\x34\n\x08\x61\x64\x63_conf\x18\x05 \x01(\x0b\x32\".wib.ConfigureWIB.ConfigureCOLDADC\x12\x10\n\x08\x66rame_dd\x18\x06 \x01(\x08\x1a\x91\x02\n\rConfigureFEMB\x12\x0f\n\x07\x65nabled\x18\x01 \x01(\x08\x12\x10\n\x08test_cap\x18\x02 \x01(\x08\x12\x0c\n\x04gain\x18\x03 \x01(\r\x12\x11\n\tpeak_time\x18\x04 \x01(\r\x12\x10\n\x08\x62\x61seline\x18\x05 \x01(\r\x12\x11\n\tpulse_dac\x18\x06 \x01(\r\x12\x12\n\ngain_match\x18\x0e \x01(\x08\x12\x0c\n\x04leak\x18\x07 \x01(\r\x12\x10\n\x08leak_10x\x18\x08 \x01(\x08\x12\x11\n\tac_couple\x18\t \x01(\x08\x12\x0e\n\x06\x62uffer\x18\n \x01(\r\x12\x13\n\x0bstrobe_skip\x18\x0b \x01(\r\x12\x14\n\x0cstrobe_delay\x18\x0c \x01(\r\x12\x15\n\rstrobe_length\x18\r \x01(\r\x1a\x90\x01\n\x10\x43onfigureCOLDADC\x12\r\n\x05reg_0\x18\x01 \x01(\r\x12\r\n\x05reg_4\x18\x02 \x01(\r\x12\x0e\n\x06reg_24\x18\x03 \x01(\r\x12\x0e\n\x06reg_25\x18\x04 \x01(\r\x12\x0e\n\x06reg_26\x18\x05 \x01(\r\x12\x0e\n\x06reg_27\x18\x06 \x01(\r\x12\x0e\n\x06reg_29\x18\x07 \x01(\r\x12\x0e\n\x06reg_30\x18\x08 \x01(\r\"\x0b\n\tCalibrate\"4\n\x06Update\x12\x14\n\x0croot_archive\x18\x01 \x01(\x0c\x12\x14\n\x0c\x62oot_archive\x18\x02 \x01(\x0c\"p\n\x0bUpdateBegin\x12\x11\n\tupload_id\x18\x01 \x01(\t\x12\x11\n\troot_size\x18\x02 \x01(\x04\x12\x11\n\tboot_size\x18\x03 \x01(\x04\x12\x13\n\x0broot_sha256\x18\x04 \x01(\x0c\x12\x13\n\x0b\x62oot_sha256\x18\x05 \x01(\x0c\"^\n\x0bUpdateChunk\x12\x11\n\tupload_id\x18\x01 \x01(\t\x12\x0f\n\x07\x61rchive\x18\x02 \x01(\r\x12\x0e\n\x06offset\x18\x03 \x01(\x04\x12\x0c\n\x04\x64\x61ta\x18\x04 \x01(\x0c\x12\r\n\x05\x63rc32\x18\x05 \x01(\r\"!\n\x0cUpdateCommit\x12\x11\n\tupload_id\x18\x01 \x01(\t\"\\\n\x0cUpdateStatus\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x15\n\rroot_received\x18\x02 \x01(\x04\x12\x15\n\rboot_received\x18\x03 \x01(\x04\x12\r\n\x05\x65xtra\x18\x04 \x01(\x0c\"\x08\n\x06Reboot\"\x14\n\x04Peek\x12\x0c\n\x04\x61\x64\x64r\x18\x01 \x01(\x04\"#\n\x04Poke\x12\x0c\n\x04\x61\x64\x64r\x18\x01 \x01(\x04\x12\r\n\x05value\x18\x02 \x01(\r\"t\n\x06\x43\x44Poke\x12\x10\n\x08\x66\x65mb_idx\x18\x01 \x01(\r\x12\x13\n\x0b\x63oldata_idx\x18\x02 \x01(\r\x12\x11\n\tchip_addr\x18\x03 \x01(\r\x12\x10\n\x08reg_page\x18\x04 \x01(\r\x12\x10\n\x08reg_addr\x18\x05 \x01(\r\x12\x0c\n\x04\x64\x61ta\x18\x06 \x01(\r\"f\n\x06\x43\x44Peek\x12\x10\n\x08\x66\x65mb_idx\x18\x01 \x01(\r\x12\x13\n\x0b\x63oldata_idx\x18\x02 \x01(\r\x12\x11\n\tchip_addr\x18\x03 \x01(\r\x12\x10\n\x08reg_page\x18\x04 \x01(\r\x12\x10\n\x08reg_addr\x18\x05 \x01(\r\"\x18\n\tCDFastCmd\x12\x0b\n\x03\x63md\x18\x01 \x01(\r\"\xd9\x03\n\nGetSensors\x1a\xca\x03\n\x07Sensors\x12\x1b\n\x13ltc2990_4e_voltages\x18\x01 \x03(\x01\x12\x1b\n\x13ltc2990_4c_voltages\x18\x02 \x03(\x01\x12\x1b\n\x13ltc2991_48_voltages\x18\x03 \x03(\x01\x12\x16\n\x0e\x61\x64\x37\x34\x31\x34_49_temp\x18\x04 \x01(\x01\x12\x16\n\x0e\x61\x64\x37\x34\x31\x34_4d_temp\x18\x05 \x01(\x01\x12\x16\n\x0e\x61\x64\x37\x34\x31\x34_4a_temp\x18\x06 \x01(\x01\x12\x18\n\x10ltc2499_15_temps\x18\x07 \x03(\x01\x12$\n\x1c\x66\x65mb0_dc2dc_ltc2991_voltages\x18\x08 \x03(\x01\x12$\n\x1c\x66\x65mb1_dc2dc_ltc2991_voltages\x18\t \x03(\x01\x12$\n\x1c\x66\x65mb2_dc2dc_ltc2991_voltages\x18\n \x03(\x01\x12$\n\x1c\x66\x65mb3_dc2dc_ltc2991_voltages\x18\x0b \x03(\x01\x12$\n\x1c\x66\x65mb_ldo_a0_ltc2991_voltages\x18\x0c \x03(\x01\x12$\n\x1c\x66\x65mb_ldo_a1_ltc2991_voltages\x18\r \x03(\x01\x12\"\n\x1a\x66\x65mb_bias_ltc2991_voltages\x18\x0e \x03(\x01\"\x80\x01\n\x0cGetTimestamp\x1ap\n\tTimestamp\x12\x11\n\ttimestamp\x18\x01 \x01(\r\x12\x0b\n\x03\x64\x61y\x18\x02 \x01(\r\x12\r\n\x05month\x18\x03 \x01(\r\x12\x0c\n\x04year\x18\x04 \x01(\r\x12\x0c\n\x04hour\x18\x05 \x01(\r\x12\x0b\n\x03min\x18\x06 \x01(\r\x12\x0b\n\x03sec\x18\x07 \x01(\r\"*\n\x0cGetSWVersion\x1a\x1a\n\x07Version\x12\x0f\n\x07version\x18\x01 \x01(\t\"\r\n\x0bResetTiming\"\x81\x01\n\x0fGetTimingStatus\x1an\n\x0cTimingStatus\x12\x0f\n\x07lol_val\x18\x01 \x01(\r\x12\x13\n\x0blol_flg_val\x18\x02 \x01(\r\x12\x0f\n\x07los_val\x18\x03 \x01(\r\x12\x13\n\x0blos_flg_val\x18\x04 \x01(\r\x12\x12\n\nept_status\x18\x05 \x01(\r\"\x1b\n\x0bSetFakeTime\x12\x0c\n\x04time\x18\x01 \x01(\x04\"\x0f\n\rStartFakeTime\"^\n\nLogControl\x12\x11\n\tclear_log\x18\x01 \x01(\x08\x12\x12\n\nreturn_log\x18\x02 \x01(\x08\x12\x10\n\x08\x62oot_log\x18\x03 \x01(\x08\x1a\x17\n\x03Log\x12\x10\n\x08\x63ontents\x18\x01 \x01(\x0c\"\x07\n\x05\x45mpty\"(\n\x06Status\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\r\n\x05\x65xtra\x18\x02 \x01(\x0c\"\'\n\x08RegValue\x12\x0c\n\x04\x61\x64\x64r\x18\x01 \x01(\x04\x12\r\n\x05value\x18\x02 \x01(\r\"x\n\nCDRegValue\x12\x10\n\x08\x66\x65mb_idx\x18\x01 \x01(\r\x12\x13\n\x0b\x63oldata_idx\x18\x02 \x01(\r\x12\x11\n\tchip_addr\x18\x03 \x01(\r\x12\x10\n\x08reg_page\x18\x04 \x01(\r\x12\x10\n\x08reg_addr\x18\x05 \x01(\r\x12\x0c\n\x04\x64\x61ta\x18\x06 \x01(\rb\x06proto3')
   ,
   dependencies=[google_dot_protobuf_dot_any__pb2.DESCRIPTOR,])
 
@@ -738,6 +738,207 @@ _UPDATE = _descriptor.Descriptor(
 )
 
 
+_UPDATEBEGIN = _descriptor.Descriptor(
+  name='UpdateBegin',
+  full_name='wib.UpdateBegin',
+  filename=None,
+  file=DESCRIPTOR,
+  containing_type=None,
+  fields=[
+    _descriptor.FieldDescriptor(
+      name='upload_id', full_name='wib.UpdateBegin.upload_id', index=0,
+      number=1, type=9, cpp_type=9, label=1,
+      has_default_value=False, default_value=_b("").decode('utf-8'),
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR),
+    _descriptor.FieldDescriptor(
+      name='root_size', full_name='wib.UpdateBegin.root_size', index=1,
+      number=2, type=4, cpp_type=4, label=1,
+      has_default_value=False, default_value=0,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR),
+    _descriptor.FieldDescriptor(
+      name='boot_size', full_name='wib.UpdateBegin.boot_size', index=2,
+      number=3, type=4, cpp_type=4, label=1,
+      has_default_value=False, default_value=0,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR),
+    _descriptor.FieldDescriptor(
+      name='root_sha256', full_name='wib.UpdateBegin.root_sha256', index=3,
+      number=4, type=12, cpp_type=9, label=1,
+      has_default_value=False, default_value=_b(""),
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR),
+    _descriptor.FieldDescriptor(
+      name='boot_sha256', full_name='wib.UpdateBegin.boot_sha256', index=4,
+      number=5, type=12, cpp_type=9, label=1,
+      has_default_value=False, default_value=_b(""),
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR),
+  ],
+  extensions=[
+  ],
+  nested_types=[],
+  enum_types=[
+  ],
+  serialized_options=None,
+  is_extendable=False,
+  syntax='proto3',
+  extension_ranges=[],
+  oneofs=[
+  ],
+  serialized_start=1398,
+  serialized_end=1510,
+)
+
+
+_UPDATECHUNK = _descriptor.Descriptor(
+  name='UpdateChunk',
+  full_name='wib.UpdateChunk',
+  filename=None,
+  file=DESCRIPTOR,
+  containing_type=None,
+  fields=[
+    _descriptor.FieldDescriptor(
+      name='upload_id', full_name='wib.UpdateChunk.upload_id', index=0,
+      number=1, type=9, cpp_type=9, label=1,
+      has_default_value=False, default_value=_b("").decode('utf-8'),
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR),
+    _descriptor.FieldDescriptor(
+      name='archive', full_name='wib.UpdateChunk.archive', index=1,
+      number=2, type=13, cpp_type=3, label=1,
+      has_default_value=False, default_value=0,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR),
+    _descriptor.FieldDescriptor(
+      name='offset', full_name='wib.UpdateChunk.offset', index=2,
+      number=3, type=4, cpp_type=4, label=1,
+      has_default_value=False, default_value=0,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR),
+    _descriptor.FieldDescriptor(
+      name='data', full_name='wib.UpdateChunk.data', index=3,
+      number=4, type=12, cpp_type=9, label=1,
+      has_default_value=False, default_value=_b(""),
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR),
+    _descriptor.FieldDescriptor(
+      name='crc32', full_name='wib.UpdateChunk.crc32', index=4,
+      number=5, type=13, cpp_type=3, label=1,
+      has_default_value=False, default_value=0,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR),
+  ],
+  extensions=[
+  ],
+  nested_types=[],
+  enum_types=[
+  ],
+  serialized_options=None,
+  is_extendable=False,
+  syntax='proto3',
+  extension_ranges=[],
+  oneofs=[
+  ],
+  serialized_start=1512,
+  serialized_end=1606,
+)
+
+
+_UPDATECOMMIT = _descriptor.Descriptor(
+  name='UpdateCommit',
+  full_name='wib.UpdateCommit',
+  filename=None,
+  file=DESCRIPTOR,
+  containing_type=None,
+  fields=[
+    _descriptor.FieldDescriptor(
+      name='upload_id', full_name='wib.UpdateCommit.upload_id', index=0,
+      number=1, type=9, cpp_type=9, label=1,
+      has_default_value=False, default_value=_b("").decode('utf-8'),
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR),
+  ],
+  extensions=[
+  ],
+  nested_types=[],
+  enum_types=[
+  ],
+  serialized_options=None,
+  is_extendable=False,
+  syntax='proto3',
+  extension_ranges=[],
+  oneofs=[
+  ],
+  serialized_start=1608,
+  serialized_end=1641,
+)
+
+
+_UPDATESTATUS = _descriptor.Descriptor(
+  name='UpdateStatus',
+  full_name='wib.UpdateStatus',
+  filename=None,
+  file=DESCRIPTOR,
+  containing_type=None,
+  fields=[
+    _descriptor.FieldDescriptor(
+      name='success', full_name='wib.UpdateStatus.success', index=0,
+      number=1, type=8, cpp_type=7, label=1,
+      has_default_value=False, default_value=False,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR),
+    _descriptor.FieldDescriptor(
+      name='root_received', full_name='wib.UpdateStatus.root_received', index=1,
+      number=2, type=4, cpp_type=4, label=1,
+      has_default_value=False, default_value=0,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR),
+    _descriptor.FieldDescriptor(
+      name='boot_received', full_name='wib.UpdateStatus.boot_received', index=2,
+      number=3, type=4, cpp_type=4, label=1,
+      has_default_value=False, default_value=0,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR),
+    _descriptor.FieldDescriptor(
+      name='extra', full_name='wib.UpdateStatus.extra', index=3,
+      number=4, type=12, cpp_type=9, label=1,
+      has_default_value=False, default_value=_b(""),
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR),
+  ],
+  extensions=[
+  ],
+  nested_types=[],
+  enum_types=[
+  ],
+  serialized_options=None,
+  is_extendable=False,
+  syntax='proto3',
+  extension_ranges=[],
+  oneofs=[
+  ],
+  serialized_start=1643,
+  serialized_end=1735,
+)
+
+
 _REBOOT = _descriptor.Descriptor(
   name='Reboot',
   full_name='wib.Reboot',
@@ -757,8 +958,8 @@ _REBOOT = _descriptor.Descriptor(
   extension_ranges=[],
   oneofs=[
   ],
-  serialized_start=1398,
-  serialized_end=1406,
+  serialized_start=1737,
+  serialized_end=1745,
 )
 
 
@@ -788,8 +989,8 @@ _PEEK = _descriptor.Descriptor(
   extension_ranges=[],
   oneofs=[
   ],
-  serialized_start=1408,
-  serialized_end=1428,
+  serialized_start=1747,
+  serialized_end=1767,
 )
 
 
@@ -826,8 +1027,8 @@ _POKE = _descriptor.Descriptor(
   extension_ranges=[],
   oneofs=[
   ],
-  serialized_start=1430,
-  serialized_end=1465,
+  serialized_start=1769,
+  serialized_end=1804,
 )
 
 
@@ -892,8 +1093,8 @@ _CDPOKE = _descriptor.Descriptor(
   extension_ranges=[],
   oneofs=[
   ],
-  serialized_start=1467,
-  serialized_end=1583,
+  serialized_start=1806,
+  serialized_end=1922,
 )
 
 
@@ -951,8 +1152,8 @@ _CDPEEK = _descriptor.Descriptor(
   extension_ranges=[],
   oneofs=[
   ],
-  serialized_start=1585,
-  serialized_end=1687,
+  serialized_start=1924,
+  serialized_end=2026,
 )
 
 
@@ -982,8 +1183,8 @@ _CDFASTCMD = _descriptor.Descriptor(
   extension_ranges=[],
   oneofs=[
   ],
-  serialized_start=1689,
-  serialized_end=1713,
+  serialized_start=2028,
+  serialized_end=2052,
 )
 
 
@@ -1104,8 +1305,8 @@ _GETSENSORS_SENSORS = _descriptor.Descriptor(
   extension_ranges=[],
   oneofs=[
   ],
-  serialized_start=1731,
-  serialized_end=2189,
+  serialized_start=2070,
+  serialized_end=2528,
 )
 
 _GETSENSORS = _descriptor.Descriptor(
@@ -1127,8 +1328,8 @@ _GETSENSORS = _descriptor.Descriptor(
   extension_ranges=[],
   oneofs=[
   ],
-  serialized_start=1716,
-  serialized_end=2189,
+  serialized_start=2055,
+  serialized_end=2528,
 )
 
 
@@ -1200,8 +1401,8 @@ _GETTIMESTAMP_TIMESTAMP = _descriptor.Descriptor(
   extension_ranges=[],
   oneofs=[
   ],
-  serialized_start=2208,
-  serialized_end=2320,
+  serialized_start=2547,
+  serialized_end=2659,
 )
 
 _GETTIMESTAMP = _descriptor.Descriptor(
@@ -1223,8 +1424,8 @@ _GETTIMESTAMP = _descriptor.Descriptor(
   extension_ranges=[],
   oneofs=[
   ],
-  serialized_start=2192,
-  serialized_end=2320,
+  serialized_start=2531,
+  serialized_end=2659,
 )
 
 
@@ -1254,8 +1455,8 @@ _GETSWVERSION_VERSION = _descriptor.Descriptor(
   extension_ranges=[],
   oneofs=[
   ],
-  serialized_start=2338,
-  serialized_end=2364,
+  serialized_start=2677,
+  serialized_end=2703,
 )
 
 _GETSWVERSION = _descriptor.Descriptor(
@@ -1277,8 +1478,8 @@ _GETSWVERSION = _descriptor.Descriptor(
   extension_ranges=[],
   oneofs=[
   ],
-  serialized_start=2322,
-  serialized_end=2364,
+  serialized_start=2661,
+  serialized_end=2703,
 )
 
 
@@ -1301,8 +1502,8 @@ _RESETTIMING = _descriptor.Descriptor(
   extension_ranges=[],
   oneofs=[
   ],
-  serialized_start=2366,
-  serialized_end=2379,
+  serialized_start=2705,
+  serialized_end=2718,
 )
 
 
@@ -1360,8 +1561,8 @@ _GETTIMINGSTATUS_TIMINGSTATUS = _descriptor.Descriptor(
   extension_ranges=[],
   oneofs=[
   ],
-  serialized_start=2401,
-  serialized_end=2511,
+  serialized_start=2740,
+  serialized_end=2850,
 )
 
 _GETTIMINGSTATUS = _descriptor.Descriptor(
@@ -1383,8 +1584,8 @@ _GETTIMINGSTATUS = _descriptor.Descriptor(
   extension_ranges=[],
   oneofs=[
   ],
-  serialized_start=2382,
-  serialized_end=2511,
+  serialized_start=2721,
+  serialized_end=2850,
 )
 
 
@@ -1414,8 +1615,8 @@ _SETFAKETIME = _descriptor.Descriptor(
   extension_ranges=[],
   oneofs=[
   ],
-  serialized_start=2513,
-  serialized_end=2540,
+  serialized_start=2852,
+  serialized_end=2879,
 )
 
 
@@ -1438,8 +1639,8 @@ _STARTFAKETIME = _descriptor.Descriptor(
   extension_ranges=[],
   oneofs=[
   ],
-  serialized_start=2542,
-  serialized_end=2557,
+  serialized_start=2881,
+  serialized_end=2896,
 )
 
 
@@ -1469,8 +1670,8 @@ _LOGCONTROL_LOG = _descriptor.Descriptor(
   extension_ranges=[],
   oneofs=[
   ],
-  serialized_start=2630,
-  serialized_end=2653,
+  serialized_start=2969,
+  serialized_end=2992,
 )
 
 _LOGCONTROL = _descriptor.Descriptor(
@@ -1513,8 +1714,8 @@ _LOGCONTROL = _descriptor.Descriptor(
   extension_ranges=[],
   oneofs=[
   ],
-  serialized_start=2559,
-  serialized_end=2653,
+  serialized_start=2898,
+  serialized_end=2992,
 )
 
 
@@ -1537,8 +1738,8 @@ _EMPTY = _descriptor.Descriptor(
   extension_ranges=[],
   oneofs=[
   ],
-  serialized_start=2655,
-  serialized_end=2662,
+  serialized_start=2994,
+  serialized_end=3001,
 )
 
 
@@ -1575,8 +1776,8 @@ _STATUS = _descriptor.Descriptor(
   extension_ranges=[],
   oneofs=[
   ],
-  serialized_start=2664,
-  serialized_end=2704,
+  serialized_start=3003,
+  serialized_end=3043,
 )
 
 
@@ -1613,8 +1814,8 @@ _REGVALUE = _descriptor.Descriptor(
   extension_ranges=[],
   oneofs=[
   ],
-  serialized_start=2706,
-  serialized_end=2745,
+  serialized_start=3045,
+  serialized_end=3084,
 )
 
 
@@ -1679,8 +1880,8 @@ _CDREGVALUE = _descriptor.Descriptor(
   extension_ranges=[],
   oneofs=[
   ],
-  serialized_start=2747,
-  serialized_end=2867,
+  serialized_start=3086,
+  serialized_end=3206,
 )
 
 _COMMAND.fields_by_name['cmd'].message_type = google_dot_protobuf_dot_any__pb2._ANY
@@ -1703,6 +1904,10 @@ DESCRIPTOR.message_types_by_name['PowerWIB'] = _POWERWIB
 DESCRIPTOR.message_types_by_name['ConfigureWIB'] = _CONFIGUREWIB
 DESCRIPTOR.message_types_by_name['Calibrate'] = _CALIBRATE
 DESCRIPTOR.message_types_by_name['Update'] = _UPDATE
+DESCRIPTOR.message_types_by_name['UpdateBegin'] = _UPDATEBEGIN
+DESCRIPTOR.message_types_by_name['UpdateChunk'] = _UPDATECHUNK
+DESCRIPTOR.message_types_by_name['UpdateCommit'] = _UPDATECOMMIT
+DESCRIPTOR.message_types_by_name['UpdateStatus'] = _UPDATESTATUS
 DESCRIPTOR.message_types_by_name['Reboot'] = _REBOOT
 DESCRIPTOR.message_types_by_name['Peek'] = _PEEK
 DESCRIPTOR.message_types_by_name['Poke'] = _POKE
@@ -1811,6 +2016,34 @@ Update = _reflection.GeneratedProtocolMessageType('Update', (_message.Message,),
   ))
 _sym_db.RegisterMessage(Update)
 
+UpdateBegin = _reflection.GeneratedProtocolMessageType('UpdateBegin', (_message.Message,), dict(
+  DESCRIPTOR = _UPDATEBEGIN,
+  __module__ = 'wib_pb2'
+  # @@protoc_insertion_point(class_scope:wib.UpdateBegin)
+  ))
+_sym_db.RegisterMessage(UpdateBegin)
+
+UpdateChunk = _reflection.GeneratedProtocolMessageType('UpdateChunk', (_message.Message,), dict(
+  DESCRIPTOR = _UPDATECHUNK,
+  __module__ = 'wib_pb2'
+  # @@protoc_insertion_point(class_scope:wib.UpdateChunk)
+  ))
+_sym_db.RegisterMessage(UpdateChunk)
+
+UpdateCommit = _reflection.GeneratedProtocolMessageType('UpdateCommit', (_message.Message,), dict(
+  DESCRIPTOR = _UPDATECOMMIT,
+  __module__ = 'wib_pb2'
+  # @@protoc_insertion_point(class_scope:wib.UpdateCommit)
+  ))
+_sym_db.RegisterMessage(UpdateCommit)
+
+UpdateStatus = _reflection.GeneratedProtocolMessageType('UpdateStatus', (_message.Message,), dict(
+  DESCRIPTOR = _UPDATESTATUS,
+  __module__ = 'wib_pb2'
+  # @@protoc_insertion_point(class_scope:wib.UpdateStatus)
+  ))
+_sym_db.RegisterMessage(UpdateStatus)
+
 Reboot = _reflection.GeneratedProtocolMessageType('Reboot', (_message.Message,), dict(
   DESCRIPTOR = _REBOOT,
   __module__ = 'wib_pb2'
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+
+import os
+import json
+import argparse
+import numpy as np
+
+from wib_frames import FEMB_A_OFFSET, FEMB_B_OFFSET, SEG_WORDS, TS_LO_OFFSET, TS_HI_OFFSET, frame_view, unpack14
+
+# High speed UDP packets of the checkout WIB, big endian 16 bit words: a 32 bit
+# packet counter, 6 header words, then 13 word frames each starting with a
+# 0xface (or 0xfeed on a calibration pulse) marker and 16 12 bit samples.
+HS_HEADER_WORDS = 8
+HS_FRAME_WORDS = 13
+HS_PKG_WORDS = 0x406//2
+HS_JUMBO_PKG_WORDS = 0x1E06//2
+HS_FACE = 0xface
+HS_FEED = 0xfeed
+
+def channel14(frames,offset,ch):
+    '''Samples of one channel from (num,FRAME14_WORDS) frames, reading only the 1 or 2 words it is packed in'''
+    bit = ch*14
+    word = offset+bit//32
+    shift = bit % 32
+    value = frames[:,word].astype(np.uint64) >> np.uint64(shift)
+    if shift > 32-14:
+        value |= frames[:,word+1].astype(np.uint64) << np.uint64(32-shift)
+    return (value & np.uint64(0x3fff)).astype(np.uint16)
+
+class SpyBuffer:
+    '''Lazy view of the Frame-14 frames of one spy buffer, backed by a memmap'''
+
+    def __init__(self,words):
+        self.frames = frame_view(words)
+
+    def __len__(self):
+        return len(self.frames)
+
+    def timestamps(self,start=0,stop=None):
+        frames = self.frames[start:stop]
+        return frames[:,TS_LO_OFFSET].astype(np.uint64) | (frames[:,TS_HI_OFFSET].astype(np.uint64) << np.uint64(32))
+
+    def samples(self,half,start=0,stop=None):
+        '''(128,n) samples of FEMB half (0 = femb_a, 1 = femb_b) of frames start:stop'''
+        offset = FEMB_A_OFFSET if half == 0 else FEMB_B_OFFSET
+        return unpack14(self.frames[start:stop,offset:offset+SEG_WORDS]).T
+
+    def channel(self,half,ch,start=0,stop=None):
+        return channel14(self.frames[start:stop],FEMB_A_OFFSET if half == 0 else FEMB_B_OFFSET,ch)
+
+class ChannelView:
+    '''One channel of a SpyFile, decoded when sliced'''
+
+    def __init__(self,spy,femb,ch):
+        self.spy = spy
+        self.femb = femb
+        self.ch = ch
+
+    def __len__(self):
+        return self.spy.num_samples
+
+    def __getitem__(self,key):
+        if isinstance(key,slice):
+            start,stop,step = key.indices(len(self))
+            return self.spy.channel(self.femb,self.ch,start,stop)[::step]
+        return self.spy.channel(self.femb,self.ch,key,key+1 if key != -1 else None)[0]
+
+    def __array__(self,dtype=None):
+        data = self[:]
+        return data if dtype is None else data.astype(dtype)
+
+class FEMBView:
+    '''The 128 channels of one FEMB of a SpyFile, decoded when sliced or iterated'''
+
+    def __init__(self,spy,femb):
+        self.spy = spy
+        self.femb = femb
+
+    def __len__(self):
+        return 128
+
+    def __getitem__(self,ch):
+        return ChannelView(self.spy,self.femb,ch)
+
+    def samples(self,start=0,stop=None):
+        return self.spy.samples(self.femb,start,stop)
+
+class SpyFile:
+    '''
+    Memory mapped raw spy buffer capture: a wib_client daqspy file (buf0 then buf1,
+    or a single buffer), or one capture of a wib_capture run at offset/nbytes.
+    buf0 carries FEMB 0 and 1, buf1 FEMB 2 and 3, as in WIB.acquire_data.
+
+    Nothing is decoded up front. femb(i)[ch][start:stop] unpacks just the words one
+    channel lives in, samples() and blocks() decode all channels of a frame range.
+    '''
+
+    def __init__(self,path,buffers=('buf0','buf1'),offset=0,nbytes=None):
+        self.path = path
+        if nbytes is None:
+            nbytes = os.path.getsize(path)-offset
+        data = np.memmap(path,dtype=np.uint8,mode='r',offset=offset,shape=(nbytes,))
+        if isinstance(buffers,str):
+            buffers = (buffers,)
+        size = nbytes//len(buffers)
+        self.buffers = {}
+        for i,name in enumerate(buffers):
+            self.buffers[name] = SpyBuffer(data[i*size:(i+1)*size])
+        self.num_samples = min(len(b) for b in self.buffers.values())
+
+    def buffer(self,femb):
+        name = 'buf0' if femb < 2 else 'buf1'
+        if name not in self.buffers:
+            raise IndexError('FEMB %i is in %s, which is not in %s'%(femb,name,self.path))
+        return self.buffers[name],femb % 2
+
+    def fembs(self):
+        return [f for f in range(4) if ('buf0' if f < 2 else 'buf1') in self.buffers]
+
+    def femb(self,femb):
+        self.buffer(femb)
+        return FEMBView(self,femb)
+
+    def timestamps(self,start=0,stop=None):
+        stop = self.num_samples if stop is None else min(stop,self.num_samples)
+        return np.stack([b.timestamps(start,stop) for b in self.buffers.values()])
+
+    def channel(self,femb,ch,start=0,stop=None):
+        buf,half = self.buffer(femb)
+        stop = self.num_samples if stop is None else min(stop,self.num_samples)
+        return buf.channel(half,ch,start,stop)
+
+    def samples(self,femb=None,start=0,stop=None):
+        '''(128,n) samples of one FEMB, or (4,128,n) of all FEMBs with zeros for missing buffers'''
+        stop = self.num_samples if stop is None else min(stop,self.num_samples)
+        if femb is not None:
+            buf,half = self.buffer(femb)
+            return buf.samples(half,start,stop)
+        out = np.zeros((4,128,max(0,stop-start)),dtype=np.uint16)
+        for f in self.fembs():
+            out[f] = self.samples(f,start,stop)
+        return out
+
+    def blocks(self,block_size=16384,fembs=None):
+        '''Yields (start, timestamps, samples) in blocks of block_size frames; samples is (len(fembs),128,n)'''
+        fembs = self.fembs() if fembs is None else fembs
+        for start in range(0,self.num_samples,block_size):
+            stop = min(start+block_size,self.num_samples)
+            yield start,self.timestamps(start,stop),np.stack([self.samples(f,start,stop) for f in fembs])
+
+def open_captures(prefix):
+    '''SpyFiles of every capture of a wib_capture run written to <prefix>.bin/.jsonl, with their metadata'''
+    out = []
+    with open(prefix+'.jsonl','r') as fin:
+        for line in fin:
+            meta = json.loads(line)
+            buffers = tuple(b for b in ('buf0','buf1') if meta[b+'_bytes'])
+            out.append((meta,SpyFile(prefix+'.bin',buffers,meta['offset'],meta['buf0_bytes']+meta['buf1_bytes'])))
+    return out
+
+def unpack_hs_frames(frames):
+    '''(n,13) uint16 HS frames -> (16,n) 12 bit samples, channel order as RAW_CONV'''
+    w = frames[:,1:].astype(np.uint16).reshape(-1,4,3)
+    s = np.empty((len(frames),4,4),dtype=np.uint16)
+    s[:,:,0] = w[:,:,0] >> 4
+    s[:,:,1] = ((w[:,:,0] & 0xF) << 8) | (w[:,:,1] >> 8)
+    s[:,:,2] = ((w[:,:,1] & 0xFF) << 4) | (w[:,:,2] >> 12)
+    s[:,:,3] = w[:,:,2] & 0xFFF
+    return s.reshape(-1,16).T
+
+class HSPacketFile:
+    '''
+    Memory mapped high speed UDP packet data of one ASIC, as cls_udp.get_rawdata_packets
+    returns it (a file name, bytes or an array). Packets are decoded in blocks on
+    request, so files far larger than memory can be swept.
+    '''
+
+    def __init__(self,data,jumbo=False):
+        self.pkg_words = HS_JUMBO_PKG_WORDS if jumbo else HS_PKG_WORDS
+        if isinstance(data,str):
+            words = np.memmap(data,dtype='>u2',mode='r')
+        else:
+            words = np.frombuffer(data,dtype='>u2')
+        self.frames_per_pkg = (self.pkg_words-HS_HEADER_WORDS)//HS_FRAME_WORDS
+        self.packets = words[:len(words)//self.pkg_words*self.pkg_words].reshape(-1,self.pkg_words)
+
+    def __len__(self):
+        return len(self.packets)
+
+    def counters(self,start=0,stop=None):
+        pkts = self.packets[start:stop]
+        return (pkts[:,0].astype(np.uint32) << 16) | pkts[:,1].astype(np.uint32)
+
+    def gaps(self):
+        '''Indices of packets whose counter does not follow the previous one'''
+        return np.nonzero(np.diff(self.counters()) != 1)[0]+1
+
+    def decode(self,start=0,stop=None,flags=False):
+        '''
+        (samples (16,n), feed) of packets start:stop. feed holds the sample indices of
+        0xfeed frames; with flags they also get 0x1000 added like RAW_CONV does.
+        '''
+        pkts = self.packets[start:stop]
+        frames = pkts[:,HS_HEADER_WORDS:HS_HEADER_WORDS+self.frames_per_pkg*HS_FRAME_WORDS].reshape(-1,HS_FRAME_WORDS)
+        frames = frames[(frames[:,0] == HS_FACE) | (frames[:,0] == HS_FEED)]
+        samples = unpack_hs_frames(frames)
+        feed = np.nonzero(frames[:,0] == HS_FEED)[0]
+        if flags:
+            samples[:,feed] |= 0x1000
+        return samples,feed
+
+    def blocks(self,block_packets=4096,flags=False):
+        '''Yields (first sample index, samples, feed) for every block_packets packets'''
+        first = 0
+        for start in range(0,len(self),block_packets):
+            samples,feed = self.decode(start,start+block_packets,flags)
+            yield first,samples,feed+first
+            first += samples.shape[1]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Summarize raw capture files in constant memory')
+    parser.add_argument('--hs',action='store_true',help='Files hold high speed UDP packets instead of spy buffers')
+    parser.add_argument('--single',action='store_true',help='Spy buffer files hold only one buffer')
+    parser.add_argument('--block',type=int,default=16384,help='Frames (or packets with --hs) decoded at a time [16384]')
+    parser.add_argument('files',nargs='+',help='wib_client daqspy .bin files, wib_capture .jsonl indexes or HS packet dumps')
+    args = parser.parse_args()
+
+    for path in args.files:
+        if args.hs:
+            hs = HSPacketFile(path)
+            total = np.zeros(16)
+            total2 = np.zeros(16)
+            num = 0
+            for first,samples,feed in hs.blocks(args.block):
+                total += samples.sum(axis=1)
+                total2 += (samples.astype(np.float64)**2).sum(axis=1)
+                num += samples.shape[1]
+            mean = total/max(num,1)
+            rms = np.sqrt(np.maximum(total2/max(num,1)-mean**2,0))
+            print('%s: %i packets, %i samples, %i counter gaps'%(path,len(hs),num,len(hs.gaps())))
+            print('  mean',np.round(mean,1))
+            print('  rms ',np.round(rms,2))
+            continue
+        if path.endswith('.jsonl'):
+            spies = [spy for meta,spy in open_captures(path[:-len('.jsonl')])]
+        else:
+            spies = [SpyFile(path,'buf0' if args.single else ('buf0','buf1'))]
+        for i,spy in enumerate(spies):
+            fembs = spy.fembs()
+            total = np.zeros((len(fembs),128))
+            num = 0
+            for start,timestamps,samples in spy.blocks(args.block):
+                total += samples.sum(axis=2)
+                num += samples.shape[2]
+            means = total/max(num,1)
+            print('%s[%i]: %i samples, FEMB means %s'%(path,i,num,' '.join('%0.1f'%m for m in means.mean(axis=1))))
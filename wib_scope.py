@@ -10,6 +10,7 @@ from collections import deque
 
 from wib import WIB
 import wib_pb2 as wibpb
+from wib_source import LiveSource, replay_dialog
 
 try:
     from matplotlib.backends.qt_compat import QtCore, QtWidgets, QtGui
@@ -339,6 +340,7 @@ class WIBScope(QtWidgets.QWidget):
         self.samples = None
         self.timestamps = None
         self.wib = wib
+        self.source = LiveSource(self)
         self.print_gui = print_gui
         self.get_femb_status = femb_status
         self.fembs_used = []
@@ -391,6 +393,12 @@ class WIBScope(QtWidgets.QWidget):
         button.clicked.connect(self.toggle_continuious)
         self.continuious_button = button
         
+        button = QtWidgets.QPushButton('Replay')
+        nav_layout.addWidget(button)
+        button.setToolTip('Show stored captures instead of the WIB spy buffer')
+        button.clicked.connect(self.toggle_source)
+        self.source_button = button
+        
         self.timer = QtCore.QTimer(self)
         self.timer.timeout.connect(self.acquire_data)
         
@@ -475,11 +483,25 @@ class WIBScope(QtWidgets.QWidget):
         if self.continuious_button.text() == 'Continuous':
             self.continuious_button.setText('Stop')
             print('Starting continuous acquisition')
-            self.timer.start(500)
+            self.timer.start(self.source.interval_ms)
         else:
             self.continuious_button.setText('Continuous')
             self.timer.stop()
     
+    @QtCore.pyqtSlot()
+    def toggle_source(self):
+        if isinstance(self.source,LiveSource):
+            source = replay_dialog(self,self.print_gui)
+            if source is None:
+                return
+            self.source = source
+            self.source_button.setText('Live')
+        else:
+            self.source = LiveSource(self)
+            self.source_button.setText('Replay')
+        if self.timer.isActive():
+            self.timer.start(self.source.interval_ms)
+    
     @QtCore.pyqtSlot()
     def acquire_data(self):
 #        buf0, buf1 = self.get_femb_status()
@@ -488,7 +510,12 @@ class WIBScope(QtWidgets.QWidget):
         if (buf0 == False) and (buf1 == False):
             self.print_gui("Select which FEMBs you want to read out first!")
             return
-        self.timestamps,self.samples = self.wib.acquire_data(buf0 = buf0, buf1 = buf1, ignore_failure=True, print_gui = self.print_gui)
+        data = self.source.acquire(buf0 = buf0, buf1 = buf1, print_gui = self.print_gui)
+        if data is None:
+            if self.timer.isActive() and self.source.finished():
+                self.toggle_continuious()
+            return
+        self.timestamps,self.samples = data
         
         for view in self.views:
             view.load_data()
@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+
+import time
+import numpy as np
+from math import nan
+
+# Every field of GetSensors.Sensors in the order they are flattened. Repeated
+# fields have a fixed length (see wib.proto), scalars have length None.
+SENSOR_FIELDS = [
+    ('ltc2990_4e_voltages',4),
+    ('ltc2990_4c_voltages',4),
+    ('ltc2991_48_voltages',8),
+    ('ad7414_49_temp',None),
+    ('ad7414_4d_temp',None),
+    ('ad7414_4a_temp',None),
+    ('ltc2499_15_temps',7),
+    ('femb0_dc2dc_ltc2991_voltages',8),
+    ('femb1_dc2dc_ltc2991_voltages',8),
+    ('femb2_dc2dc_ltc2991_voltages',8),
+    ('femb3_dc2dc_ltc2991_voltages',8),
+    ('femb_ldo_a0_ltc2991_voltages',8),
+    ('femb_ldo_a1_ltc2991_voltages',8),
+    ('femb_bias_ltc2991_voltages',8),
+]
+
+def _build_layout():
+    layout = []
+    names = []
+    offset = 0
+    for field,length in SENSOR_FIELDS:
+        layout.append((field,offset,length))
+        if length is None:
+            names.append(field)
+            offset += 1
+        else:
+            names.extend(['%s[%i]'%(field,i) for i in range(length)])
+            offset += length
+    return layout,names
+
+SENSOR_LAYOUT,SENSOR_NAMES = _build_layout()
+NUM_SENSOR_VALUES = len(SENSOR_NAMES)
+
+def sensor_index(field,idx=0):
+    '''Position of GetSensors field (and element idx of a repeated field) in a flattened array'''
+    for name,offset,length in SENSOR_LAYOUT:
+        if name == field:
+            if length is not None and not 0 <= idx < length:
+                raise IndexError('%s has only %i elements'%(field,length))
+            return offset if length is None else offset+idx
+    raise KeyError('Unknown sensor field %s'%field)
+
+def flatten_sensors(sensors,out=None):
+    '''Copies a GetSensors.Sensors reply into a flat float64 array, missing values are nan'''
+    if out is None:
+        out = np.empty(NUM_SENSOR_VALUES,dtype=np.float64)
+    for name,offset,length in SENSOR_LAYOUT:
+        if length is None:
+            out[offset] = getattr(sensors,name)
+        else:
+            vals = getattr(sensors,name)
+            n = min(len(vals),length)
+            out[offset:offset+n] = vals[:n]
+            out[offset+n:offset+length] = nan
+    return out
+
+# (resolution in seconds, number of points kept) for each history tier
+DEFAULT_TIERS = ((1.0,3600),(60.0,1440),(3600.0,720))
+
+def parse_tiers(text):
+    '''Parses "1:3600,60:1440,3600:720" into ((1.0,3600),(60.0,1440),(3600.0,720))'''
+    tiers = []
+    for item in text.split(','):
+        res,cap = item.strip().split(':')
+        tiers.append((float(res),int(cap)))
+    return tuple(tiers)
+
+def tier_label(resolution):
+    if resolution >= 3600 and resolution % 3600 == 0:
+        return '%i h'%(resolution//3600)
+    elif resolution >= 60 and resolution % 60 == 0:
+        return '%i min'%(resolution//60)
+    else:
+        return '%g s'%resolution
+
+class HistoryTier:
+    '''Ring buffer of values averaged into bins of fixed width'''
+
+    def __init__(self,resolution,capacity,width):
+        self.resolution = resolution
+        self.capacity = capacity
+        self.times = np.full(capacity,nan,dtype=np.float64)
+        self.values = np.full((capacity,width),nan,dtype=np.float32)
+        self.head = 0
+        self.count = 0
+        self.version = 0 #incremented every time a bin is closed
+        self._bin = None
+        self._sum = np.zeros(width,dtype=np.float64)
+        self._n = np.zeros(width,dtype=np.int64)
+
+    def add(self,t,values):
+        bin_start = np.floor(t/self.resolution)*self.resolution
+        if self._bin is not None and bin_start != self._bin:
+            self._flush()
+        if self._bin is None:
+            self._bin = bin_start
+        valid = ~np.isnan(values)
+        self._sum[valid] += values[valid]
+        self._n += valid
+
+    def _pending(self):
+        with np.errstate(invalid='ignore',divide='ignore'):
+            return np.where(self._n > 0,self._sum/np.maximum(self._n,1),nan)
+
+    def _flush(self):
+        self.times[self.head] = self._bin
+        self.values[self.head] = self._pending()
+        self.head = (self.head+1)%self.capacity
+        self.count = min(self.count+1,self.capacity)
+        self.version += 1
+        self._bin = None
+        self._sum[:] = 0
+        self._n[:] = 0
+
+    def pending(self,idx=None):
+        '''Returns (bin start,values) of the open bin, values[idx] if idx is given, or None if no bin is open'''
+        if self._bin is None:
+            return None
+        values = self._pending()
+        return self._bin,(values if idx is None else values[idx])
+
+    def series(self,idx=None,include_pending=True):
+        '''Returns (times,values) in chronological order, values[:,idx] if idx is given'''
+        if self.count < self.capacity:
+            times = self.times[:self.count]
+            values = self.values[:self.count]
+        else:
+            times = np.concatenate((self.times[self.head:],self.times[:self.head]))
+            values = np.concatenate((self.values[self.head:],self.values[:self.head]))
+        if include_pending and self._bin is not None:
+            times = np.append(times,self._bin)
+            values = np.concatenate((values,self._pending()[np.newaxis,:].astype(np.float32)))
+        if idx is not None:
+            values = values[:,idx]
+        return times,values
+
+class SensorHistory:
+    '''Fixed memory history of every GetSensors value, kept at several resolutions'''
+
+    def __init__(self,tiers=DEFAULT_TIERS,names=SENSOR_NAMES):
+        self.names = list(names)
+        self.tiers = [HistoryTier(res,cap,len(self.names)) for res,cap in tiers]
+        self.last_time = None
+        self.last_values = None
+
+    def append(self,values,t=None):
+        if t is None:
+            t = time.time()
+        values = np.asarray(values,dtype=np.float64)
+        for tier in self.tiers:
+            tier.add(t,values)
+        self.last_time = t
+        self.last_values = values
+
+    def append_sensors(self,sensors,t=None):
+        self.append(flatten_sensors(sensors),t)
+
+    def series(self,idx,tier=0,include_pending=True):
+        if isinstance(idx,str):
+            idx = self.names.index(idx)
+        return self.tiers[tier].series(idx,include_pending)
+
+    def pending(self,idx,tier=0):
+        if isinstance(idx,str):
+            idx = self.names.index(idx)
+        return self.tiers[tier].pending(idx)
+
+    def version(self,tier=0):
+        '''Changes when a bin of the tier closes, not when the open bin is updated'''
+        return self.tiers[tier].version
+
+    def retention(self):
+        '''Seconds of history kept by each tier'''
+        return [tier.resolution*tier.capacity for tier in self.tiers]
+
+    def nbytes(self):
+        return sum(tier.times.nbytes+tier.values.nbytes for tier in self.tiers)
+
+class SensorDecoder:
+    '''Vectorized conversion of flattened GetSensors values into named engineering values'''
+
+    def __init__(self):
+        self.columns = []
+        self._iv = []
+        self._vt = []
+        self._t = []
+        self._const = []
+        self._compiled = False
+
+    def _add(self,name):
+        if name in self.columns:
+            raise KeyError('Duplicate sensor column %s'%name)
+        self.columns.append(name)
+        self._compiled = False
+        return len(self.columns)-1
+
+    def iv(self,name,field,pair,sense_ohms):
+        '''Voltage (name.V) and current in mA (name.mA) from a (before,after) pair across sense_ohms'''
+        col_v = self._add(name+'.V')
+        col_i = self._add(name+'.mA')
+        self._iv.append((col_v,col_i,sensor_index(field,2*pair),sensor_index(field,2*pair+1),sense_ohms))
+
+    def vt(self,name,field,idx,calib=(0.5,75,-0.002)):
+        '''Temperature (name.C) from a voltage, calib is (calib_voltage, calib_temp_c, volts_per_deg_c)'''
+        self._vt.append((self._add(name+'.C'),sensor_index(field,idx))+tuple(calib))
+
+    def t(self,name,field,idx=0):
+        '''Temperature (name.C) reported directly in C'''
+        self._t.append((self._add(name+'.C'),sensor_index(field,idx)))
+
+    def const(self,name,value=nan):
+        self._const.append((self._add(name),value))
+
+    def compile(self):
+        iv =np.array(self._iv,dtype=np.float64).reshape(-1,5)
+        self.iv_cols_v,self.iv_cols_i = iv[:,0].astype(np.intp),iv[:,1].astype(np.intp)
+        self.iv_before,self.iv_after = iv[:,2].astype(np.intp),iv[:,3].astype(np.intp)
+        self.iv_scale = 1000.0/iv[:,4]
+        vt = np.array(self._vt,dtype=np.float64).reshape(-1,5)
+        self.vt_cols,self.vt_idx = vt[:,0].astype(np.intp),vt[:,1].astype(np.intp)
+        self.vt_v,self.vt_c,self.vt_vpc = vt[:,2],vt[:,3],vt[:,4]
+        t = np.array(self._t,dtype=np.float64).reshape(-1,2)
+        self.t_cols,self.t_idx = t[:,0].astype(np.intp),t[:,1].astype(np.intp)
+        const = np.array(self._const,dtype=np.float64).reshape(-1,2)
+        self.const_cols,self.const_vals = const[:,0].astype(np.intp),const[:,1]
+        self.index = {name:i for i,name in enumerate(self.columns)}
+        self._compiled = True
+
+    def column(self,name):
+        if not self._compiled:
+            self.compile()
+        return self.index[name]
+
+    def decode(self,flat,out=None):
+        '''flat is one flatten_sensors() array (or a 2D stack of them), returns the engineering values'''
+        if not self._compiled:
+            self.compile()
+        flat = np.asarray(flat,dtype=np.float64)
+        if out is None:
+            out = np.empty(flat.shape[:-1]+(len(self.columns),),dtype=np.float64)
+        before = flat[...,self.iv_before]
+        out[...,self.iv_cols_v] = before
+        out[...,self.iv_cols_i] = (before-flat[...,self.iv_after])*self.iv_scale
+        out[...,self.vt_cols] = (flat[...,self.vt_idx]-self.vt_v)/self.vt_vpc+self.vt_c
+        out[...,self.t_cols] = flat[...,self.t_idx]
+        out[...,self.const_cols] = self.const_vals
+        return out
+
+    def decode_sensors(self,sensors):
+        return self.decode(flatten_sensors(sensors))
+
+def default_decoder():
+    '''The quantities shown by wib_mon'''
+    d = SensorDecoder()
+    d.t('wib.board_temp1','ad7414_49_temp')
+    d.t('wib.board_temp2','ad7414_4d_temp')
+    d.t('wib.board_temp3','ad7414_4a_temp')
+    d.const('wib.ddr_temp.C') #FIXME not read out by wib_server
+    for i in range(3):
+        d.vt('wib.power_temp%i'%(i+1),'ltc2499_15_temps',4+i)
+    d.iv('wib.5V','ltc2990_4e_voltages',0,0.001)
+    d.iv('wib.1.2V','ltc2990_4c_voltages',0,0.001)
+    d.iv('wib.3.3V','ltc2990_4c_voltages',1,0.001)
+    d.iv('wib.0.85V','ltc2991_48_voltages',0,0.001)
+    d.iv('wib.0.9V','ltc2991_48_voltages',1,0.001)
+    d.iv('wib.2.5V','ltc2991_48_voltages',2,0.001)
+    d.iv('wib.1.8V','ltc2991_48_voltages',3,0.001)
+    for idx in range(4):
+        femb = 'femb%i'%idx
+        d.vt(femb+'.power_temp','ltc2499_15_temps',idx)
+        d.iv(femb+'.ldo_a0','femb_ldo_a0_ltc2991_voltages',idx,0.01)
+        d.iv(femb+'.ldo_a1','femb_ldo_a1_ltc2991_voltages',idx,0.01)
+        d.iv(femb+'.bias','femb_bias_ltc2991_voltages',idx,0.1)
+        dc2dc = 'femb%i_dc2dc_ltc2991_voltages'%idx
+        d.iv(femb+'.dc2dc_v1',dc2dc,0,0.1)
+        d.iv(femb+'.dc2dc_v2',dc2dc,1,0.1)
+        d.iv(femb+'.dc2dc_v3',dc2dc,2,0.01)
+        d.iv(femb+'.dc2dc_v4',dc2dc,3,0.1)
+    d.compile()
+    return d
+
+DEFAULT_DECODER = default_decoder()
@@ -0,0 +1,414 @@
+#!/usr/bin/env python3
+
+import os
+import time
+import zlib
+import shutil
+import hashlib
+import argparse
+import tempfile
+import threading
+import numpy as np
+import zmq
+
+import wib_pb2 as wibpb
+from wib_frames import pack_frames
+
+# Charge per pulser DAC step in fC and ADC counts per mV, rough numbers for plausible waveforms
+FC_PER_DAC = 1.5
+COUNTS_PER_MV = 16384/1800.0
+GAINS_MV_PER_FC = [14.0,25.0,7.8,4.7]
+PEAK_TIMES_US = [1.0,0.5,3.0,2.0]
+SAMPLE_US = 0.5
+TICKS_PER_SAMPLE = 32
+
+class WIBSim:
+    '''
+    Stand-in for wib_server: answers Command messages on tcp port 1234 with synthetic
+    data. A ROUTER socket is used instead of REP so requests can be dropped to
+    exercise client timeouts.
+    '''
+
+    def __init__(self,bind='tcp://*:1234',latency=0.0,jitter=0.0,drop=0.0,fail=0.0,
+                 num_samples=2184,pulse_period=500,seed=None,command_latency=None):
+        self.bind = bind
+        self.latency = latency
+        self.jitter = jitter
+        self.drop = drop
+        self.fail = fail
+        self.num_samples = num_samples
+        self.pulse_period = pulse_period
+        self.command_latency = dict(command_latency) if command_latency else {}
+        self.rng = np.random.default_rng(seed)
+
+        self.power = [False]*4
+        self.cold = False
+        self.power_conf = wibpb.ConfigurePower()
+        self.config = None
+        self.regs = {}
+        self.cd_regs = {}
+        self.fake_time = 0
+        self.time_start = time.time()
+        self.log = []
+        self.counts = {}
+        self.uploads = {}
+        self.upload_dir = None
+        self.updated = None
+
+        # fixed per channel baseline offsets and noise so repeated captures look like one board
+        self.ped_offset = self.rng.normal(0,150,(4,128))
+        self.noise_rms = self.rng.uniform(3.0,8.0,(4,128))
+
+        self.handlers = [
+            (wibpb.Script,self.script),
+            (wibpb.ReadDaqSpy,self.read_daq_spy),
+            (wibpb.ConfigurePower,self.configure_power),
+            (wibpb.PowerWIB,self.power_wib),
+            (wibpb.ConfigureWIB,self.configure_wib),
+            (wibpb.Calibrate,self.status),
+            (wibpb.Update,self.status),
+            (wibpb.UpdateBegin,self.update_begin),
+            (wibpb.UpdateChunk,self.update_chunk),
+            (wibpb.UpdateCommit,self.update_commit),
+            (wibpb.Reboot,self.empty),
+            (wibpb.Peek,self.peek),
+            (wibpb.Poke,self.poke),
+            (wibpb.CDPeek,self.cd_peek),
+            (wibpb.CDPoke,self.cd_poke),
+            (wibpb.CDFastCmd,self.empty),
+            (wibpb.GetSensors,self.get_sensors),
+            (wibpb.GetTimestamp,self.get_timestamp),
+            (wibpb.GetSWVersion,self.get_sw_version),
+            (wibpb.ResetTiming,self.get_timing_status),
+            (wibpb.GetTimingStatus,self.get_timing_status),
+            (wibpb.SetFakeTime,self.set_fake_time),
+            (wibpb.StartFakeTime,self.empty),
+            (wibpb.LogControl,self.log_control),
+        ]
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def message(self,text):
+        self.log.append('%s %s\n'%(time.strftime('%H:%M:%S'),text))
+
+    # --- command handlers, each returns the reply message ---
+
+    def status(self,req,success=True,extra=''):
+        rep = wibpb.Status()
+        rep.success = success
+        rep.extra = extra.encode('ascii')
+        return rep
+
+    def empty(self,req):
+        return wibpb.Empty()
+
+    def script(self,req):
+        self.message('script %s'%('file' if req.file else 'bytes'))
+        return self.status(req)
+
+    def configure_power(self,req):
+        self.power_conf.CopyFrom(req)
+        return self.status(req)
+
+    def power_wib(self,req):
+        self.power = [req.femb0,req.femb1,req.femb2,req.femb3]
+        self.cold = req.cold
+        extra = ''.join('FEMB%i %s\n'%(i,'ON' if on else 'OFF') for i,on in enumerate(self.power))
+        self.message('power %s'%self.power)
+        return self.status(req,extra=extra)
+
+    def configure_wib(self,req):
+        unpowered = [i for i,f in enumerate(req.fembs) if f.enabled and not self.power[i]]
+        if unpowered:
+            return self.status(req,False,'FEMB %s enabled but not powered\n'%unpowered)
+        self.config = wibpb.ConfigureWIB()
+        self.config.CopyFrom(req)
+        return self.status(req,extra='Configured FEMBs %s\n'%[i for i,f in enumerate(req.fembs) if f.enabled])
+
+    def peek(self,req):
+        rep = wibpb.RegValue()
+        rep.addr = req.addr
+        rep.value = self.regs.get(req.addr,0)
+        return rep
+
+    def poke(self,req):
+        self.regs[req.addr] = req.value
+        return self.peek(req)
+
+    def cd_key(self,req):
+        return (req.femb_idx,req.coldata_idx,req.chip_addr,req.reg_page,req.reg_addr)
+
+    def cd_peek(self,req):
+        rep = wibpb.CDRegValue()
+        rep.femb_idx,rep.coldata_idx,rep.chip_addr,rep.reg_page,rep.reg_addr = self.cd_key(req)
+        rep.data = self.cd_regs.get(self.cd_key(req),0)
+        return rep
+
+    def cd_poke(self,req):
+        self.cd_regs[self.cd_key(req)] = req.data & 0xff
+        return self.cd_peek(req)
+
+    def update_status(self,upload,success=True,extra=''):
+        rep = wibpb.UpdateStatus()
+        rep.success = success
+        if upload is not None:
+            rep.root_received,rep.boot_received = upload['received']
+        rep.extra = extra.encode('ascii')
+        return rep
+
+    def update_begin(self,req):
+        sizes = [req.root_size,req.boot_size]
+        digests = [req.root_sha256,req.boot_sha256]
+        upload = self.uploads.get(req.upload_id)
+        if upload is not None and upload['sizes'] == sizes and upload['digests'] == digests:
+            self.message('update %s resumed at %s'%(req.upload_id,upload['received']))
+            return self.update_status(upload)
+        if self.upload_dir is None:
+            self.upload_dir = tempfile.mkdtemp(prefix='wib_sim_update_')
+        paths = [os.path.join(self.upload_dir,'%s_%s.tar.gz'%(req.upload_id,name)) for name in ('root','boot')]
+        for p in paths:
+            open(p,'wb').close()
+        upload = {'sizes':sizes,'digests':digests,'paths':paths,'received':[0,0]}
+        self.uploads[req.upload_id] = upload
+        self.message('update %s started, %i bytes'%(req.upload_id,sum(sizes)))
+        return self.update_status(upload)
+
+    def update_chunk(self,req):
+        upload = self.uploads.get(req.upload_id)
+        if upload is None:
+            return self.update_status(None,False,'unknown upload %s'%req.upload_id)
+        if req.archive > 1:
+            return self.update_status(upload,False,'bad archive %i'%req.archive)
+        if zlib.crc32(req.data) != req.crc32:
+            return self.update_status(upload,False,'crc mismatch at %i'%req.offset)
+        received = upload['received'][req.archive]
+        if req.offset > received:
+            return self.update_status(upload,False,'gap, expected offset %i'%received)
+        if req.offset+len(req.data) > upload['sizes'][req.archive]:
+            return self.update_status(upload,False,'chunk past the end of the archive')
+        if req.offset+len(req.data) > received:
+            with open(upload['paths'][req.archive],'r+b') as fout:
+                fout.seek(req.offset)
+                fout.write(req.data)
+            upload['received'][req.archive] = req.offset+len(req.data)
+        return self.update_status(upload)
+
+    def update_commit(self,req):
+        upload = self.uploads.get(req.upload_id)
+        if upload is None:
+            return self.status(req,False,'unknown upload %s'%req.upload_id)
+        if upload['received'] != upload['sizes']:
+            return self.status(req,False,'upload incomplete %s of %s'%(upload['received'],upload['sizes']))
+        for path,digest in zip(upload['paths'],upload['digests']):
+            h = hashlib.sha256()
+            with open(path,'rb') as fin:
+                for block in iter(lambda: fin.read(1024*1024),b''):
+                    h.update(block)
+            if h.digest() != digest:
+                del self.uploads[req.upload_id]
+                return self.status(req,False,'sha256 mismatch for %s'%os.path.basename(path))
+        for path in upload['paths']:
+            os.remove(path)
+        del self.uploads[req.upload_id]
+        self.updated = req.upload_id
+        self.message('update %s deployed'%req.upload_id)
+        return self.status(req)
+
+    def get_sensors(self,req):
+        rep = wibpb.GetSensors.Sensors()
+        n = lambda scale: float(self.rng.normal(0,scale))
+        def pair(v,amps,ohms):
+            v = v+n(0.002)
+            return [v,v-amps*ohms]
+        rep.ltc2990_4e_voltages.extend(pair(5.0,2.5,0.001)+[1.2+n(0.002),0.6+n(0.002)])
+        rep.ltc2990_4c_voltages.extend(pair(1.2,3.0,0.001)+pair(3.3,1.5,0.001))
+        rep.ltc2991_48_voltages.extend(pair(0.85,4.0,0.001)+pair(0.9,2.0,0.001)+pair(2.5,0.5,0.001)+pair(1.8,0.8,0.001))
+        t = 30.0 if not self.cold else 25.0
+        rep.ad7414_49_temp = t+n(0.3)
+        rep.ad7414_4d_temp = t+2+n(0.3)
+        rep.ad7414_4a_temp = t+1+n(0.3)
+        #LTM4644 temperature diodes read ~0.6 V at 25 C, -2 mV/C
+        rep.ltc2499_15_temps.extend([0.6-0.002*(t+(10 if i < 4 and self.power[i] else 0)-25)+n(0.0005) for i in range(7)])
+        dc2dc_v = [4.22,3.0,2.5,1.5]
+        dc2dc_a = [0.45,0.35,1.1,0.25]
+        dc2dc_ohms = [0.1,0.1,0.01,0.1]
+        fields = [rep.femb0_dc2dc_ltc2991_voltages,rep.femb1_dc2dc_ltc2991_voltages,rep.femb2_dc2dc_ltc2991_voltages,rep.femb3_dc2dc_ltc2991_voltages]
+        for i,field in enumerate(fields):
+            on = self.power[i]
+            for v,a,ohms in zip(dc2dc_v,dc2dc_a,dc2dc_ohms):
+                field.extend(pair(v,a,ohms) if on else [abs(n(0.001)),0.0])
+        for field,v,a,ohms in [(rep.femb_ldo_a0_ltc2991_voltages,2.5,0.1,0.01),(rep.femb_ldo_a1_ltc2991_voltages,2.5,0.1,0.01),(rep.femb_bias_ltc2991_voltages,5.0,0.03,0.1)]:
+            for i in range(4):
+                field.extend(pair(v,a,ohms) if self.power[i] else [abs(n(0.001)),0.0])
+        return rep
+
+    def get_timestamp(self,req):
+        rep = wibpb.GetTimestamp.Timestamp()
+        now = time.gmtime(self.time_start)
+        rep.timestamp = int(self.time_start)
+        rep.year,rep.month,rep.day = now.tm_year,now.tm_mon,now.tm_mday
+        rep.hour,rep.min,rep.sec = now.tm_hour,now.tm_min,now.tm_sec
+        return rep
+
+    def get_sw_version(self,req):
+        rep = wibpb.GetSWVersion.Version()
+        rep.version = 'wib_sim'
+        return rep
+
+    def get_timing_status(self,req):
+        rep = wibpb.GetTimingStatus.TimingStatus()
+        rep.ept_status = 0x108 #ts ready, state 8
+        return rep
+
+    def set_fake_time(self,req):
+        self.fake_time = req.time
+        return wibpb.Empty()
+
+    def log_control(self,req):
+        rep = wibpb.LogControl.Log()
+        if req.return_log or req.boot_log:
+            rep.contents = ''.join(self.log).encode('ascii')
+        if req.clear_log:
+            self.log = []
+        return rep
+
+    # --- synthetic spy buffer data ---
+
+    def femb_samples(self,idx,num,phase):
+        '''(128,num) uint16 samples for one FEMB'''
+        if self.config is None or not self.power[idx] or not self.config.fembs[idx].enabled:
+            return np.zeros((128,num),dtype=np.uint16)
+        femb = self.config.fembs[idx]
+        baseline = 9000.0 if femb.baseline == 0 else 1000.0
+        data = baseline+self.ped_offset[idx][:,np.newaxis]+self.rng.standard_normal((128,num))*self.noise_rms[idx][:,np.newaxis]
+        if self.config.pulser:
+            tp = PEAK_TIMES_US[femb.peak_time % 4]/SAMPLE_US
+            t = (np.arange(num)+phase) % self.pulse_period
+            shape = (t/tp)**4*np.exp(4*(1-t/tp)) #CR-RC^4, 1.0 at t=tp
+            amp = femb.pulse_dac*FC_PER_DAC*GAINS_MV_PER_FC[femb.gain % 4]*COUNTS_PER_MV
+            data += amp*shape[np.newaxis,:]
+        return np.clip(data,0,16383).astype(np.uint16)
+
+    def read_daq_spy(self,req):
+        num = self.num_samples
+        phase = int(self.rng.integers(self.pulse_period))
+        t0 = (self.fake_time if self.fake_time else int((time.time()-self.time_start)*62.5e6))+int(self.rng.integers(1<<20))*TICKS_PER_SAMPLE
+        ts = t0+np.arange(num,dtype=np.uint64)*TICKS_PER_SAMPLE
+        bufs = [req.buf0,req.buf0,req.buf1,req.buf1]
+        samples = np.zeros((4,128,num),dtype=np.uint16)
+        for i in range(4):
+            if bufs[i]:
+                samples[i] = self.femb_samples(i,num,phase)
+        if req.deframe:
+            rep = wibpb.ReadDaqSpy.DeframedDaqSpy()
+            rep.crate_num = 0
+            rep.wib_num = 0
+            rep.num_samples = num
+            rep.deframed_samples = samples.tobytes()
+            rep.deframed_timestamps = np.stack([ts,ts]).astype(np.uint64).tobytes()
+            rep.success = True
+        else:
+            rep = wibpb.ReadDaqSpy.DaqSpy()
+            if req.buf0:
+                rep.buf0 = pack_frames(samples[0],samples[1],ts)
+            if req.buf1:
+                rep.buf1 = pack_frames(samples[2],samples[3],ts)
+            rep.success = True
+        if req.trigger_command:
+            #pretend the trigger arrives somewhere within the timeout
+            time.sleep(self.rng.uniform(0,min(req.trigger_timeout_ms,1000))/1000.0)
+        return rep
+
+    # --- server loop ---
+
+    def handle(self,msg):
+        '''Returns (command name, reply bytes), reply is None to drop the request'''
+        cmd = wibpb.Command()
+        try:
+            cmd.ParseFromString(msg)
+        except Exception:
+            return None,b''
+        for cls,handler in self.handlers:
+            if cmd.cmd.Is(cls.DESCRIPTOR):
+                name = cls.DESCRIPTOR.name
+                self.counts[name] = self.counts.get(name,0)+1
+                req = cls()
+                cmd.cmd.Unpack(req)
+                delay = self.command_latency.get(name,self.latency)
+                if self.jitter > 0:
+                    delay += self.rng.exponential(self.jitter)
+                if delay > 0:
+                    time.sleep(delay)
+                if self.drop > 0 and self.rng.random() < self.drop:
+                    self.message('dropped %s'%name)
+                    return name,None
+                rep = handler(req)
+                if self.fail > 0 and isinstance(rep,wibpb.Status) and self.rng.random() < self.fail:
+                    rep.success = False
+                    rep.extra = b'injected failure\n'
+                return name,rep.SerializeToString()
+        return None,b''
+
+    def serve_forever(self):
+        context = zmq.Context()
+        socket = context.socket(zmq.ROUTER)
+        socket.setsockopt(zmq.LINGER,0)
+        socket.bind(self.bind)
+        poller = zmq.Poller()
+        poller.register(socket,zmq.POLLIN)
+        try:
+            while not self.stop_event.is_set():
+                if not poller.poll(100):
+                    continue
+                frames = socket.recv_multipart()
+                ident,msg = frames[0],frames[-1]
+                name,rep = self.handle(msg)
+                if rep is not None:
+                    socket.send_multipart([ident,b'',rep])
+        finally:
+            socket.close()
+            context.term()
+
+    def start(self):
+        '''Serves from a background thread, for use inside tests and benchmarks'''
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.serve_forever,name='wib_sim',daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        if self.upload_dir is not None:
+            shutil.rmtree(self.upload_dir,ignore_errors=True)
+            self.upload_dir = None
+            self.uploads = {}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Simulated wib_server for running the GUI and tools without a WIB')
+    parser.add_argument('--bind','-b',default='tcp://*:1234',help='ZeroMQ address to bind [tcp://*:1234]')
+    parser.add_argument('--latency','-l',default=0.0,type=float,help='Seconds to wait before answering each command [0]')
+    parser.add_argument('--command_latency','-c',action='append',default=[],metavar='NAME=SECONDS',help='Latency for one command type, e.g. PowerWIB=2.5 (may be repeated)')
+    parser.add_argument('--jitter','-j',default=0.0,type=float,help='Mean of an exponential extra delay in seconds [0]')
+    parser.add_argument('--drop',default=0.0,type=float,help='Probability of never answering a command [0]')
+    parser.add_argument('--fail',default=0.0,type=float,help='Probability of a Status reply reporting failure [0]')
+    parser.add_argument('--samples','-n',default=2184,type=int,help='Samples per ReadDaqSpy [2184]')
+    parser.add_argument('--period','-p',default=500,type=int,help='Pulser period in samples [500]')
+    parser.add_argument('--seed',default=None,type=int,help='Random seed for reproducible data')
+    args = parser.parse_args()
+
+    command_latency = {}
+    for item in args.command_latency:
+        name,seconds = item.split('=')
+        command_latency[name] = float(seconds)
+    sim = WIBSim(args.bind,args.latency,args.jitter,args.drop,args.fail,args.samples,args.period,args.seed,command_latency)
+    print('Simulated wib_server listening on %s'%args.bind)
+    try:
+        sim.serve_forever()
+    except KeyboardInterrupt:
+        print()
+    sim.stop()
+    for name,count in sorted(sim.counts.items()):
+        print('%s: %i'%(name,count))
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+
+import os
+import time
+import argparse
+import numpy as np
+
+from wib_rawfile import SpyFile, open_captures
+
+# Spy buffer timestamps advance by 32 ticks of the 62.5 MHz timing clock per sample
+TIMESTAMP_STEP = 32
+
+class DataSource:
+    '''
+    Where the GUI views get spy buffer data from. acquire returns (timestamps (2,n),
+    samples (4,128,n)) like WIB.acquire_data, or None when there is nothing to show.
+    interval_ms is the continuous acquisition period the views should use.
+    '''
+
+    name = 'None'
+    interval_ms = 500
+
+    def acquire(self,buf0=True,buf1=True,print_gui=None):
+        raise NotImplementedError()
+
+    def finished(self):
+        '''True once acquire will not return data again, continuous acquisition should stop then'''
+        return False
+
+class LiveSource(DataSource):
+    '''Reads the spy buffers of a WIB; owner.wib is looked up on every call so the GUI can swap WIBs'''
+
+    def __init__(self,owner,ignore_failure=True):
+        self.owner = owner
+        self.ignore_failure = ignore_failure
+
+    @property
+    def name(self):
+        return 'Live %s'%self.owner.wib.wib_server
+
+    def acquire(self,buf0=True,buf1=True,print_gui=None):
+        return self.owner.wib.acquire_data(buf0=buf0,buf1=buf1,ignore_failure=self.ignore_failure,print_gui=print_gui)
+
+def place_femb(femb,data,num=None):
+    '''(timestamps,samples) with one FEMB's (128,n) samples at index femb, other FEMBs zero'''
+    data = np.asarray(data)
+    num = data.shape[-1] if num is None else num
+    samples = np.zeros((4,128,num),dtype=np.uint16)
+    samples[femb] = data[:,:num]
+    timestamps = np.arange(num,dtype=np.uint64)*np.uint64(TIMESTAMP_STEP)
+    return np.stack([timestamps,timestamps]),samples
+
+def spy_entries(spy,label):
+    def load():
+        timestamps = spy.timestamps()
+        if len(timestamps) == 1:
+            timestamps = np.concatenate([timestamps,timestamps])
+        return timestamps,spy.samples()
+    return [(label,load)]
+
+def hdf5_entries(path,femb):
+    '''One entry per dataset of an HDF5 file laid out like femb_linearity.take_data writes it'''
+    import h5py
+    with h5py.File(path,'r') as hf:
+        names = []
+        hf.visititems(lambda name,obj: names.append(name) if isinstance(obj,h5py.Dataset) and len(obj.shape) == 2 else None)
+    def loader(name):
+        def load():
+            with h5py.File(path,'r') as hf:
+                return place_femb(femb,hf[name][()])
+        return load
+    return [('%s:%s'%(os.path.basename(path),name),loader(name)) for name in names]
+
+def catalog_entries(directory,**query):
+    from wib_catalog import Catalog
+    cat = Catalog(directory)
+    rows = cat.query(**query)
+    def loader(row):
+        def load():
+            timestamps,samples = cat.samples(row)
+            if row['kind'] != 'frame14':
+                num = samples.shape[-1]
+                timestamps = np.arange(num,dtype=np.uint64)*np.uint64(TIMESTAMP_STEP)
+                #a copy, the memmap is read only and acquire zeroes the unused buffers
+                return np.stack([timestamps,timestamps]),np.array(samples)
+            femb = cat.slots(row)[0]
+            out = np.zeros((4,128,samples.shape[-1]),dtype=np.uint16)
+            out[femb:femb+2] = samples
+            return np.stack([timestamps,timestamps]),out
+        return load
+    return [('catalog %i'%row['id'],loader(row)) for row in rows]
+
+class ReplaySource(DataSource):
+    '''
+    Replays stored captures in order, one per acquire, looping at the end if loop.
+    Accepts wib_client daqspy .bin files, wib_capture .jsonl indexes, HDF5 files
+    (femb_linearity layout, shown as FEMB femb) and wib_catalog directories.
+    rate is captures per second, None (or 0) for as fast as they can be read.
+    Captures are only read from disk when they are acquired.
+    '''
+
+    def __init__(self,paths,rate=None,loop=True,femb=0,single=False,**query):
+        if isinstance(paths,str):
+            paths = [paths]
+        self.paths = paths
+        self.rate = rate if rate else None
+        self.loop = loop
+        self.entries = []
+        for path in paths:
+            if os.path.isdir(path):
+                self.entries += catalog_entries(path,**query)
+            elif path.endswith('.jsonl'):
+                for meta,spy in open_captures(path[:-len('.jsonl')]):
+                    self.entries += spy_entries(spy,'%s[%i]'%(os.path.basename(path),meta['index']))
+            elif path.endswith('.h5') or path.endswith('.hdf5'):
+                self.entries += hdf5_entries(path,femb)
+            else:
+                self.entries += spy_entries(SpyFile(path,'buf0' if single else ('buf0','buf1')),os.path.basename(path))
+        self.index = 0
+        self.served = 0
+        self.started = None
+        self.next_due = None
+        self.current = None
+
+    @property
+    def name(self):
+        return 'Replay %s'%(self.current or ', '.join(os.path.basename(p) for p in self.paths))
+
+    @property
+    def interval_ms(self):
+        return 0 if self.rate is None else int(1000/self.rate)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def rewind(self):
+        self.index = 0
+
+    def finished(self):
+        return self.index >= len(self.entries) and (not self.loop or len(self.entries) == 0)
+
+    def acquire(self,buf0=True,buf1=True,print_gui=None):
+        if self.finished():
+            if print_gui is not None:
+                print_gui('Replay finished after %i captures'%self.served)
+            return None
+        if self.index >= len(self.entries):
+            self.index = 0
+        now = time.monotonic()
+        if self.rate is not None:
+            if self.next_due is not None and now < self.next_due:
+                time.sleep(self.next_due-now)
+            self.next_due = max(now,self.next_due or now)+1.0/self.rate
+        if self.started is None:
+            self.started = time.monotonic()
+        self.current,load = self.entries[self.index]
+        self.index += 1
+        timestamps,samples = load()
+        if not buf0:
+            samples[0:2] = 0
+        if not buf1:
+            samples[2:4] = 0
+        self.served += 1
+        return timestamps,samples
+
+    def throughput(self):
+        '''Captures served per second since the first acquire'''
+        if self.started is None or self.served == 0:
+            return 0.0
+        return self.served/max(time.monotonic()-self.started,1e-9)
+
+def replay_dialog(parent,print_gui=print):
+    '''Asks for capture files and a replay rate, returns a ReplaySource or None if cancelled'''
+    try:
+        from matplotlib.backends.qt_compat import QtWidgets
+    except:
+        from matplotlib.backends.backend_qt4agg import QtWidgets
+    paths,_ = QtWidgets.QFileDialog.getOpenFileNames(parent,'Replay captures','.','Captures (*.bin *.jsonl *.h5 *.hdf5);;All files (*.*)')
+    if not paths:
+        directory = QtWidgets.QFileDialog.getExistingDirectory(parent,'Replay capture catalog','.')
+        if not directory:
+            return None
+        paths = [directory]
+    rate,ok = QtWidgets.QInputDialog.getDouble(parent,'Replay rate','Captures per second (0 for as fast as possible)',1.0,0.0,1000.0,2)
+    if not ok:
+        return None
+    try:
+        source = ReplaySource(paths,rate=rate)
+    except Exception as e:
+        print_gui('Could not open %s: %s'%(', '.join(paths),e))
+        return None
+    print_gui('Replaying %i captures from %s'%(len(source),', '.join(paths)))
+    return source
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Replay stored captures and report the rate they can be read at')
+    parser.add_argument('--rate','-r',default=None,type=float,help='Captures per second [as fast as possible]')
+    parser.add_argument('--count','-n',default=None,type=int,help='Captures to replay, looping if needed [each once]')
+    parser.add_argument('--femb','-f',default=0,type=int,help='FEMB HDF5 data is shown as [0]')
+    parser.add_argument('paths',nargs='+',help='daqspy .bin, wib_capture .jsonl, HDF5 files or wib_catalog directories')
+    args = parser.parse_args()
+
+    source = ReplaySource(args.paths,rate=args.rate,loop=args.count is not None,femb=args.femb)
+    count = len(source) if args.count is None else args.count
+    for i in range(count):
+        data = source.acquire()
+        if data is None:
+            break
+    print('%i captures from %i stored, %0.1f captures/s'%(source.served,len(source),source.throughput()))
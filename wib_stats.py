@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+
+import time
+import json
+import threading
+import numpy as np
+from collections import deque
+
+# Latency histograms use log spaced bins, 10 per decade from 10 us to 1000 s.
+# Bin 0 collects anything faster, the last bin anything slower.
+BIN_EDGES = np.logspace(-5,3,81)
+STAGES = ('serialize','send','wait','parse','total')
+
+# Receive timeouts used before enough latencies are known, and the upper limit
+# of the adaptive ones, in milliseconds.
+CEILINGS_MS = {'PowerWIB':60000,'Script':15000,'Calibrate':20000,'ResetTiming':20000,'UpdateCommit':60000}
+DEFAULT_CEILING_MS = 5000
+RECENT = 256
+# Commands whose duration depends on what they do rather than on the link,
+# these always use their ceiling.
+FIXED_TIMEOUT = ('PowerWIB','Script','Calibrate','ResetTiming','ConfigureWIB','ConfigurePower','Reboot','UpdateCommit')
+
+def command_name(req):
+    '''Message type name used to key the statistics, e.g. GetSensors'''
+    return type(req).DESCRIPTOR.name
+
+def histogram_quantile(counts,q):
+    '''Upper edge estimate of quantile q (0..1) from a BIN_EDGES histogram, nan when empty'''
+    total = counts.sum()
+    if total == 0:
+        return float('nan')
+    idx = int(np.searchsorted(np.cumsum(counts),q*total,side='left'))
+    return float(BIN_EDGES[min(idx,len(BIN_EDGES)-1)])
+
+class CommandStat:
+    '''Counters and per stage latency histograms of one command type'''
+
+    def __init__(self):
+        self.count = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.retries = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.max_total = 0.0
+        self.sum_total = 0.0
+        self.last = None
+        self.timeout_ms = None
+        self.consecutive_timeouts = 0
+        # recent wait times divided by the request size (see TimeoutPolicy.size)
+        self.recent = deque(maxlen=RECENT)
+        self.hist = {stage:np.zeros(len(BIN_EDGES),dtype=np.int64) for stage in STAGES}
+
+    def add(self,stage,seconds):
+        self.hist[stage][min(int(np.searchsorted(BIN_EDGES,seconds)),len(BIN_EDGES)-1)] += 1
+
+    def summary(self):
+        total = self.hist['total']
+        return {
+            'count' : self.count,
+            'timeouts' : self.timeouts,
+            'errors' : self.errors,
+            'retries' : self.retries,
+            'bytes_sent' : self.bytes_sent,
+            'bytes_received' : self.bytes_received,
+            'mean' : self.sum_total/self.count if self.count else float('nan'),
+            'p50' : histogram_quantile(total,0.5),
+            'p90' : histogram_quantile(total,0.9),
+            'p99' : histogram_quantile(total,0.99),
+            'max' : self.max_total if self.count else float('nan'),
+            'wait_p50' : histogram_quantile(self.hist['wait'],0.5),
+            'timeout_ms' : self.timeout_ms,
+            'last' : self.last,
+        }
+
+class CommandStats:
+    '''
+    Latency statistics of the commands sent by one or more WIB objects, keyed by
+    message type. Successful commands are split into serialize, send, wait (for
+    the reply) and parse stages; timeouts only count the time waited.
+    '''
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.commands = {}
+
+    def get(self,name):
+        if name not in self.commands:
+            self.commands[name] = CommandStat()
+        return self.commands[name]
+
+    def record(self,name,serialize,send,wait,parse,bytes_sent,bytes_received,size=1):
+        '''size scales the wait time kept for the timeout model, None leaves it out of the model'''
+        with self.lock:
+            stat = self.get(name)
+            stat.consecutive_timeouts = 0
+            if size:
+                stat.recent.append(wait/size)
+            total = serialize+send+wait+parse
+            for stage,seconds in zip(STAGES,(serialize,send,wait,parse,total)):
+                stat.add(stage,seconds)
+            stat.count += 1
+            stat.bytes_sent += bytes_sent
+            stat.bytes_received += bytes_received
+            stat.sum_total += total
+            stat.max_total = max(stat.max_total,total)
+            stat.last = time.time()
+
+    def record_timeout(self,name,waited):
+        with self.lock:
+            stat = self.get(name)
+            stat.timeouts += 1
+            stat.consecutive_timeouts += 1
+            stat.max_total = max(stat.max_total,waited)
+            stat.last = time.time()
+
+    def record_error(self,name):
+        with self.lock:
+            self.get(name).errors += 1
+
+    def record_retry(self,name):
+        with self.lock:
+            self.get(name).retries += 1
+
+    def forget(self,name):
+        '''Drops the recent waits of one command, so its timeout model starts over'''
+        with self.lock:
+            if name in self.commands:
+                self.commands[name].recent.clear()
+
+    def set_timeout(self,name,timeout_ms):
+        with self.lock:
+            self.get(name).timeout_ms = timeout_ms
+
+    def recent(self,name):
+        '''(recent size normalized waits, consecutive timeouts) of one command'''
+        with self.lock:
+            if name not in self.commands:
+                return np.zeros(0),0
+            stat = self.commands[name]
+            return np.fromiter(stat.recent,dtype=np.float64,count=len(stat.recent)),stat.consecutive_timeouts
+
+    def reset(self):
+        with self.lock:
+            self.commands = {}
+            self.started = time.time()
+
+    def names(self):
+        with self.lock:
+            return sorted(self.commands.keys())
+
+    def summary(self,name=None):
+        '''Dict of counters and latency quantiles (seconds) for one command, or for all of them'''
+        with self.lock:
+            if name is not None:
+                return self.commands[name].summary() if name in self.commands else None
+            return {k:v.summary() for k,v in sorted(self.commands.items())}
+
+    def quantile(self,name,q,stage='total'):
+        with self.lock:
+            if name not in self.commands:
+                return float('nan')
+            return histogram_quantile(self.commands[name].hist[stage],q)
+
+    def dump(self,path):
+        '''Writes the summaries and raw histograms to a JSON file'''
+        with self.lock:
+            out = {
+                'started' : self.started,
+                'dumped' : time.time(),
+                'bin_edges' : BIN_EDGES.tolist(),
+                'commands' : {k:dict(v.summary(),hist={s:h.tolist() for s,h in v.hist.items()}) for k,v in sorted(self.commands.items())},
+            }
+        with open(path,'w') as fout:
+            json.dump(out,fout,indent=1)
+
+class TimeoutPolicy:
+    '''
+    Receive timeout of each command from the recent latencies in a CommandStats:
+    the quantile of the recent waits times factor, clamped between floor_ms and
+    the static ceiling of the command. Until min_samples replies have been seen
+    the ceiling is used, and always for the FIXED_TIMEOUT commands. Every consecutive timeout doubles the deadline (at most
+    max_backoff times) so a WIB that got slow is not given up on immediately. If it
+    still times out after that, the recent waits are dropped and the ceiling is used
+    until min_samples new replies have been seen, so the model learns the new latency.
+
+    ReadDaqSpy, Update and UpdateChunk deadlines and ceilings scale with the request
+    size: the number of spy buffers read, or the size of the update message relative
+    to 1 MB.
+    Triggered spy reads add the trigger timeout to the ceiling and always use it.
+    '''
+
+    def __init__(self,stats,factor=4.0,quantile=0.99,floor_ms=250,min_samples=20,max_backoff=2,adaptive=True):
+        self.stats = stats
+        self.factor = factor
+        self.quantile = quantile
+        self.floor_ms = floor_ms
+        self.min_samples = min_samples
+        self.max_backoff = max_backoff
+        self.adaptive = adaptive
+
+    def ceiling_ms(self,name,req):
+        ceiling = CEILINGS_MS.get(name,DEFAULT_CEILING_MS)
+        if name == 'ReadDaqSpy':
+            ceiling += req.trigger_timeout_ms
+        return ceiling
+
+    def size(self,name,req,msg_bytes):
+        '''Relative size of the request, None for requests whose latency is not modelled'''
+        if name in FIXED_TIMEOUT:
+            return None
+        if name == 'ReadDaqSpy':
+            if req.trigger_command or req.trigger_timeout_ms:
+                return None
+            return max(1,int(req.buf0)+int(req.buf1))
+        if name in ('Update','UpdateChunk'):
+            return max(1.0,msg_bytes/(1024*1024))
+        return 1
+
+    def timeout(self,name,req,msg_bytes):
+        '''Returns (timeout in ms, size to record the latency with)'''
+        ceiling = self.ceiling_ms(name,req)
+        size = self.size(name,req,msg_bytes)
+        if size is not None:
+            ceiling = int(ceiling*size)
+        timeout = ceiling
+        if self.adaptive and size is not None:
+            waits,consecutive = self.stats.recent(name)
+            if consecutive > self.max_backoff:
+                self.stats.forget(name)
+            elif len(waits) >= self.min_samples:
+                timeout = np.quantile(waits,self.quantile)*size*self.factor*1000
+                timeout = max(timeout,self.floor_ms)*2**min(consecutive,self.max_backoff)
+                timeout = int(min(timeout,ceiling))
+        self.stats.set_timeout(name,timeout)
+        return timeout,size